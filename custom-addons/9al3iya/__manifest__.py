@@ -4,7 +4,7 @@
     'author': 'Ayoub Akhrif',
     'category': 'Inventory',
     'version': '1.0',
-    'depends': ['base', 'mail'],
+    'depends': ['base', 'mail', 'drive_sync'],
     'data': [
         'security/groups.xml',
         'security/ir.model.access.csv',
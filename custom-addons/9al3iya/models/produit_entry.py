@@ -54,27 +54,12 @@ class ProduitEntry(models.Model):
 
     stock_id = fields.One2many('cal3iya.stock', 'entry_id', string='Ligne de stock liée', readonly=True)
 
-    state_badge = fields.Html(string='État (badge)', compute='_compute_state_badge', sanitize=False)
-
     @api.onchange('dum')
     def _onchange_dum_clear_link(self):
         """Clear cached DUM link when DUM value changes."""
         if self.dum_link and self._origin.dum != self.dum:
             self.dum_link = False
 
-    # ------------------------------------------------------------
-    # BADGE VISUEL
-    # ------------------------------------------------------------
-    def _compute_state_badge(self):
-        for rec in self:
-            label = dict(self._fields['state'].selection).get(rec.state, '') or ''
-            color = "#28a745" if rec.state == 'entree' else "#dc3545"
-            bg = "rgba(40,167,69,0.12)" if rec.state == 'entree' else "rgba(220,53,69,0.12)"
-            rec.state_badge = (
-                f"<span style='display:inline-block;padding:2px 8px;border-radius:12px;"
-                f"font-weight:600;background:{bg};color:{color};'>{label}</span>"
-            )
-
     # ------------------------------------------------------------
     # ONCHANGE SUR RETOUR
     # ------------------------------------------------------------
@@ -162,46 +147,43 @@ class ProduitEntry(models.Model):
                 'target': 'new',
             }
         
-        # Try to search on Google Drive
-        try:
-            from ..services.google_drive_searcher import search_dum_pdf
+        # Search on Google Drive in the background (drive.job worker)
+        self._enqueue_dum_search()
+        return {
+            "type": "ir.actions.client",
+            "tag": "display_notification",
+            "params": {
+                "title": "Recherche DUM en cours",
+                "message": f"La recherche du PDF '{self.dum}' sur Google Drive a été lancée. Réessayez dans quelques instants.",
+                "type": "info",
+                "sticky": False,
+            },
+        }
+
+    def _enqueue_dum_search(self):
+        for rec in self.filtered(lambda r: r.dum and not r.dum_link):
+            self.env['drive.job']._enqueue(
+                rec, '_job_search_dum_link',
+                name="Recherche PDF DUM",
+                dedup_key=f"cal3iyaentry:{rec.id}:dum:{rec.dum}",
+            )
 
-            web_link = search_dum_pdf(self.dum)
+    def _job_search_dum_link(self):
+        """Drive job: cache the link of the DUM PDF.
 
-            
-            # Cache the link
-            self.write({'dum_link': web_link})
-            
-            # Open the PDF
-            return {
-                'type': 'ir.actions.act_url',
-                'url': web_link,
-                'target': 'new',
-            }
-        except FileNotFoundError:
-            # Show notification instead of raising error
-            return {
-                "type": "ir.actions.client",
-                "tag": "display_notification",
-                "params": {
-                    "title": "PDF DUM introuvable",
-                    "message": f"Aucun PDF contenant '{self.dum}' n'a été trouvé sur Google Drive.",
-                    "type": "warning",
-                    "sticky": False,
-                },
-            }
-        except Exception as e:
-            # Show error notification
-            return {
-                "type": "ir.actions.client",
-                "tag": "display_notification",
-                "params": {
-                    "title": "Erreur Drive",
-                    "message": f"Erreur lors de la recherche: {str(e)}",
-                    "type": "danger",
-                    "sticky": False,
-                },
-            }
+        Only an empty search result means "Introuvable"; credential and
+        transport errors propagate so that the job is retried.
+        """
+        from ..services.google_drive_searcher import search_dum_pdf, DumPdfNotFound
+
+        if not self.dum or self.dum_link:
+            return self.dum_link
+        try:
+            web_link = search_dum_pdf(self.dum)
+        except DumPdfNotFound:
+            return "Introuvable"
+        self.write({'dum_link': web_link})
+        return web_link
 
 
     # ------------------------------------------------------------
@@ -274,6 +256,11 @@ class ProduitEntry(models.Model):
         return rec
         
     def write(self, vals):
+        # Lien DUM mis en cache par le job Drive : rien à synchroniser côté stock
+        if set(vals) <= {'dum_link'}:
+            return super().write(vals)
+        if 'dum' in vals and 'dum_link' not in vals:
+            vals = dict(vals, dum_link=False)
         res = super().write(vals)
 
         for rec in self:
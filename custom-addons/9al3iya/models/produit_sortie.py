@@ -105,6 +105,89 @@ class ProduitExit(models.Model):
             result.append((rec.id, name))
         return result
 
+    # ------------------------------------------------------------
+    # BONS DE LIVRAISON
+    # ------------------------------------------------------------
+    def _group_bons(self):
+        """Un bon par (société, date, client, chauffeur), dans l'ordre des dates."""
+        bons = {}
+        for rec in self.sorted(lambda r: (r.date_exit, r.id)):
+            key = (rec.ste_id.id, rec.date_exit, rec.client_id.id, rec.driver_id.id)
+            if key not in bons:
+                bons[key] = {
+                    'ste': rec.ste_id.name,
+                    'ste_rec': rec.ste_id,
+                    'date': rec.date_exit,
+                    'client': rec.client_id,
+                    'driver': rec.driver_id,
+                    'lines': self.browse(),
+                }
+            bons[key]['lines'] |= rec
+        return list(bons.values())
+
+    def _bon_file_name(self, bon):
+        parts = ["Bon", bon['ste'], bon['date'] and bon['date'].strftime('%Y-%m-%d'),
+                 bon['client'].name, bon['driver'].name]
+        return " - ".join(part for part in parts if part) + ".pdf"
+
+    def action_upload_bons_drive(self):
+        """Envoie les bons des sorties sélectionnées sur Google Drive, en arrière-plan."""
+        exits = self.filtered(lambda r: not r.drive_file_id)
+        if not exits:
+            raise UserError("Tous les bons sélectionnés sont déjà sur Google Drive.")
+        job_id = self.env['drive.job']._enqueue(
+            self.browse(), '_job_upload_bons',
+            name=f"Envoi de {len(exits._group_bons())} bons sur Drive",
+            payload={'exit_ids': exits.ids},
+        )
+        return {
+            'type': 'ir.actions.act_window',
+            'name': "Envoi des bons sur Drive",
+            'res_model': 'drive.job',
+            'res_id': job_id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    @api.model
+    def _job_upload_bons(self, exit_ids):
+        """Tâche Drive : génère et envoie les bons pas encore sur Drive.
+
+        Reprenable : les sorties déjà envoyées sont ignorées. Si seuls
+        certains bons échouent, ceux envoyés sont enregistrés et une
+        nouvelle tâche est lancée pour les autres.
+        """
+        from ..services.google_drive_uploader import upload_bons
+
+        exits = self.browse(exit_ids).exists().filtered(lambda r: not r.drive_file_id)
+        bons = exits._group_bons()
+        if not bons:
+            return "Rien à envoyer"
+        report = self.env['ir.actions.report'].sudo()
+
+        def render(lines):
+            return lambda: report._render_qweb_pdf('9al3iya.create_bon_reportv2', lines.ids)[0]
+
+        Job = self.env['drive.job']
+        results = upload_bons(
+            [(index, self._bon_file_name(bon), bon['ste'], render(bon['lines'])) for index, bon in enumerate(bons)],
+            progress=lambda done, total: Job._report_progress(done, total, f"{done} / {total} bons envoyés"),
+        )
+        failed = self.browse()
+        for index, bon in enumerate(bons):
+            result = results.get(index)
+            if isinstance(result, tuple):
+                web_link, file_id = result
+                bon['lines'].write({'drive_file_url': web_link, 'drive_file_id': file_id})
+            else:
+                failed |= bon['lines']
+        if failed and len(failed) == len(exits):
+            raise UserError(f"Aucun bon n'a pu être envoyé : {next(iter(results.values()))}")
+        if failed:
+            Job._enqueue(self.browse(), '_job_upload_bons', name="Envoi des bons restants sur Drive",
+                         payload={'exit_ids': failed.ids})
+        return f"{len(bons) - len(failed._group_bons())} / {len(bons)} bons envoyés"
+
     # ------------------------------------------------------------
     # CRUD OVERRIDES
     # ------------------------------------------------------------
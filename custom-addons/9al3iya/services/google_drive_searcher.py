@@ -1,6 +1,4 @@
-import os
-from googleapiclient.discovery import build
-from google.oauth2.service_account import Credentials
+from odoo.addons.drive_sync.services.drive_client import get_drive_service as _get_shared_drive_service
 
 # Lecture seule suffisante
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
@@ -12,18 +10,12 @@ DUM_FOLDER_ID = "1i9kzO4Pk7X2hFJG2hyh828Sq5uAbarIA"
 SERVICE_ACCOUNT_PATH = "/srv/google_credentials/service_account.json"
 
 
-def get_drive_service():
-    if not os.path.exists(SERVICE_ACCOUNT_PATH):
-        raise FileNotFoundError(
-            f"Service account file not found at {SERVICE_ACCOUNT_PATH}"
-        )
-
-    creds = Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_PATH,
-        scopes=SCOPES
-    )
+class DumPdfNotFound(FileNotFoundError):
+    """La recherche a abouti mais aucun PDF ne correspond au DUM."""
 
-    return build("drive", "v3", credentials=creds)
+
+def get_drive_service():
+    return _get_shared_drive_service(SERVICE_ACCOUNT_PATH, SCOPES)
 
 
 def search_dum_pdf(dum_value: str):
@@ -51,6 +43,6 @@ def search_dum_pdf(dum_value: str):
 
     files = results.get("files", [])
     if not files:
-        raise FileNotFoundError(f"No PDF found for DUM: {dum_value}")
+        raise DumPdfNotFound(f"No PDF found for DUM: {dum_value}")
 
     return files[0]["webViewLink"]
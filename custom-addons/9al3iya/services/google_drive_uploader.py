@@ -1,8 +1,15 @@
-import os
+import io
+import logging
 import mimetypes
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-from google.oauth2.service_account import Credentials
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+
+from odoo.addons.drive_sync.services.drive_client import get_drive_service, execute_batch
+
+_logger = logging.getLogger(__name__)
 
 # ------------------------------------------------------------
 # ⚙️ Configuration
@@ -14,59 +21,110 @@ SERVICE_ACCOUNT_PATH = "/srv/google_credentials/service_account.json"
 # ID du dossier racine "Bon"
 ROOT_FOLDER_ID = "1YVjJOOPHsVwW7TeE6oxQFSna9bEOylXa"
 
+FOLDER_MIMETYPE = "application/vnd.google-apps.folder"
+PUBLIC_PERMISSION = {"role": "reader", "type": "anyone"}
+
+# Envoi en masse : uploads parallèles, par morceaux reprenables
+UPLOAD_WORKERS = 4
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_RETRIES = 5
+
 
 # ------------------------------------------------------------
 # 🔐 Authentification (Service Account)
 # ------------------------------------------------------------
 def get_drive_servicev2():
-    if not os.path.exists(SERVICE_ACCOUNT_PATH):
-        raise FileNotFoundError(
-            f"Service account file not found at {SERVICE_ACCOUNT_PATH}"
-        )
-
-    creds = Credentials.from_service_account_file(
-        SERVICE_ACCOUNT_PATH,
-        scopes=SCOPES
-    )
-    return build("drive", "v3", credentials=creds)
+    return get_drive_service(SERVICE_ACCOUNT_PATH, SCOPES)
 
 
 # ------------------------------------------------------------
 # 📁 Gestion des dossiers
 # ------------------------------------------------------------
-def get_or_create_folderv2(service, parent_id, folder_name):
-    results = service.files().list(
-        q=(
-            f"'{parent_id}' in parents and "
-            f"name='{folder_name}' and "
-            f"mimeType='application/vnd.google-apps.folder' and "
-            f"trashed=false"
-        ),
-        fields="files(id, name)",
-        supportsAllDrives=True,
-        includeItemsFromAllDrives=True,
-    ).execute()
+# {(parent_id, nom du dossier): id du dossier}, partagé par le processus
+_folder_cache = {}
+_folder_lock = threading.Lock()
+
+
+def _folder_query(parent_id, folder_name):
+    safe_name = folder_name.replace("\\", "\\\\").replace("'", "\\'")
+    return (
+        f"'{parent_id}' in parents and "
+        f"name='{safe_name}' and "
+        f"mimeType='{FOLDER_MIMETYPE}' and "
+        f"trashed=false"
+    )
 
-    folders = results.get("files", [])
-    if folders:
-        return folders[0]["id"]
 
+def _create_folder(service, parent_id, folder_name):
     folder = service.files().create(
         body={
             "name": folder_name,
-            "mimeType": "application/vnd.google-apps.folder",
+            "mimeType": FOLDER_MIMETYPE,
             "parents": [parent_id],
         },
         fields="id",
         supportsAllDrives=True,
     ).execute()
-
     return folder["id"]
 
 
+def get_or_create_folders(service, parent_id, folder_names):
+    """Ids des dossiers ``folder_names`` sous ``parent_id``, créés si besoin.
+
+    Les dossiers absents du cache sont cherchés en une seule requête batch.
+    """
+    with _folder_lock:
+        missing = {name for name in folder_names if (parent_id, name) not in _folder_cache}
+    if missing:
+        found = execute_batch(service, {
+            name: service.files().list(
+                q=_folder_query(parent_id, name),
+                fields="files(id, name)",
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            )
+            for name in missing
+        })
+        for name in missing:
+            response = found[name]
+            if isinstance(response, Exception):
+                raise response
+            folders = response.get("files", [])
+            folder_id = folders[0]["id"] if folders else _create_folder(service, parent_id, name)
+            with _folder_lock:
+                _folder_cache[(parent_id, name)] = folder_id
+    with _folder_lock:
+        return {name: _folder_cache[(parent_id, name)] for name in folder_names}
+
+
+def get_or_create_folderv2(service, parent_id, folder_name):
+    return get_or_create_folders(service, parent_id, [folder_name])[folder_name]
+
+
 # ------------------------------------------------------------
 # ☁️ Upload de fichiers
 # ------------------------------------------------------------
+def _upload_media(service, media, file_name, parent_folder_id):
+    """Upload reprenable : en cas de coupure réseau, reprend au dernier morceau reçu par Drive."""
+    request = service.files().create(
+        body={"name": file_name, "parents": [parent_folder_id]},
+        media_body=media,
+        fields="id, webViewLink",
+        supportsAllDrives=True,
+    )
+    response, failures = None, 0
+    while response is None:
+        try:
+            _status, response = request.next_chunk(num_retries=UPLOAD_RETRIES)
+        except (OSError, ConnectionError) as e:
+            failures += 1
+            if failures > UPLOAD_RETRIES:
+                raise
+            _logger.warning("Upload Drive de %s interrompu (%s), reprise", file_name, e)
+            time.sleep(2 ** failures)
+    return response["webViewLink"], response["id"]
+
+
 def upload_to_drivev2(file_path, file_name, ste_name=None):
     service = get_drive_servicev2()
 
@@ -77,28 +135,70 @@ def upload_to_drivev2(file_path, file_name, ste_name=None):
     mime_type, _ = mimetypes.guess_type(file_path)
     mime_type = mime_type or "application/pdf"
 
-    file_metadata = {
-        "name": file_name,
-        "parents": [parent_folder_id],
-    }
-
-    media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True)
-
-    uploaded = service.files().create(
-        body=file_metadata,
-        media_body=media,
-        fields="id, webViewLink",
-        supportsAllDrives=True,
-    ).execute()
-
-    file_id = uploaded["id"]
-    web_link = uploaded["webViewLink"]
+    media = MediaFileUpload(file_path, mimetype=mime_type, chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+    web_link, file_id = _upload_media(service, media, file_name, parent_folder_id)
 
     # Rendre public
     service.permissions().create(
         fileId=file_id,
-        body={"role": "reader", "type": "anyone"},
+        body=PUBLIC_PERMISSION,
         supportsAllDrives=True,
     ).execute()
 
     return web_link, file_id
+
+
+def _upload_content(content, file_name, parent_folder_id):
+    # Exécuté dans un thread du pool : client Drive propre au thread
+    media = MediaIoBaseUpload(
+        io.BytesIO(content), mimetype="application/pdf", chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+    return _upload_media(get_drive_servicev2(), media, file_name, parent_folder_id)
+
+
+def upload_bons(bons, max_workers=UPLOAD_WORKERS, progress=None):
+    """Envoi en masse de PDF vers Drive, rendus publics.
+
+    :param bons: liste de (clé, nom du fichier, nom de la société, render),
+        ``render()`` retournant le contenu PDF ; il est appelé dans le thread
+        appelant pendant que les PDF précédents sont envoyés en parallèle
+    :param progress: ``progress(done, total)``, appelé dans le thread appelant
+    :return: {clé: (web_link, file_id)}, ou l'exception levée pour ce bon
+    """
+    service = get_drive_servicev2()
+    folders = get_or_create_folders(service, ROOT_FOLDER_ID, sorted({ste for _k, _n, ste, _r in bons if ste}))
+    total, results = len(bons), {}
+
+    def collect(future, key):
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            _logger.warning("Upload Drive du bon %s échoué : %s", key, e)
+            results[key] = e
+        if progress:
+            progress(len(results), total)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive_upload") as pool:
+        pending = {}
+        for key, file_name, ste_name, render in bons:
+            try:
+                content = render()
+            except Exception as e:
+                results[key] = e
+                continue
+            parent_id = folders[ste_name] if ste_name else ROOT_FOLDER_ID
+            pending[pool.submit(_upload_content, content, file_name, parent_id)] = key
+            for future in [f for f in pending if f.done()]:
+                collect(future, pending.pop(future))
+        for future in as_completed(pending):
+            collect(future, pending[future])
+
+    # Permissions publiques : une requête batch pour tous les fichiers envoyés
+    uploaded = {key: result for key, result in results.items() if not isinstance(result, Exception)}
+    shared = execute_batch(service, {
+        key: service.permissions().create(fileId=file_id, body=PUBLIC_PERMISSION, supportsAllDrives=True)
+        for key, (_link, file_id) in uploaded.items()
+    })
+    for key, response in shared.items():
+        if isinstance(response, Exception):
+            _logger.warning("Partage Drive du bon %s échoué : %s", key, response)
+    return results
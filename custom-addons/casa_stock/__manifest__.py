@@ -27,6 +27,13 @@ This module provides a robust stock management system based on an immutable move
         'views/master_data_views.xml',
         'views/menus.xml',
     ],
+    'assets': {
+        'web.assets_backend': [
+            'casa_stock/static/src/week_history/week_history.css',
+            'casa_stock/static/src/week_history/week_history.js',
+            'casa_stock/static/src/week_history/week_history.xml',
+        ],
+    },
     'installable': True,
     'application': True,
     'license': 'LGPL-3',
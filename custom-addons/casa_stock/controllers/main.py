@@ -0,0 +1,18 @@
+from odoo import http
+from odoo.http import request
+
+from ..models.casa_client import HISTORY_PAGE_WEEKS
+
+
+class CasaClientController(http.Controller):
+
+    @http.route('/casa_stock/client/<int:client_id>/week_history', type='json', auth='user')
+    def week_history(self, client_id, offset=0, limit=HISTORY_PAGE_WEEKS):
+        """
+        Commandes du client groupées par semaine, page par page (la plus récente d'abord).
+        - offset / limit: en nombre de semaines
+        """
+        client = request.env['casa.client'].browse(client_id).exists()
+        if not client:
+            return {'error': 'not_found'}
+        return client.get_week_history(offset=offset, limit=limit)
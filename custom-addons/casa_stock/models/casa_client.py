@@ -1,6 +1,18 @@
 from collections import defaultdict
 from odoo import models, fields, api
 
+# Historique des commandes : semaines par page du widget
+HISTORY_PAGE_WEEKS = 8
+HISTORY_MAX_PAGE_WEEKS = 52
+
+HISTORY_COLUMNS = [
+    {'name': 'product', 'label': 'Produit', 'type': 'char'},
+    {'name': 'quantity', 'label': 'Qté', 'type': 'float'},
+    {'name': 'price', 'label': 'Prix', 'type': 'float'},
+    {'name': 'amount', 'label': 'Montant', 'type': 'amount'},
+    {'name': 'date', 'label': 'Date', 'type': 'date'},
+]
+
 class CasaClient(models.Model):
     _name = 'casa.client'
     _description = 'Clients Casa'
@@ -36,12 +48,6 @@ class CasaClient(models.Model):
         store=True
     )
 
-    sorties_grouped_html = fields.Html(
-        string="Historique des commandes",
-        compute="_compute_sorties_grouped_html",
-        sanitize=False,
-    )
-
     @api.depends('exit_ids', 'exit_ids.state')
     def _compute_exit_count(self):
         """Compte uniquement les sorties confirmées (done)"""
@@ -58,107 +64,52 @@ class CasaClient(models.Model):
             client.compte_total = (client.compte_initial or 0.0) + total_ventes
 
 
-    @api.depends('name')
-    def _compute_sorties_grouped_html(self):
-        for client in self:
-
-            # 1️⃣ Récupérer les sorties NON annulées du client
-            exits = self.env['casa.stock.exit'].search([
-                ('client_id', '=', client.id),
-                ('state', '!=', 'cancel'),
-            ], order='date asc')
-
-            if not exits:
-                client.sorties_grouped_html = "<p style='padding:10px;'>Aucune commande.</p>"
-                continue
-
-            # 2️⃣ Grouper par semaine
-            grouped = defaultdict(list)
-            for e in exits:
-                if e.date:
-                    week = e.date.isocalendar()[1]
-                else:
-                    week = "N/A"
-                grouped[week].append(e)
-
-            # 3️⃣ Construction du HTML
-            html = """
-            <style>
-                .week-card {
-                    background: #ffffff;
-                    border: 1px solid #e5e7eb;
-                    border-radius: 12px;
-                    padding: 16px;
-                    margin-bottom: 20px;
-                    box-shadow: 0 4px 12px rgba(0,0,0,0.05);
-                }
-                .week-header {
-                    display: flex;
-                    justify-content: space-between;
-                    margin-bottom: 12px;
-                }
-                .week-title {
-                    font-size: 18px;
-                    font-weight: 700;
-                    color: #1f2937;
-                }
-                .week-total {
-                    background: #2563eb;
-                    color: white;
-                    padding: 6px 14px;
-                    border-radius: 999px;
-                    font-weight: 700;
-                }
-                .row {
-                    display: grid;
-                    grid-template-columns: 2fr 1fr 1fr 1fr 1fr;
-                    padding: 8px 0;
-                    border-bottom: 1px dashed #e5e7eb;
-                    font-size: 13px;
-                }
-                .row.header {
-                    font-weight: 700;
-                    border-bottom: 2px solid #e5e7eb;
-                }
-            </style>
-            """
-
-            for week, records in grouped.items():
-                total_week = sum(
-                    (r.qty or 0) * (r.price_sale or 0)
-                    for r in records
-                )
-
-                html += f"""
-                <div class="week-card">
-                    <div class="week-header">
-                        <div class="week-title">📅 Semaine {week}</div>
-                        <div class="week-total">{total_week:,.2f} Dh</div>
-                    </div>
-
-                    <div class="row header">
-                        <div>Produit</div>
-                        <div>Qté</div>
-                        <div>Prix</div>
-                        <div>Montant</div>
-                        <div>Date</div>
-                    </div>
-                """
-
-                for r in records:
-                    montant = (r.qty or 0) * (r.price_sale or 0)
-                    html += f"""
-                    <div class="row">
-                        <div>{r.product_id.name if r.product_id else ''}</div>
-                        <div>{r.qty}</div>
-                        <div>{r.price_sale:.2f}</div>
-                        <div style="font-weight:700;color:#2563eb;">
-                            {montant:.2f}
-                        </div>
-                        <div>{r.date}</div>
-                    </div>
-                    """
-
-                html += "</div>"
-
-            client.sorties_grouped_html = html
+    def get_week_history(self, offset=0, limit=HISTORY_PAGE_WEEKS):
+        """Une page des commandes non annulées du client, groupées par semaine ISO, la plus récente d'abord.
+
+        :return: {'columns': [...], 'weeks': [{'week', 'total', 'lines'}], 'has_more'}
+        """
+        self.ensure_one()
+        self.check_access_rights('read')
+        self.check_access_rule('read')
+        limit = max(1, min(int(limit), HISTORY_MAX_PAGE_WEEKS))
+        self.env['casa.stock.exit'].flush_model()
+        self.env['casa.product'].flush_model(['name'])
+        cr = self.env.cr
+
+        cr.execute("""
+            SELECT COALESCE(to_char(e.date, 'IYYY-"W"IW'), '') AS wk,
+                   SUM(COALESCE(e.qty, 0) * COALESCE(e.price_sale, 0))
+            FROM casa_stock_exit e
+            WHERE e.client_id = %s AND e.state != 'cancel'
+            GROUP BY wk
+            ORDER BY wk DESC
+            OFFSET %s LIMIT %s
+        """, [self.id, int(offset), limit + 1])
+        weeks = cr.fetchall()
+        has_more = len(weeks) > limit
+        weeks = weeks[:limit]
+
+        lines = defaultdict(list)
+        if weeks:
+            cr.execute("""
+                SELECT COALESCE(to_char(e.date, 'IYYY-"W"IW'), ''), e.id, p.name, e.qty, e.price_sale,
+                       COALESCE(e.qty, 0) * COALESCE(e.price_sale, 0), e.date
+                FROM casa_stock_exit e
+                LEFT JOIN casa_product p ON p.id = e.product_id
+                WHERE e.client_id = %s AND e.state != 'cancel'
+                  AND COALESCE(to_char(e.date, 'IYYY-"W"IW'), '') = ANY(%s)
+                ORDER BY e.date, e.id
+            """, [self.id, [w[0] for w in weeks]])
+            for week, *line in cr.fetchall():
+                lines[week].append(dict(zip(('id', 'product', 'quantity', 'price', 'amount', 'date'), line)))
+
+        return {
+            'columns': HISTORY_COLUMNS,
+            'weeks': [{
+                'week': week or "N/A",
+                'total': total or 0.0,
+                'lines': lines[week],
+            } for week, total in weeks],
+            'has_more': has_more,
+        }
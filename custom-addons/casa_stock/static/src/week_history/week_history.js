@@ -0,0 +1,97 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { useService } from "@web/core/utils/hooks";
+import { deserializeDate, formatDate } from "@web/core/l10n/dates";
+import { formatFloat } from "@web/core/utils/numbers";
+import { standardWidgetProps } from "@web/views/widgets/standard_widget_props";
+import { Component, onMounted, onPatched, onWillStart, onWillUnmount, onWillUpdateProps, useRef, useState } from "@odoo/owl";
+
+/**
+ * Historique des commandes d'un client Casa, chargé semaine par semaine
+ * depuis /casa_stock/client/<id>/week_history au fil du défilement.
+ */
+export class CasaWeekHistory extends Component {
+    static template = "casa_stock.WeekHistory";
+    static props = { ...standardWidgetProps };
+
+    setup() {
+        this.rpc = useService("rpc");
+        this.sentinel = useRef("sentinel");
+        this.state = useState({ columns: [], weeks: [], hasMore: false, loading: false });
+
+        onWillStart(() => this.load(this.props.record.resId));
+        onWillUpdateProps((nextProps) => {
+            if (nextProps.record.resId !== this.props.record.resId) {
+                return this.load(nextProps.record.resId);
+            }
+        });
+        onMounted(() => {
+            this.observer = new IntersectionObserver((entries) => {
+                if (entries.some((entry) => entry.isIntersecting)) {
+                    this.loadMore();
+                }
+            });
+            this.observer.observe(this.sentinel.el);
+        });
+        // The observer only fires on visibility changes: once a page is
+        // rendered, observe again so that a still visible sentinel loads the next one.
+        onPatched(() => {
+            if (this.state.hasMore && !this.state.loading) {
+                this.observer.unobserve(this.sentinel.el);
+                this.observer.observe(this.sentinel.el);
+            }
+        });
+        onWillUnmount(() => this.observer.disconnect());
+    }
+
+    async load(resId) {
+        Object.assign(this.state, { columns: [], weeks: [], hasMore: false });
+        if (!resId) {
+            return;
+        }
+        this.state.loading = true;
+        try {
+            const page = await this.rpc(`/casa_stock/client/${resId}/week_history`, { offset: 0 });
+            Object.assign(this.state, {
+                columns: page.columns || [],
+                weeks: page.weeks || [],
+                hasMore: Boolean(page.has_more),
+            });
+        } finally {
+            this.state.loading = false;
+        }
+    }
+
+    async loadMore() {
+        const resId = this.props.record.resId;
+        if (!resId || !this.state.hasMore || this.state.loading) {
+            return;
+        }
+        this.state.loading = true;
+        try {
+            const page = await this.rpc(`/casa_stock/client/${resId}/week_history`, {
+                offset: this.state.weeks.length,
+            });
+            this.state.weeks.push(...(page.weeks || []));
+            this.state.hasMore = Boolean(page.has_more);
+        } finally {
+            this.state.loading = false;
+        }
+    }
+
+    formatCell(value, type) {
+        switch (type) {
+            case "amount":
+                return `${formatFloat(value || 0, { digits: [16, 2] })} Dh`;
+            case "float":
+                return formatFloat(value || 0, { digits: [16, 2] });
+            case "date":
+                return value ? formatDate(deserializeDate(value)) : "";
+            default:
+                return value || "";
+        }
+    }
+}
+
+registry.category("view_widgets").add("casa_week_history", { component: CasaWeekHistory });
@@ -0,0 +1,25 @@
+{
+    'name': 'Drive Sync',
+    'version': '1.0',
+    'category': 'Base',
+    'summary': "File d'attente des échanges avec Google Drive",
+    'description': """
+        Persistent job queue for Google Drive lookups and uploads, run by a
+        worker cron outside of the HTTP request path, with retries and
+        per-job latency metrics.
+
+        Also provides the shared Google Drive client (services/drive_client.py):
+        credentials loaded once per process, one keep-alive client per thread,
+        batch requests and an in-memory fake for tests.
+    """,
+    'author': 'Ayoub Akhrif',
+    'depends': ['base'],
+    'data': [
+        'security/ir.model.access.csv',
+        'data/cron.xml',
+        'views/drive_job_views.xml',
+    ],
+    'installable': True,
+    'application': False,
+    'license': 'LGPL-3',
+}
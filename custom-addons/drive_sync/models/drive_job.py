@@ -0,0 +1,236 @@
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+# Retry n waits RETRY_BASE_DELAY * 2 ** (n - 1) seconds, capped.
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 3600
+# A job left running this long belongs to a dead worker.
+STALE_RUNNING_DELAY = 3600
+# Wall-clock budget of one worker run, in seconds.
+WORKER_TIME_BUDGET = 240
+
+WORKER_CRON_XMLID = 'drive_sync.ir_cron_drive_job_worker'
+
+
+class DriveJob(models.Model):
+    """Persistent queue of Google Drive calls.
+
+    A job calls ``env[res_model].browse(res_id).<method>(**payload)`` from
+    the worker cron. Handler methods must be named ``_job_*`` and are
+    retried with an exponential backoff when they raise. A pending job with
+    the same ``dedup_key`` is never queued twice.
+    """
+    _name = 'drive.job'
+    _description = 'Tâche Google Drive'
+    _order = 'id desc'
+
+    name = fields.Char(string='Tâche', required=True, readonly=True)
+    dedup_key = fields.Char(string='Clé de déduplication', readonly=True)
+    res_model = fields.Char(string='Modèle', required=True, readonly=True)
+    res_id = fields.Integer(string='ID', readonly=True)
+    method = fields.Char(string='Méthode', required=True, readonly=True)
+    payload = fields.Json(string='Paramètres', readonly=True)
+    state = fields.Selection([
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'Échouée'),
+    ], string='État', default='pending', required=True, readonly=True, index=True)
+    attempts = fields.Integer(string='Tentatives', readonly=True)
+    max_attempts = fields.Integer(string='Tentatives max', default=DEFAULT_MAX_ATTEMPTS, readonly=True)
+    next_attempt_at = fields.Datetime(string='Prochaine tentative', default=fields.Datetime.now, readonly=True)
+    started_at = fields.Datetime(string='Démarrée le', readonly=True)
+    finished_at = fields.Datetime(string='Terminée le', readonly=True)
+    wait_time = fields.Float(string="Attente (s)", readonly=True, group_operator='avg')
+    duration = fields.Float(string='Durée (s)', readonly=True, group_operator='avg')
+    progress = fields.Integer(string='Progression', readonly=True)
+    progress_message = fields.Char(string='Avancement', readonly=True)
+    result = fields.Char(string='Résultat', readonly=True)
+    last_error = fields.Text(string='Dernière erreur', readonly=True)
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS drive_job_pending_dedup_uniq
+            ON drive_job (dedup_key) WHERE state = 'pending'
+        """)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS drive_job_pending_idx
+            ON drive_job (next_attempt_at, id) WHERE state = 'pending'
+        """)
+
+    # ------------------------------------------------------------------
+    # Enqueue
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _enqueue(self, record, method, name=None, dedup_key=None, payload=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        """Queue ``record.<method>(**payload)``; returns the job id, or False if deduplicated."""
+        if not method.startswith('_job_'):
+            raise ValueError("Drive job handlers must be named _job_*: %s" % method)
+        if record:
+            record.ensure_one()
+        self.env.cr.execute("""
+            INSERT INTO drive_job
+                (name, dedup_key, res_model, res_id, method, payload, state, attempts, max_attempts,
+                 next_attempt_at, create_uid, create_date, write_uid, write_date)
+            VALUES (%(name)s, %(dedup_key)s, %(res_model)s, %(res_id)s, %(method)s, %(payload)s::jsonb,
+                    'pending', 0, %(max_attempts)s, now() at time zone 'UTC',
+                    %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC')
+            ON CONFLICT (dedup_key) WHERE state = 'pending' DO NOTHING
+            RETURNING id
+        """, {
+            'name': name or '%s.%s' % (record._name, method),
+            'dedup_key': dedup_key,
+            'res_model': record._name,
+            'res_id': record.id or None,
+            'method': method,
+            'payload': json.dumps(payload or {}),
+            'max_attempts': max_attempts,
+            'uid': self.env.uid,
+        })
+        row = self.env.cr.fetchone()
+        if row:
+            cron = self.env.ref(WORKER_CRON_XMLID, raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+        return row[0] if row else False
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _commit(self):
+        # Each job is committed on its own so that one failure does not undo the others.
+        if not getattr(threading.current_thread(), 'testing', False):
+            self.env.cr.commit()
+
+    @api.model
+    def _acquire(self):
+        self.env.cr.execute("""
+            SELECT id FROM drive_job
+            WHERE state = 'pending' AND next_attempt_at <= now() at time zone 'UTC'
+            ORDER BY next_attempt_at, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """)
+        row = self.env.cr.fetchone()
+        return self.browse(row[0]) if row else self.browse()
+
+    @api.model
+    def _requeue_stale(self):
+        limit = fields.Datetime.now() - timedelta(seconds=STALE_RUNNING_DELAY)
+        stale = self.search([('state', '=', 'running'), ('started_at', '<', limit)])
+        if stale:
+            _logger.warning("drive.job: requeuing %s stale running jobs", len(stale))
+            stale._reset_to_pending()
+
+    @api.model
+    def _report_progress(self, done, total, message=None):
+        """Publish the progress of the running job (no-op outside of a job).
+
+        Written through a separate cursor so that it is visible while the
+        job's own transaction is still open.
+        """
+        job = self.browse(self.env.context.get('drive_job_id'))
+        if not job:
+            return
+        vals = {
+            'progress': int(100 * done / total) if total else 100,
+            'progress_message': message or "%s / %s" % (done, total),
+        }
+        if getattr(threading.current_thread(), 'testing', False):
+            job.write(vals)
+            return
+        with self.pool.cursor() as cr:
+            cr.execute(
+                "UPDATE drive_job SET progress = %(progress)s, progress_message = %(progress_message)s WHERE id = %(id)s",
+                dict(vals, id=job.id))
+
+    def _reset_to_pending(self, **vals):
+        for job in self:
+            duplicate = job.dedup_key and self.search_count([
+                ('id', '!=', job.id), ('state', '=', 'pending'), ('dedup_key', '=', job.dedup_key)])
+            if duplicate:
+                job.write({'state': 'done', 'result': "Remplacée par une tâche plus récente"})
+            else:
+                job.write(dict({'next_attempt_at': fields.Datetime.now()}, state='pending', **vals))
+
+    def _run(self):
+        self.ensure_one()
+        started_at = fields.Datetime.now()
+        self.write({
+            'state': 'running',
+            'started_at': started_at,
+            'attempts': self.attempts + 1,
+            'wait_time': (started_at - self.create_date).total_seconds(),
+        })
+        self._commit()
+
+        started = time.time()
+        try:
+            with self.env.cr.savepoint():
+                target = self.env[self.res_model].with_context(drive_job_id=self.id)
+                if self.res_id:
+                    target = target.browse(self.res_id).exists()
+                if self.res_id and not target:
+                    result = "Enregistrement supprimé"
+                else:
+                    result = getattr(target, self.method)(**(self.payload or {}))
+        except Exception as e:
+            # New transaction: the job row may have been updated by _report_progress meanwhile.
+            self._commit()
+            self.invalidate_recordset()
+            failed = self.attempts >= self.max_attempts
+            delay = min(RETRY_BASE_DELAY * 2 ** (self.attempts - 1), RETRY_MAX_DELAY)
+            _logger.warning("drive.job %s (%s) attempt %s failed: %s", self.id, self.name, self.attempts, e)
+            vals = {
+                'finished_at': fields.Datetime.now(),
+                'duration': time.time() - started,
+                'last_error': str(e),
+            }
+            if failed:
+                self.write(dict(vals, state='failed'))
+            else:
+                self._reset_to_pending(next_attempt_at=fields.Datetime.now() + timedelta(seconds=delay), **vals)
+        else:
+            self._commit()
+            self.invalidate_recordset()
+            self.write({
+                'state': 'done',
+                'progress': 100,
+                'finished_at': fields.Datetime.now(),
+                'duration': time.time() - started,
+                'result': str(result)[:255] if result else False,
+            })
+        self._commit()
+
+    @api.model
+    def cron_process_jobs(self):
+        self._requeue_stale()
+        deadline = time.time() + WORKER_TIME_BUDGET
+        processed = 0
+        while time.time() < deadline:
+            job = self._acquire()
+            if not job:
+                break
+            job._run()
+            processed += 1
+        else:
+            # Out of time with work left: run again right away.
+            self.env.ref(WORKER_CRON_XMLID)._trigger()
+        if processed:
+            _logger.info("drive.job: %s jobs processed", processed)
+
+    def action_retry(self):
+        self.filtered(lambda j: j.state == 'failed')._reset_to_pending(attempts=0)
+        cron = self.env.ref(WORKER_CRON_XMLID, raise_if_not_found=False)
+        if cron:
+            cron._trigger()
@@ -0,0 +1 @@
+from . import drive_client
@@ -0,0 +1,116 @@
+"""Shared Google Drive v3 client.
+
+Every addon gets its Drive client here instead of building one per call:
+
+- credentials are loaded once per (file, scopes) and shared by the whole
+  process; google-auth refreshes the access token when it expires;
+- each thread keeps its own client, and so its own keep-alive HTTP
+  connection (httplib2 is not thread-safe), built from the discovery
+  document bundled with googleapiclient, without any network round trip;
+- ``execute_batch`` sends many requests in one HTTP call;
+- ``use_fake_service`` swaps every client for an in-memory fake.
+
+    service = get_drive_service(CREDENTIALS_PATH, DRIVE_READONLY_SCOPES)
+    results = execute_batch(service, {
+        name: service.files().list(q="name='%s'" % name) for name in names
+    })
+"""
+import logging
+import os
+import threading
+
+_logger = logging.getLogger(__name__)
+
+DRIVE_SCOPES = ('https://www.googleapis.com/auth/drive',)
+DRIVE_READONLY_SCOPES = ('https://www.googleapis.com/auth/drive.readonly',)
+
+HTTP_TIMEOUT = 60
+# Maximum number of calls in one Drive batch request.
+BATCH_LIMIT = 100
+
+_lock = threading.Lock()
+_credentials = {}
+_local = threading.local()
+_fake_service = None
+
+
+def _get_credentials(credentials_path, scopes):
+    from google.oauth2.service_account import Credentials
+
+    key = (credentials_path, scopes)
+    with _lock:
+        credentials = _credentials.get(key)
+        if credentials is None:
+            if not os.path.exists(credentials_path):
+                raise FileNotFoundError(f"Service account file not found at {credentials_path}")
+            credentials = Credentials.from_service_account_file(credentials_path, scopes=list(scopes))
+            _credentials[key] = credentials
+        return credentials
+
+
+def get_drive_service(credentials_path, scopes=DRIVE_READONLY_SCOPES):
+    """Drive v3 client of the current thread for these credentials and scopes."""
+    if _fake_service is not None:
+        return _fake_service
+
+    scopes = tuple(scopes)
+    services = getattr(_local, 'services', None)
+    if services is None:
+        services = _local.services = {}
+    service = services.get((credentials_path, scopes))
+    if service is None:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        from googleapiclient.discovery import build
+
+        http = AuthorizedHttp(
+            _get_credentials(credentials_path, scopes),
+            http=httplib2.Http(timeout=HTTP_TIMEOUT),
+        )
+        service = build('drive', 'v3', http=http, cache_discovery=False, static_discovery=True)
+        services[(credentials_path, scopes)] = service
+        _logger.debug("Drive client built for %s %s", credentials_path, scopes)
+    return service
+
+
+def execute_batch(service, requests):
+    """Execute many Drive requests with as few HTTP calls as possible.
+
+    :param requests: {key: unexecuted request}
+    :return: {key: response}, the response being the exception raised by
+        the request when it failed
+    """
+    items = list(requests.items())
+    results = {}
+
+    def callback(request_id, response, exception):
+        results[items[int(request_id)][0]] = exception if exception is not None else response
+
+    for start in range(0, len(items), BATCH_LIMIT):
+        batch = service.new_batch_http_request(callback=callback)
+        for index in range(start, min(start + BATCH_LIMIT, len(items))):
+            batch.add(items[index][1], request_id=str(index))
+        batch.execute()
+    return results
+
+
+def use_fake_service(service=None):
+    """Serve ``service`` (a new FakeDriveService by default) to every caller.
+
+    Returns the fake; ``reset()`` goes back to the real Drive.
+    """
+    global _fake_service
+    if service is None:
+        from .drive_fake import FakeDriveService
+        service = FakeDriveService()
+    _fake_service = service
+    return service
+
+
+def reset():
+    """Forget the fake, the cached credentials and this thread's clients."""
+    global _fake_service
+    _fake_service = None
+    with _lock:
+        _credentials.clear()
+    _local.services = {}
@@ -0,0 +1,239 @@
+"""In-memory stand-in for the Google Drive v3 client.
+
+Implements the subset of ``files()``, ``changes()``, ``permissions()`` and
+batch requests used by the addons, with the same ``.execute()`` call style,
+so Drive code can be exercised without network access. Install it with
+``drive_client.use_fake_service()``::
+
+    drive = FakeDriveService()
+    ste = drive.add_folder('SOCIETE', 'root')
+    sub = drive.add_folder('1234567 - FOURNISSEUR', ste)
+    drive.add_file('CHQ 1234567.pdf', sub)
+
+Only the query clauses the addon emits are understood: ``field='value'``,
+``field!='value'``, ``name contains 'value'``, ``'id' in parents``,
+``trashed=true|false`` and ``modifiedTime > 'value'``, joined by ``and``.
+"""
+import itertools
+import re
+from datetime import datetime, timedelta
+
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+
+_CLAUSE_RE = re.compile(
+    r"^(?:'(?P<parent>[^']*)' in parents"
+    r"|(?P<field>\w+)\s*(?P<op>!=|=|>|<|contains)\s*(?P<value>'(?:[^'\\]|\\.)*'|true|false))$"
+)
+
+
+def _parse_query(query):
+    clauses = []
+    for raw in re.split(r"\s+and\s+", (query or '').strip()):
+        if not raw:
+            continue
+        match = _CLAUSE_RE.match(raw.strip())
+        if not match:
+            raise ValueError("Unsupported Drive query clause: %r" % raw)
+        if match.group('parent') is not None:
+            clauses.append(('parents', 'in', match.group('parent')))
+            continue
+        value = match.group('value')
+        if value in ('true', 'false'):
+            value = value == 'true'
+        else:
+            value = value[1:-1].replace("\\'", "'")
+        clauses.append((match.group('field'), match.group('op'), value))
+    return clauses
+
+
+def _matches(item, clauses):
+    for field, op, value in clauses:
+        if field == 'parents':
+            if value not in item.get('parents', []):
+                return False
+            continue
+        current = item.get(field)
+        if op == '=' and current != value:
+            return False
+        if op == '!=' and current == value:
+            return False
+        if op == '>' and not (current or '') > value:
+            return False
+        if op == '<' and not (current or '') < value:
+            return False
+        # Drive matches name prefixes; a case-insensitive substring is close enough.
+        if op == 'contains' and value.lower() not in (current or '').lower():
+            return False
+    return True
+
+
+class _Request:
+
+    def __init__(self, drive, func):
+        self._drive = drive
+        self._func = func
+
+    def execute(self, http=None, num_retries=0):
+        self._drive.http_calls += 1
+        return self._func()
+
+    def next_chunk(self, http=None, num_retries=0):
+        return None, self.execute()
+
+
+class _Files:
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, q=None, fields=None, pageSize=100, pageToken=None, **kwargs):
+        def run():
+            clauses = _parse_query(q)
+            items = [dict(item) for item in self._drive.items.values() if _matches(item, clauses)]
+            start = int(pageToken or 0)
+            page = items[start:start + pageSize]
+            result = {'files': page}
+            if start + pageSize < len(items):
+                result['nextPageToken'] = str(start + pageSize)
+            return result
+        return _Request(self._drive, run)
+
+    def get(self, fileId, fields=None, **kwargs):
+        return _Request(self._drive, lambda: dict(self._drive.items[fileId]))
+
+    def create(self, body, media_body=None, fields=None, **kwargs):
+        def run():
+            parents = body.get('parents') or [None]
+            file_id = self._drive.add_file(
+                body['name'], parents[0], mime_type=body.get('mimeType', 'application/pdf'))
+            return dict(self._drive.items[file_id])
+        return _Request(self._drive, run)
+
+
+class _Changes:
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        return _Request(self._drive, lambda: {'startPageToken': str(len(self._drive.change_log))})
+
+    def list(self, pageToken, fields=None, pageSize=100, **kwargs):
+        def run():
+            start = int(pageToken)
+            page = self._drive.change_log[start:start + pageSize]
+            changes = []
+            for file_id in page:
+                item = self._drive.items.get(file_id)
+                change = {'fileId': file_id, 'removed': item is None}
+                if item is not None:
+                    change['file'] = dict(item)
+                changes.append(change)
+            result = {'changes': changes}
+            if start + pageSize < len(self._drive.change_log):
+                result['nextPageToken'] = str(start + pageSize)
+            else:
+                result['newStartPageToken'] = str(len(self._drive.change_log))
+            return result
+        return _Request(self._drive, run)
+
+
+class _Permissions:
+
+    def __init__(self, drive):
+        self._drive = drive
+
+    def create(self, fileId, body, **kwargs):
+        def run():
+            self._drive.items[fileId].setdefault('permissions', []).append(dict(body))
+            return dict(body)
+        return _Request(self._drive, run)
+
+
+class _Batch:
+    """Same interface as googleapiclient.http.BatchHttpRequest."""
+
+    def __init__(self, drive, callback=None):
+        self._drive = drive
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if request_id is None:
+            request_id = str(len(self._requests) + 1)
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, http=None):
+        self._drive.http_calls += 1
+        for request_id, request, callback in self._requests:
+            try:
+                response, exception = request._func(), None
+            except Exception as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class FakeDriveService:
+    """Drive v3 client double holding files in a dict, with a change log."""
+
+    def __init__(self):
+        self.items = {}
+        self.change_log = []
+        self.calls = 0
+        self.http_calls = 0
+        self._ids = itertools.count(1)
+        self._clock = datetime(2025, 1, 1)
+
+    # Client API -------------------------------------------------------
+
+    def files(self):
+        self.calls += 1
+        return _Files(self)
+
+    def changes(self):
+        self.calls += 1
+        return _Changes(self)
+
+    def permissions(self):
+        self.calls += 1
+        return _Permissions(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback=callback)
+
+    # Test helpers -----------------------------------------------------
+
+    def _touch(self, item):
+        self._clock += timedelta(seconds=1)
+        item['modifiedTime'] = self._clock.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        self.change_log.append(item['id'])
+
+    def add_file(self, name, parent_id, mime_type='application/pdf'):
+        file_id = 'fake%06d' % next(self._ids)
+        item = {
+            'id': file_id,
+            'name': name,
+            'mimeType': mime_type,
+            'parents': [parent_id] if parent_id else [],
+            'webViewLink': 'https://drive.google.com/file/d/%s/view' % file_id,
+            'trashed': False,
+        }
+        self.items[file_id] = item
+        self._touch(item)
+        return file_id
+
+    def add_folder(self, name, parent_id):
+        return self.add_file(name, parent_id, mime_type=FOLDER_MIMETYPE)
+
+    def rename(self, file_id, name):
+        self.items[file_id]['name'] = name
+        self._touch(self.items[file_id])
+
+    def trash(self, file_id):
+        self.items[file_id]['trashed'] = True
+        self._touch(self.items[file_id])
+
+    def delete(self, file_id):
+        del self.items[file_id]
+        self.change_log.append(file_id)
@@ -3,8 +3,8 @@
     'summary': 'Module pour la gestion finance',
     'author': 'Ayoub Akhrif',
     'category': 'Accounting',
-    'version': '1.0',
-    'depends': ['base', 'mail', 'logistique', 'douane', 'custom_employee'],
+    'version': '1.2',
+    'depends': ['base', 'mail', 'logistique', 'douane', 'custom_employee', 'drive_sync'],
     'data': [
         'security/groups.xml',
         'security/ir.model.access.csv',
@@ -21,6 +21,7 @@
         'views/finance_sutra_view.xml',
         'views/finance_sutra_payment_view.xml',
         'views/finance_marglory_view.xml',
+        'views/drive_index_view.xml',
         'reports/cheque_request_report.xml',
         'data/cron.xml',
     ],
@@ -0,0 +1,8 @@
+def migrate(cr, version):
+    # Badges are rendered client-side from chq_exist / dem_exist / doc_exist.
+    cr.execute("""
+        ALTER TABLE datacheque
+            DROP COLUMN IF EXISTS existing_tag,
+            DROP COLUMN IF EXISTS existing_dem_tag,
+            DROP COLUMN IF EXISTS existing_doc_tag
+    """)
@@ -0,0 +1,7 @@
+def migrate(cr, version):
+    # Backfill chq_num in SQL: the column then exists and the ORM does not recompute it.
+    cr.execute("ALTER TABLE datacheque ADD COLUMN IF NOT EXISTS chq_num integer")
+    cr.execute("""
+        UPDATE datacheque
+        SET chq_num = CASE WHEN btrim(chq) ~ '^[0-9]+$' THEN btrim(chq)::integer ELSE 0 END
+    """)
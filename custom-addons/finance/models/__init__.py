@@ -5,6 +5,7 @@ from . import finance_perso
 from . import finance_benif
 from . import finance_ste
 from . import data_cheque
+from . import finance_drive_file
 from . import edit_request
 from . import cheque_encaisse
 from . import logistics_tracking
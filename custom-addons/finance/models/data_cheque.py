@@ -1,10 +1,28 @@
-from odoo import models, fields, api
+import logging
+import threading
+import time
+from collections import defaultdict
+
+import pytz
+
+from odoo import models, fields, api, tools
 from odoo.exceptions import UserError, ValidationError
+from odoo.osv import expression
 from datetime import timedelta
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from markupsafe import Markup
 
+from odoo.addons.drive_sync.services.drive_client import get_drive_service, DRIVE_READONLY_SCOPES
+
+_logger = logging.getLogger(__name__)
+
+TALON_CRON_CHUNK_SIZE = 5000
+PDF_SYNC_CHUNK_SIZE = 1000
+# Dernier id traité par cron_sync_all_pdf (reprise après interruption).
+PDF_SYNC_CHECKPOINT_PARAM = 'finance.pdf_sync.last_id'
+PDF_KEYWORDS = ('CHQ', 'DEM', 'DOC')
+# Heure locale (fuseau du créateur) à partir de laquelle un chèque du jour est verrouillé
+LOCK_HOUR = 19
+
 class DataCheque(models.Model):
     _name = 'datacheque'
     _description = 'Data chèque'
@@ -13,10 +31,15 @@ class DataCheque(models.Model):
     _rec_name = 'chq'
 
     chq = fields.Char(string='Chèque', tracking=True, size=7, required=True)
+    # 0 when chq is not purely numeric.
+    chq_num = fields.Integer(string='N° Chèque', compute='_compute_chq_num', store=True)
     is_manager = fields.Boolean(compute='_compute_is_manager', string="Is Manager")
     def _compute_is_manager(self):
-        for rec in self:
-            rec.is_manager = self.env.user.has_group('finance.group_finance_user')
+        self.is_manager = self._is_finance_manager()
+
+    def _is_finance_manager(self):
+        """Groupe manager Finance de l'utilisateur courant, résolu une fois par recordset."""
+        return self.env.user.has_group('finance.group_finance_user')
     amount = fields.Float(string='Montant', tracking=True, group_operator="sum", required=True, sum="Total")
     date_operation = fields.Date(string='Date Operation', default=fields.Date.context_today)
     date_payment = fields.Date(string='Date Paiement')
@@ -36,7 +59,6 @@ class DataCheque(models.Model):
         ('annule', 'Annulé'),
     ], string='Facture', tracking=True, required=True, default='m')
     journal = fields.Integer(string='Journal N°', required=True, default=None)
-    facture_tag = fields.Html(string='Facture', compute='_compute_facture_tag', sanitize=False, optional=True)
     state = fields.Selection([
         ('actif', 'Actif'),
         ('annule', 'Annulé'),
@@ -72,15 +94,14 @@ class DataCheque(models.Model):
         ('doc_exists', 'Existe'),
         ('doc_not_exists', 'Manquant'),
     ], readonly=True, optional=True)
-    existing_tag = fields.Html(string='Présence CHQ', compute='_compute_existance_tag', sanitize=False, optional=True, store=True)
-    existing_dem_tag = fields.Html(string='Présence DEM', compute='_compute_existance_dem_tag', sanitize=False, optional=True, store=True)
-    existing_doc_tag = fields.Html(string='Présence DOC', compute='_compute_existance_doc_tag', sanitize=False, optional=True, store=True)
     talon_id = fields.Many2one('finance.talon', string='Talon', tracking=True, domain="[('ste_id', '=', ste_id)]")
 
     # Edit Lock Fields
     unlock_until = fields.Datetime(string="Déverrouillé jusqu'à", help="Si défini, le chèque peut être modifié jusqu'à cette date", tracking=True)
     unlock_until_label = fields.Char(compute='_compute_unlock_until_label', string="Label date déverrouillage")
-    is_locked = fields.Boolean(string="Verrouillé", compute='_compute_is_locked', help="Indique si le chèque est verrouillé pour l'utilisateur actuel")
+    locked_at = fields.Datetime(string="Verrouillé à partir de", compute='_compute_locked_at', store=True, index=True,
+                                help="19h00 le jour de la création, ou la fin du déverrouillage temporaire si elle est plus tardive")
+    is_locked = fields.Boolean(string="Verrouillé", compute='_compute_is_locked', search='_search_is_locked', help="Indique si le chèque est verrouillé pour l'utilisateur actuel")
     # ------------------------------------------------------------
     # EDIT LOCK LOGIC
     # ------------------------------------------------------------
@@ -94,149 +115,42 @@ class DataCheque(models.Model):
             else:
                 rec.unlock_until_label = ""
 
-    @api.depends('unlock_until')
+    @api.depends('create_date', 'unlock_until')
+    def _compute_locked_at(self):
+        for rec in self:
+            if not rec.create_date:
+                rec.locked_at = False
+                continue
+            tz = pytz.timezone(rec.create_uid.tz or 'UTC')
+            created_local = pytz.utc.localize(rec.create_date).astimezone(tz)
+            deadline = tz.localize(
+                created_local.replace(hour=LOCK_HOUR, minute=0, second=0, microsecond=0, tzinfo=None)
+            ).astimezone(pytz.utc).replace(tzinfo=None)
+            # Un déverrouillage temporaire repousse l'échéance
+            rec.locked_at = max(deadline, rec.unlock_until) if rec.unlock_until else deadline
+
+    @api.depends('locked_at')
     def _compute_is_locked(self):
         """Compute if cheque is locked for current user."""
+        # Managers are never locked
+        if self._is_finance_manager():
+            self.is_locked = False
+            return
+        now = fields.Datetime.now()
         for rec in self:
-            # Managers are never locked
-            if self.env.user.has_group('finance.group_finance_user'):
-                rec.is_locked = False
-                continue
-            
-            now = fields.Datetime.now()
-            
-            # If temporarily unlocked and not expired, allow edit
-            if rec.unlock_until and rec.unlock_until > now:
-                rec.is_locked = False
-                continue
-            
-            # Check if created today and before 19:00
-            if rec.create_date:
-                create_date_local = fields.Datetime.context_timestamp(rec, rec.create_date)
-                today_local = fields.Datetime.context_timestamp(rec, now)
-                
-                # If created on a different day, it's locked
-                if create_date_local.date() != today_local.date():
-                    rec.is_locked = True
-                    continue
-                
-                # If created today but after 19:00, it's locked
-                if today_local.hour >= 19:
-                    rec.is_locked = True
-                    continue
-            
-            # Otherwise, it's editable
-            rec.is_locked = False
+            rec.is_locked = bool(rec.locked_at) and rec.locked_at <= now
+
+    def _search_is_locked(self, operator, value):
+        if operator not in ('=', '!='):
+            raise UserError("Opérateur non supporté pour le verrouillage : %s" % operator)
+        locked = (operator == '=') == bool(value)
+        if self._is_finance_manager():
+            return expression.FALSE_DOMAIN if locked else expression.TRUE_DOMAIN
+        now = fields.Datetime.now()
+        if locked:
+            return [('locked_at', '<=', now)]
+        return ['|', ('locked_at', '=', False), ('locked_at', '>', now)]
     
-    # ------------------------------------------------------------
-    # BADGE VISUEL
-    # ------------------------------------------------------------
-    @api.depends('facture_tag', 'facture', 'serie')
-    def _compute_facture_tag(self):
-        for rec in self:
-
-            factur = rec.facture or ""  # nom de la facture
-
-            # --- Conditions selon ta demande ---
-            if factur == "fact":           # commence par 
-                label = rec.serie or "F/"
-                color = "#28a745"  # vert
-                bg = "rgba(40,167,69,0.12)"
-
-            elif factur == "m":                   # exactement = M
-                label = "M"
-                color = "#dc3545"  # rouge
-                bg = "rgba(220,53,69,0.12)"
-
-            elif factur == "bureau":             # exactement = Bureau
-                label = "Bureau"
-                color = "#007bff"  # bleu
-                bg = "rgba(0,123,255,0.12)"
-
-            else:                                  # tout le reste
-                label = factur
-                color = "#6c757d"  # gris
-                bg = "rgba(108,117,125,0.12)"
-
-            rec.facture_tag = (
-                f"<span style='display:inline-block;padding:2px 8px;border-radius:12px;"
-                f"font-weight:600;background:{bg};color:{color};'>"
-                f"{label}"
-                f"</span>"
-            )
-
-    @api.depends('existing_tag', 'chq_exist', 'chq_pdf_url')
-    def _compute_existance_tag(self):
-        for rec in self:
-
-            existance = rec.chq_exist or ""  # présence de chèque
-
-            # --- Conditions selon ta demande ---
-            if existance == "chq_exists":           # commence par 
-                label = "CHQ Existe"
-                color = "#28a745"  # vert
-                bg = "rgba(40,167,69,0.12)"
-
-            else:                   # exactement = M
-                label = "CHQ Manquant"
-                color = "#dc3545"  # rouge
-                bg = "rgba(220,53,69,0.12)"
-
-            rec.existing_tag = (
-                f"<span style='display:inline-block;padding:2px 8px;border-radius:12px;"
-                f"font-weight:600;background:{bg};color:{color};'>"
-                f"{label}"
-                f"</span>"
-            )
-
-    @api.depends('dem_exist', 'dem_pdf_url', 'existing_dem_tag')
-    def _compute_existance_dem_tag(self):
-        for rec in self:
-
-            existance = rec.dem_exist or ""  # présence de chèque
-
-            # --- Conditions selon ta demande ---
-            if existance == "dem_exists":           # commence par 
-                label = "DEM Existe"
-                color = "#28a745"  # vert
-                bg = "rgba(40,167,69,0.12)"
-
-            else:                   # exactement = M
-                label = "DEM Manquant"
-                color = "#dc3545"  # rouge
-                bg = "rgba(220,53,69,0.12)"
-
-            rec.existing_dem_tag = (
-                f"<span style='display:inline-block;padding:2px 8px;border-radius:12px;"
-                f"font-weight:600;background:{bg};color:{color};'>"
-                f"{label}"
-                f"</span>"
-            )
-
-    @api.depends('doc_exist', 'doc_pdf_url', 'existing_doc_tag')
-    def _compute_existance_doc_tag(self):
-        for rec in self:
-
-            existance = rec.doc_exist or ""  # présence de chèque
-
-            # --- Conditions selon ta demande ---
-            if existance == "doc_exists":           # commence par 
-                label = "DOC Existe"
-                color = "#28a745"  # vert
-                bg = "rgba(40,167,69,0.12)"
-
-            else:                   # exactement = M
-                label = "DOC Manquant"
-                color = "#dc3545"  # rouge
-                bg = "rgba(220,53,69,0.12)"
-
-            rec.existing_doc_tag = (
-                f"<span style='display:inline-block;padding:2px 8px;border-radius:12px;"
-                f"font-weight:600;background:{bg};color:{color};'>"
-                f"{label}"
-                f"</span>"
-            )
-
     # ------------------------------------------------------------
     # Calcul de week
     # ------------------------------------------------------------
@@ -424,35 +338,25 @@ class DataCheque(models.Model):
                 rec.date_emission = False
                 rec.date_echeance = False
                 
+    def init(self):
+        tools.create_index(
+            self.env.cr, 'datacheque_ste_talon_chq_num_idx', self._table, ['ste_id', 'talon_id', 'chq_num'])
+
+    @api.depends('chq')
+    def _compute_chq_num(self):
+        for rec in self:
+            raw = (rec.chq or "").strip()
+            rec.chq_num = int(raw) if raw.isdigit() else 0
+
     # -------------------------------------------------------------------
     # Calculate TALON
     # -------------------------------------------------------------------
     def _find_talon_logic(self):
         self.ensure_one()
-        if not self.chq or not self.ste_id:
-            return False
-            
-        if not self.chq.isdigit():
+        if not self.chq_num or not self.ste_id:
             return False
 
-        chq_num = int(self.chq)
-
-        talons = self.env['finance.talon'].search([
-            ('ste_id', '=', self.ste_id.id),
-            ('num_chq', '>', 0),
-            ('name', '!=', False),
-        ])
-
-        for talon in talons:
-            if not talon.name or not talon.name.isdigit():
-                continue
-
-            start = int(talon.name)
-            end = start + talon.num_chq - 1
-
-            if start <= chq_num <= end:
-                return talon
-        return False
+        return self.env['finance.talon']._find_for_cheque(self.ste_id.id, self.chq_num)
 
     @api.onchange('chq', 'ste_id')
     def _onchange_find_talon(self):
@@ -465,14 +369,50 @@ class DataCheque(models.Model):
     # -------------------------------------------------------------------
     @api.model
     def cron_find_all_talons(self):
-        """Met à jour les talons pour tous les chèques (3 fois seulement)."""
-        # On peut optimiser en ne prenant que ceux sans talon, 
-        # mais la demande semble générale.
-        records = self.search([])
-        for rec in records:
-            found = rec._find_talon_logic()
-            if found and rec.talon_id != found:
-                rec.talon_id = found
+        """Met à jour les talons pour tous les chèques (3 fois seulement).
+
+        The cheque -> talon mapping is computed with one join on the talon
+        ranges; only the changed assignments are written, in chunks and
+        without tracking, and the talon counters are recomputed once at the end.
+        """
+        started = time.time()
+        self.flush_model(['chq_num', 'ste_id', 'talon_id'])
+        self.env['finance.talon'].flush_model(['ste_id', 'range_start', 'range_end'])
+        self.env.cr.execute("""
+            SELECT m.cheque_id, m.talon_id, c.talon_id
+            FROM (
+                SELECT DISTINCT ON (c.id) c.id AS cheque_id, t.id AS talon_id
+                FROM datacheque c
+                JOIN finance_talon t
+                  ON t.ste_id = c.ste_id
+                 AND c.chq_num BETWEEN t.range_start AND t.range_end
+                WHERE c.chq_num > 0
+                ORDER BY c.id, t.id
+            ) m
+            JOIN datacheque c ON c.id = m.cheque_id
+            WHERE c.talon_id IS DISTINCT FROM m.talon_id
+        """)
+        changes = self.env.cr.fetchall()
+        affected_talons = {row[1] for row in changes} | {row[2] for row in changes if row[2]}
+
+        for start in range(0, len(changes), TALON_CRON_CHUNK_SIZE):
+            chunk = changes[start:start + TALON_CRON_CHUNK_SIZE]
+            cheques = self.browse([c[0] for c in chunk])
+            # Old talons lose the cheques, new ones gain them.
+            cheques.modified(['talon_id'], before=True)
+            self.env.cr.execute("""
+                UPDATE datacheque c SET talon_id = v.talon_id
+                FROM unnest(%s::int[], %s::int[]) AS v(id, talon_id)
+                WHERE c.id = v.id
+            """, [[c[0] for c in chunk], [c[1] for c in chunk]])
+            cheques.invalidate_recordset(['talon_id'])
+            cheques.modified(['talon_id'])
+        self.env.flush_all()
+
+        _logger.info(
+            "cron_find_all_talons: %s cheques reassigned, %s talons recomputed in %.2fs",
+            len(changes), len(affected_talons), time.time() - started)
+        return len(changes)
 
     # -------------------------------------------------------------------
     # SEQUENCE INTEGRITY CHECK
@@ -495,35 +435,22 @@ class DataCheque(models.Model):
         # Can't rely on 'talon_id' in vals because it might be computed later.
         # We assume the standard logic applies.
         
-        # Reuse logic logic but optimized for 'vals' context
-        talons = self.env['finance.talon'].search([
-            ('ste_id', '=', ste_id),
-            ('num_chq', '>', 0),
-            ('name', '!=', False),
-        ])
-        
-        target_talon = False
-        for talon in talons:
-            if not talon.name.isdigit(): continue
-            start = int(talon.name)
-            end = start + talon.num_chq - 1
-            if start <= chq_num <= end:
-                target_talon = talon
-                break
-        
+        target_talon = self.env['finance.talon']._find_for_cheque(ste_id, chq_num)
+
         if not target_talon:
              return # No talon found -> standard creation (or error elsewhere)
 
-        # 2. Find LAST EXISTING cheque for this talon
+        # 2. Find LAST EXISTING cheque for this talon (index range scan on chq_num)
         last_cheque = self.search([
+            ('ste_id', '=', ste_id),
             ('talon_id', '=', target_talon.id),
-            ('chq', '!=', False)
-        ], order='chq desc', limit=1)
+            ('chq_num', '>', 0),
+        ], order='chq_num desc', limit=1)
 
         if not last_cheque:
             return # First cheque of the talon -> Allowed
 
-        last_num = int(last_cheque.chq)
+        last_num = last_cheque.chq_num
         expected_num = last_num + 1
 
         if chq_num <= last_num:
@@ -547,101 +474,78 @@ class DataCheque(models.Model):
 
     # 1) Connexion API Google Drive
     def _get_drive_service(self):
-        creds_path = self._get_drive_credentials_path()
-        scopes = ['https://www.googleapis.com/auth/drive.readonly']
-        creds = service_account.Credentials.from_service_account_file(creds_path, scopes=scopes)
-        return build('drive', 'v3', credentials=creds)
-
-    # 2) Recherche dossier exact
-    def _find_folder_exact(self, service, folder_name, parent_id):
-        query = (
-            "mimeType='application/vnd.google-apps.folder' "
-            f"and name='{folder_name}' "
-            f"and '{parent_id}' in parents and trashed=false"
-        )
-        res = service.files().list(q=query, fields="files(id, name)").execute()
-        f = res.get("files", [])
-        return f[0]["id"] if f else None
-
-    # 3) Trouver sous-dossier contenant le numéro du chèque
-    def _find_folder_contains(self, service, keyword, parent_id):
-        query = (
-            "mimeType='application/vnd.google-apps.folder' "
-            f"and name contains '{keyword}' "
-            f"and '{parent_id}' in parents and trashed=false"
-        )
-        res = service.files().list(q=query, fields="files(id, name)").execute()
-        f = res.get("files", [])
-        return f[0]["id"] if f else None
-
-    # 4) Recherche PDF contenant CHQ
-    def _find_pdf_by_keyword(self, service, parent_id, keyword):
-        """Cherche un PDF contenant un mot-clé (CHQ / DEM / DOC) dans le même dossier."""
-        query = (
-            "mimeType='application/pdf' "
-            f"and name contains '{keyword}' "
-            f"and '{parent_id}' in parents "
-            "and trashed=false"
-        )
-        res = service.files().list(q=query, fields="files(id, name, webViewLink)").execute()
-        f = res.get("files", [])
-        return f[0]["webViewLink"] if f else None
-
-    # 5) Fonction principale : trouver URL du CHQ
+        return get_drive_service(self._get_drive_credentials_path(), DRIVE_READONLY_SCOPES)
+
+    # 2) Racine Drive des chèques
+    def _get_drive_root_id(self):
+        return self.env["ir.config_parameter"].sudo().get_param("finance.drive.root_folder_id")
+
+    # 3) Recherche des PDF dans l'index Drive local (finance.drive.file)
+    def _lookup_pdf_urls(self):
+        """Liens CHQ / DEM / DOC des chèques de ``self``, par id, en une requête."""
+        root_id = self._get_drive_root_id()
+        records = self.filtered(lambda r: r.ste_id and r.chq)
+        found = self.env['finance.drive.file']._find_cheque_pdfs(
+            root_id, [(rec.ste_id.name, rec.chq) for rec in records])
+        return {rec.id: found.get((rec.ste_id.name, rec.chq), {}) for rec in records}
+
+    # 4) Fonction principale : trouver URL du CHQ
     def _get_pdf_url(self, keyword):
         """Retourne l'URL d'un PDF selon un mot-clé : CHQ, DEM ou DOC."""
-        icp = self.env["ir.config_parameter"].sudo()
-        root_id = icp.get_param("finance.drive.root_folder_id")
-
-        if not root_id or not self.ste_id or not self.chq:
-            return False
-
-        service = self._get_drive_service()
-
-        # Dossier Société
-        ste_folder_id = self._find_folder_exact(service, self.ste_id.name, root_id)
-        if not ste_folder_id:
-            return False
-
-        # Sous-dossier contenant le numéro de CHQ
-        sub_folder_id = self._find_folder_contains(service, self.chq, ste_folder_id)
-        if not sub_folder_id:
-            return False
-
-        # Chercher un PDF dans ce sous-dossier contenant le mot-clé
-        return self._find_pdf_by_keyword(service, sub_folder_id, keyword)
-
+        self.ensure_one()
+        return self._lookup_pdf_urls().get(self.id, {}).get(keyword, False)
 
-    # 6) Mettre à jour automatiquement l’URL
+    # 5) Mettre à jour automatiquement l’URL
     def _sync_pdf_url(self):
-        """Met à jour les PDF CHQ, DEM et DOC sans écraser les URLs déjà existantes."""
-        for rec in self:
-
-            # Si aucun contexte valide → tout désactiver
-            if not rec.ste_id or not rec.chq:
-                rec.chq_pdf_url = False
-                rec.dem_pdf_url = False
-                rec.doc_pdf_url = False
+        """Met à jour les PDF CHQ, DEM et DOC sans écraser les URLs déjà existantes.
 
-                rec.chq_exist = 'chq_not_exists'
-                rec.dem_exist = 'dem_not_exists'
-                rec.doc_exist = 'doc_not_exists'
-                continue
-
-            # 🔹 Ne chercher sur Google Drive QUE si l'URL est absente
-            if not rec.chq_pdf_url:
-                rec.chq_pdf_url = rec._get_pdf_url("CHQ")
-
-            if not rec.dem_pdf_url:
-                rec.dem_pdf_url = rec._get_pdf_url("DEM")
-
-            if not rec.doc_pdf_url:
-                rec.doc_pdf_url = rec._get_pdf_url("DOC")
+        Les liens et états modifiés sont écrits en une écriture par
+        combinaison de valeurs ; retourne le nombre de chèques modifiés.
+        """
+        links = self.filtered(
+            lambda r: not (r.chq_pdf_url and r.dem_pdf_url and r.doc_pdf_url)
+        )._lookup_pdf_urls()
+        to_write = defaultdict(list)
+        for rec in self:
+            found = links.get(rec.id, {})
+            vals = {}
+            for keyword in PDF_KEYWORDS:
+                prefix = keyword.lower()
+                # Si aucun contexte valide → tout désactiver
+                if not rec.ste_id or not rec.chq:
+                    url = False
+                else:
+                    url = rec[f'{prefix}_pdf_url'] or found.get(keyword, False)
+                exist = f'{prefix}_exists' if url else f'{prefix}_not_exists'
+                if rec[f'{prefix}_pdf_url'] != url:
+                    vals[f'{prefix}_pdf_url'] = url
+                if rec[f'{prefix}_exist'] != exist:
+                    vals[f'{prefix}_exist'] = exist
+            if vals:
+                to_write[tuple(sorted(vals.items()))].append(rec.id)
+        for vals, ids in to_write.items():
+            self.browse(ids).write(dict(vals))
+        return sum(len(ids) for ids in to_write.values())
+
+    # 6) Recherche différée (drive.job) des PDF encore absents de l'index
+    def _enqueue_pdf_lookup(self):
+        for rec in self.filtered(
+            lambda r: r.ste_id and r.chq and not (r.chq_pdf_url and r.dem_pdf_url and r.doc_pdf_url)
+        ):
+            self.env['drive.job']._enqueue(
+                rec, '_job_sync_pdf_url',
+                name="Recherche PDF chèque",
+                dedup_key='datacheque:%s:pdf' % rec.id,
+            )
 
-            # Mettre à jour les badges d’existence
-            rec.chq_exist = 'chq_exists' if rec.chq_pdf_url else 'chq_not_exists'
-            rec.dem_exist = 'dem_exists' if rec.dem_pdf_url else 'dem_not_exists'
-            rec.doc_exist = 'doc_exists' if rec.doc_pdf_url else 'doc_not_exists'
+    def _job_sync_pdf_url(self):
+        """Tâche Drive : rafraîchit l'index puis les liens PDF du chèque."""
+        self.env['finance.drive.file']._refresh_index()
+        self.sudo()._sync_pdf_url()
+        return ', '.join(
+            kw for kw, url in (('CHQ', self.chq_pdf_url), ('DEM', self.dem_pdf_url), ('DOC', self.doc_pdf_url))
+            if url
+        ) or "Aucun PDF trouvé"
 
 
     # ------------------------------------------------------------
@@ -761,6 +665,7 @@ class DataCheque(models.Model):
         rec = super().create(vals)
         rec._onchange_find_talon()
         rec._sync_pdf_url()
+        rec._enqueue_pdf_lookup()
         
         # --- Check Stock Alert ---
         try:
@@ -792,8 +697,8 @@ class DataCheque(models.Model):
 
     def write(self, vals):
         # Check edit lock BEFORE any modifications
-        # Skip lock check if user is manager
-        if not self.env.user.has_group('finance.group_finance_user'):
+        # Skip lock check if user is manager, or for system writes (sudo) such as the Drive link sync
+        if not self.env.su and not self._is_finance_manager():
             for rec in self:
                 # Check lock status directly (field is already computed)
                 # Do NOT call _compute_is_locked() here - it causes recursion
@@ -816,6 +721,7 @@ class DataCheque(models.Model):
         if "chq" in vals or "ste_id" in vals:
             self._onchange_find_talon()
             self._sync_pdf_url()
+            self._enqueue_pdf_lookup()
         return res
 
     # 8) Bouton ouverture PDF
@@ -828,17 +734,18 @@ class DataCheque(models.Model):
                 "url": self.chq_pdf_url,
                 "target": "new",
             }
-        self._sync_pdf_url()
+        self.sudo()._sync_pdf_url()
 
 
         # 🔄 1) Si aucune URL → essayer de synchroniser maintenant
         if not self.chq_pdf_url:
+            self._enqueue_pdf_lookup()
             return {
                 "type": "ir.actions.client",
                 "tag": "display_notification",
                 "params": {
                     "title": "PDF CHQ introuvable",
-                    "message": "Aucun PDF CHQ n'a été trouvé sur Google Drive pour ce chèque.",
+                    "message": "Aucun PDF CHQ n'a été trouvé sur Google Drive pour ce chèque. Une recherche sur Google Drive a été lancée, réessayez dans quelques instants.",
                     "type": "warning",
                     "sticky": False,
                 },
@@ -862,15 +769,16 @@ class DataCheque(models.Model):
                 "url": self.dem_pdf_url,
                 "target": "new",
             }
-        self._sync_pdf_url()
+        self.sudo()._sync_pdf_url()
 
         if not self.dem_pdf_url:
+            self._enqueue_pdf_lookup()
             return {
                 "type": "ir.actions.client",
                 "tag": "display_notification",
                 "params": {
                     "title": "PDF DEM introuvable",
-                    "message": "Aucun PDF DEM n'a été trouvé dans Google Drive.",
+                    "message": "Aucun PDF DEM n'a été trouvé dans Google Drive. Une recherche sur Google Drive a été lancée, réessayez dans quelques instants.",
                     "type": "warning",
                     "sticky": False,
                 },
@@ -893,15 +801,16 @@ class DataCheque(models.Model):
                 "url": self.doc_pdf_url,
                 "target": "new",
             }
-        self._sync_pdf_url()
+        self.sudo()._sync_pdf_url()
 
         if not self.doc_pdf_url:
+            self._enqueue_pdf_lookup()
             return {
                 "type": "ir.actions.client",
                 "tag": "display_notification",
                 "params": {
                     "title": "PDF DOC introuvable",
-                    "message": "Aucun PDF DOC n'a été trouvé dans Google Drive.",
+                    "message": "Aucun PDF DOC n'a été trouvé dans Google Drive. Une recherche sur Google Drive a été lancée, réessayez dans quelques instants.",
                     "type": "warning",
                     "sticky": False,
                 },
@@ -932,26 +841,36 @@ class DataCheque(models.Model):
     @api.model
     def cron_sync_all_pdf(self):
         """
-        Cron qui imite le comportement du bouton pour TOUS les chèques.
-        - Met à jour les flags si les URLs existent déjà.
-        - Sinon lance _sync_pdf_url() pour récupérer CHQ, DEM, DOC.
+        Réconcilie les liens PDF et états de TOUS les chèques avec
+        l'index Drive, rafraîchi une seule fois au début.
+        Les chèques sont traités par paquets d'id croissants, validés un par
+        un : une exécution interrompue reprend après le dernier paquet.
         """
-        records = self.search([])
-
-        for rec in records:
-
-            # --- 1) Si les URLs existent déjà, mise à jour des états ---
-            rec.chq_exist = 'chq_exists' if rec.chq_pdf_url else 'chq_not_exists'
-            rec.dem_exist = 'dem_exists' if rec.dem_pdf_url else 'dem_not_exists'
-            rec.doc_exist = 'doc_exists' if rec.doc_pdf_url else 'doc_not_exists'
-
-            # --- 2) Si au moins une URL manque -> aller chercher dans Drive ---
-            if not rec.chq_pdf_url or not rec.dem_pdf_url or not rec.doc_pdf_url:
-                rec._sync_pdf_url()
-            rec._compute_existance_tag()
-            rec._compute_existance_dem_tag()
-            rec._compute_existance_doc_tag()
-
+        started = time.time()
+        icp = self.env['ir.config_parameter'].sudo()
+        self.env['finance.drive.file']._refresh_index()
+
+        last_id = int(icp.get_param(PDF_SYNC_CHECKPOINT_PARAM) or 0)
+        if last_id:
+            _logger.info("cron_sync_all_pdf: reprise après le chèque %s", last_id)
+        cheques = self.sudo()
+        processed = updated = 0
+        while True:
+            records = cheques.search([('id', '>', last_id)], order='id', limit=PDF_SYNC_CHUNK_SIZE)
+            if not records:
+                break
+            updated += records._sync_pdf_url()
+            processed += len(records)
+            last_id = records[-1].id
+            icp.set_param(PDF_SYNC_CHECKPOINT_PARAM, last_id)
+            if not getattr(threading.current_thread(), 'testing', False):
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+        icp.set_param(PDF_SYNC_CHECKPOINT_PARAM, 0)
+        _logger.info(
+            "cron_sync_all_pdf: %s chèques vérifiés, %s mis à jour en %.2fs",
+            processed, updated, time.time() - started)
         return True
 
     # ------------------------------------------------------------
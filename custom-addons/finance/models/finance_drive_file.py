@@ -0,0 +1,210 @@
+import logging
+import time
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+FOLDER_MIMETYPE = 'application/vnd.google-apps.folder'
+PDF_MIMETYPE = 'application/pdf'
+DRIVE_PAGE_SIZE = 1000
+DRIVE_FILE_FIELDS = 'id, name, mimeType, parents, webViewLink, modifiedTime, trashed'
+
+# Drive changes page token of the last index refresh.
+CHANGES_TOKEN_PARAM = 'finance.drive.changes_token'
+
+
+class FinanceDriveFile(models.Model):
+    """Local copy of the Drive metadata (folders and files) visible to the
+    finance service account, so that cheque PDF lookups never hit the network.
+
+    The first refresh lists every file; the next ones only replay the Drive
+    changes feed since the stored page token.
+    """
+    _name = 'finance.drive.file'
+    _description = 'Index Google Drive'
+    _log_access = False
+    _order = 'name'
+
+    drive_id = fields.Char(string='ID Drive', required=True, readonly=True)
+    name = fields.Char(string='Nom', readonly=True)
+    mime_type = fields.Char(string='Type', readonly=True)
+    parent_drive_id = fields.Char(string='Dossier Parent', readonly=True, index=True)
+    web_view_link = fields.Char(string='Lien', readonly=True)
+    modified_time = fields.Char(string='Modifié le', readonly=True)
+
+    _sql_constraints = [
+        ('unique_drive_id', 'unique(drive_id)', 'Fichier Drive déjà indexé.')
+    ]
+
+    def _get_drive_service(self):
+        return self.env['datacheque']._get_drive_service()
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _upsert(self, items):
+        items = [item for item in items if not item.get('trashed')]
+        if not items:
+            return
+        self.env.cr.execute("""
+            INSERT INTO finance_drive_file
+                (drive_id, name, mime_type, parent_drive_id, web_view_link, modified_time)
+            SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[],
+                                 %s::varchar[], %s::varchar[], %s::varchar[])
+            ON CONFLICT (drive_id) DO UPDATE SET
+                name = EXCLUDED.name,
+                mime_type = EXCLUDED.mime_type,
+                parent_drive_id = EXCLUDED.parent_drive_id,
+                web_view_link = EXCLUDED.web_view_link,
+                modified_time = EXCLUDED.modified_time
+        """, [
+            [item['id'] for item in items],
+            [item.get('name') for item in items],
+            [item.get('mimeType') for item in items],
+            [(item.get('parents') or [None])[0] for item in items],
+            [item.get('webViewLink') for item in items],
+            [item.get('modifiedTime') for item in items],
+        ])
+
+    @api.model
+    def _remove(self, drive_ids):
+        if drive_ids:
+            self.env.cr.execute("DELETE FROM finance_drive_file WHERE drive_id = ANY(%s)", [list(drive_ids)])
+
+    @api.model
+    def _full_scan(self, service):
+        self.env.cr.execute("CREATE TEMP TABLE finance_drive_seen (drive_id varchar PRIMARY KEY) ON COMMIT DROP")
+        count, page_token = 0, None
+        while True:
+            result = service.files().list(
+                q="trashed=false",
+                fields="nextPageToken, files(%s)" % DRIVE_FILE_FIELDS,
+                pageSize=DRIVE_PAGE_SIZE,
+                pageToken=page_token,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            ).execute()
+            items = result.get('files', [])
+            self._upsert(items)
+            self.env.cr.execute(
+                "INSERT INTO finance_drive_seen SELECT unnest(%s::varchar[]) ON CONFLICT DO NOTHING",
+                [[item['id'] for item in items]])
+            count += len(items)
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                break
+        self.env.cr.execute("""
+            DELETE FROM finance_drive_file f
+            WHERE NOT EXISTS (SELECT 1 FROM finance_drive_seen s WHERE s.drive_id = f.drive_id)
+        """)
+        self.env.cr.execute("DROP TABLE finance_drive_seen")
+        return count
+
+    @api.model
+    def _replay_changes(self, service, page_token):
+        count = 0
+        while True:
+            result = service.changes().list(
+                pageToken=page_token,
+                fields="nextPageToken, newStartPageToken, changes(fileId, removed, file(%s))" % DRIVE_FILE_FIELDS,
+                pageSize=DRIVE_PAGE_SIZE,
+                supportsAllDrives=True,
+                includeItemsFromAllDrives=True,
+            ).execute()
+            changes = result.get('changes', [])
+            self._remove([
+                change['fileId'] for change in changes
+                if change.get('removed') or (change.get('file') or {}).get('trashed')
+            ])
+            self._upsert([
+                change['file'] for change in changes
+                if not change.get('removed') and change.get('file')
+            ])
+            count += len(changes)
+            if result.get('newStartPageToken'):
+                return count, result['newStartPageToken']
+            page_token = result['nextPageToken']
+
+    @api.model
+    def _refresh_index(self, full=False):
+        """Bring the index up to date with Drive; returns the number of entries read."""
+        started = time.time()
+        icp = self.env['ir.config_parameter'].sudo()
+        service = self._get_drive_service()
+        page_token = icp.get_param(CHANGES_TOKEN_PARAM)
+        if full or not page_token:
+            # Taken before the scan so that changes made during it are replayed next time.
+            new_token = service.changes().getStartPageToken(supportsAllDrives=True).execute()['startPageToken']
+            count = self._full_scan(service)
+        else:
+            count, new_token = self._replay_changes(service, page_token)
+        icp.set_param(CHANGES_TOKEN_PARAM, new_token)
+        self.invalidate_model()
+        _logger.info(
+            "finance Drive index %s: %s entries in %.2fs",
+            'scan' if full or not page_token else 'update', count, time.time() - started)
+        return count
+
+    @api.model
+    def cron_refresh_index(self):
+        self._refresh_index()
+
+    @api.model
+    def action_rebuild_index(self):
+        count = self._refresh_index(full=True)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': "Index Drive reconstruit",
+                'message': "%s fichiers indexés." % count,
+                'type': 'success',
+                'sticky': False,
+            },
+        }
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _find_cheque_pdfs(self, root_id, cheques, keywords=('CHQ', 'DEM', 'DOC')):
+        """PDF links of many cheques in one query.
+
+        Layout: root / <société name> / <folder containing the cheque
+        number> / <PDF containing the keyword>.
+
+        :param cheques: list of (société name, cheque number)
+        :return: {(société name, cheque number): {keyword: webViewLink}}
+        """
+        if not root_id or not cheques:
+            return {}
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (c.ste_name, c.chq, k.keyword) c.ste_name, c.chq, k.keyword, pdf.web_view_link
+            FROM unnest(%(ste_names)s::varchar[], %(chqs)s::varchar[]) AS c(ste_name, chq)
+            JOIN finance_drive_file ste
+              ON ste.parent_drive_id = %(root_id)s AND ste.mime_type = %(folder)s AND ste.name = c.ste_name
+            JOIN finance_drive_file sub
+              ON sub.parent_drive_id = ste.drive_id AND sub.mime_type = %(folder)s
+             AND strpos(sub.name, c.chq) > 0
+            CROSS JOIN unnest(%(keywords)s::varchar[]) AS k(keyword)
+            JOIN finance_drive_file pdf
+              ON pdf.parent_drive_id = sub.drive_id AND pdf.mime_type = %(pdf)s
+             AND strpos(upper(pdf.name), k.keyword) > 0
+            ORDER BY c.ste_name, c.chq, k.keyword, sub.name, pdf.name
+        """, {
+            'root_id': root_id,
+            'folder': FOLDER_MIMETYPE,
+            'pdf': PDF_MIMETYPE,
+            'ste_names': [ste_name for ste_name, chq in cheques],
+            'chqs': [chq for ste_name, chq in cheques],
+            'keywords': list(keywords),
+        })
+        found = {}
+        for ste_name, chq, keyword, link in self.env.cr.fetchall():
+            found.setdefault((ste_name, chq), {})[keyword] = link
+        return found
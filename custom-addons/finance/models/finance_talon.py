@@ -1,4 +1,4 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError
 import base64
 import io
@@ -17,6 +17,9 @@ class FinanceTalon(models.Model):
     ste_id = fields.Many2one('finance.ste', string='Société', tracking=True, required=True)
     num_chq = fields.Integer(string='Nombres de chqs', required=True)
     serie = fields.Char(string='Série', required=True)
+    # Numeric range of the cheques of the talon, for indexed lookups.
+    range_start = fields.Integer(string='Premier chèque', compute='_compute_range', store=True)
+    range_end = fields.Integer(string='Dernier chèque', compute='_compute_range', store=True)
     etat = fields.Selection([
         ('actif', 'Actif'),
         ('cloture', 'Cloturé'),
@@ -38,14 +41,38 @@ class FinanceTalon(models.Model):
     )
     missing_chqs = fields.Integer(
         string="Chèques absents",
-        compute="_compute_missing_chqs"
+        compute="_compute_missing_cheques_html"
     )
     last_used_chq = fields.Char(
         string="Dernier chèque utilisé",
-        compute="_compute_last_used_chq",
+        compute="_compute_counts",
         store=True
     )
 
+    def init(self):
+        tools.create_index(
+            self.env.cr, 'finance_talon_ste_range_idx', self._table, ['ste_id', 'range_start', 'range_end'])
+
+    @api.depends('name', 'num_chq')
+    def _compute_range(self):
+        for rec in self:
+            raw = (rec.name or "").strip()
+            if raw.isdigit() and rec.num_chq and rec.num_chq > 0:
+                rec.range_start = int(raw)
+                rec.range_end = rec.range_start + rec.num_chq - 1
+            else:
+                rec.range_start = False
+                rec.range_end = False
+
+    @api.model
+    def _find_for_cheque(self, ste_id, chq_num):
+        """Talon of société ``ste_id`` whose range contains cheque number ``chq_num``."""
+        return self.search([
+            ('ste_id', '=', ste_id),
+            ('range_start', '<=', chq_num),
+            ('range_end', '>=', chq_num),
+        ], order='id', limit=1)
+
     # -------------------------------------------------------------------
     # Bouton vers chqs du talon
     # -------------------------------------------------------------------
@@ -80,20 +107,6 @@ class FinanceTalon(models.Model):
             else:
                 rec.etat = 'actif'
 
-    @api.depends('cheque_ids.chq')
-    def _compute_last_used_chq(self):
-        for rec in self:
-            numeric_chqs = []
-            for chq in rec.cheque_ids:
-                raw = (chq.chq or "").strip()
-                if raw.isdigit():
-                    numeric_chqs.append(int(raw))
-
-            if numeric_chqs:
-                rec.last_used_chq = str(max(numeric_chqs)).zfill(7)
-            else:
-                rec.last_used_chq = False
-
     # -------------------------------------------------------------------
     # Résumé stylé (carte HTML moderne - centrée)
     # -------------------------------------------------------------------
@@ -343,35 +356,6 @@ class FinanceTalon(models.Model):
                 </div>
             """
 
-    # -------------------------------------------------------------------
-    # Déterminer le nombre des chqs absents
-    # -------------------------------------------------------------------
-    @api.depends('cheque_ids.chq', 'name')
-    def _compute_missing_chqs(self):
-        for talon in self:
-            # sécurité
-            if not talon.name or not talon.name.strip().isdigit():
-                talon.missing_chqs = 0
-                continue
-
-            talon_start = int(talon.name.strip())
-
-            # récupérer les chèques numériques existants
-            chqs = [
-                int(c.chq) for c in talon.cheque_ids
-                if c.chq and c.chq.strip().isdigit()
-            ]
-
-            if not chqs:
-                talon.missing_chqs = 0
-                continue
-
-            max_chq = max(chqs)
-            used = len(chqs)
-
-            missing = (max_chq - talon_start + 1) - used
-            talon.missing_chqs = max(missing, 0)
-
     # -------------------------------------------------------------------
     # Calcul des chèques utilisés/restants + Pourcentage (Stored)
     # -------------------------------------------------------------------
@@ -383,56 +367,85 @@ class FinanceTalon(models.Model):
             else:
                 rec.usage_percentage = 0.0
 
-    @api.depends('cheque_ids', 'num_chq')
+    @api.depends('cheque_ids.chq', 'num_chq')
     def _compute_counts(self):
+        stats = self._get_cheque_stats()
         for rec in self:
+            rec_stats = stats.get(rec.id, {})
             # Count unique check numbers
-            unique_chqs = {c.chq for c in rec.cheque_ids if c.chq}
-            rec.used_chqs = len(unique_chqs)
+            rec.used_chqs = rec_stats.get('used', 0)
             rec.unused_chqs = rec.num_chq - rec.used_chqs
+            last = rec_stats.get('max')
+            rec.last_used_chq = str(last).zfill(7) if last is not None else False
 
     # -------------------------------------------------------------------
-    # Helper: Get missing cheques numbers
+    # Analyse des séquences : une requête pour tous les talons
     # -------------------------------------------------------------------
+    def _get_cheque_stats(self):
+        """Séquence des chèques saisis sur les talons de ``self``.
+
+        Les trous sont détectés avec LAG() sur les numéros triés, depuis le
+        premier numéro du talon jusqu'au plus grand chèque saisi.
+
+        :return: {talon_id: {'used': nombre de chèques distincts,
+                             'numeric': nombre de numéros numériques distincts,
+                             'max': plus grand numéro ou None,
+                             'missing': [numéros absents]}}
+        """
+        talon_ids = [talon_id for talon_id in self.ids if isinstance(talon_id, int)]
+        if not talon_ids:
+            return {}
+        self.env['datacheque'].flush_model(['chq', 'chq_num', 'talon_id'])
+        self.flush_model(['range_start'])
+        self.env.cr.execute("""
+            WITH cheques AS (
+                SELECT DISTINCT c.talon_id, c.chq, NULLIF(c.chq_num, 0) AS num
+                FROM datacheque c
+                WHERE c.talon_id = ANY(%(talon_ids)s) AND c.chq IS NOT NULL
+            ),
+            numbers AS (
+                SELECT DISTINCT talon_id, num FROM cheques WHERE num IS NOT NULL
+            ),
+            stats AS (
+                SELECT talon_id, count(DISTINCT chq) AS used,
+                       count(DISTINCT num) AS numeric, max(num) AS max_num
+                FROM cheques
+                GROUP BY talon_id
+            ),
+            gaps AS (
+                -- Chaque numéro avec le précédent ; le premier est comparé au début du talon.
+                -- range_start vaut 0 pour un talon invalide : pas d'analyse des trous.
+                SELECT n.talon_id, n.num,
+                       COALESCE(LAG(n.num) OVER (PARTITION BY n.talon_id ORDER BY n.num),
+                                t.range_start - 1) AS prev_num
+                FROM numbers n
+                JOIN finance_talon t ON t.id = n.talon_id
+                WHERE t.range_start > 0 AND n.num >= t.range_start
+            )
+            SELECT s.talon_id, s.used, s.numeric, s.max_num,
+                   COALESCE((
+                       SELECT array_agg(missing ORDER BY missing)
+                       FROM gaps g, generate_series(g.prev_num + 1, g.num - 1) AS missing
+                       WHERE g.talon_id = s.talon_id AND g.num - g.prev_num > 1
+                   ), '{}') AS missing
+            FROM stats s
+        """, {'talon_ids': talon_ids})
+        return {
+            talon_id: {'used': used, 'numeric': numeric, 'max': max_num, 'missing': list(missing)}
+            for talon_id, used, numeric, max_num, missing in self.env.cr.fetchall()
+        }
+
     def _get_missing_cheques_numbers(self):
         self.ensure_one()
-        # --- Validation robuste du talon ---
-        raw_name = (self.name or "").strip()
-
-        try:
-            start = int(raw_name)
-        except (ValueError, TypeError):
-            return []
-
-        if not self.num_chq or self.num_chq <= 0:
-            return []
-
-        # --- Numéros de chèques existants ---
-        existing_numbers = set()
-        for chq in self.cheque_ids:
-            raw_chq = (chq.chq or "").strip()
-            try:
-                existing_numbers.add(int(raw_chq))
-            except (ValueError, TypeError):
-                continue
-
-        # 👉 S’il n’y a encore aucun chèque saisi, on n’affiche rien
-        if not existing_numbers:
-            return []
-
-        # --- Nouvelle borne de fin = plus grand chèque saisi ---
-        end = max(existing_numbers)
-
-        # --- Calcul des chèques absents ---
-        missing = [
-            num for num in range(start, end + 1)
-            if num not in existing_numbers
-        ]
-        return missing
+        return self._get_cheque_stats().get(self.id, {}).get('missing', [])
 
     @api.depends('cheque_ids.chq', 'num_chq', 'name', 'ste_id')
     def _compute_missing_cheques_html(self):
+        stats = self._get_cheque_stats()
         for talon in self:
+            talon_stats = stats.get(talon.id, {})
+            missing = talon_stats.get('missing', [])
+            talon.missing_chqs = len(missing)
             # --- Validation robuste du talon ---
             raw_name = (talon.name or "").strip()
 
@@ -468,25 +481,8 @@ class FinanceTalon(models.Model):
                 """
                 continue
             
-            # --- Check if any cheques exist (simple check to avoid loading logic if empty) ---
-            if not talon.cheque_ids:
-                 talon.missing_cheques_html = """
-                    <div style="padding: 16px; color: #6c757d; font-style: italic;">
-                        ℹ️ Aucun chèque encore saisi pour ce talon
-                    </div>
-                """
-                 continue
-
-            # --- Use Helper ---
-            missing = talon._get_missing_cheques_numbers()
-            
-            # If helper returns empty, check why (validation handled above, so maybe no cheques valid?)
-            # Re-check existing numbers strictly for the "None info" message
-            existing_count = 0 
-            for c in talon.cheque_ids: 
-                if c.chq and c.chq.strip().isdigit(): existing_count += 1
-            
-            if existing_count == 0:
+            # --- Aucun chèque numérique saisi ---
+            if not talon_stats.get('numeric'):
                  talon.missing_cheques_html = """
                     <div style="padding: 16px; color: #6c757d; font-style: italic;">
                         ℹ️ Aucun chèque encore saisi pour ce talon
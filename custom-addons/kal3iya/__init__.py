@@ -1,2 +1,3 @@
 from . import models
-from . import reports
\ No newline at end of file
+from . import reports
+from . import controllers
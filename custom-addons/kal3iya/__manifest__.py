@@ -3,7 +3,7 @@
     'summary': 'Module pour la gestion du stock de Casa et Tanger',
     'author': 'Ayoub Akhrif',
     'category': 'Inventory',
-    'version': '1.0',
+    'version': '1.2',
     'depends': ['base', 'mail'],
     'data': [
         'security/groups.xml',
@@ -20,7 +20,15 @@
         'views/popup_sortie_view.xml',
         'views/week_update_wizard_view.xml',
         'views/stock_transfert_view.xml',
+        'data/cron.xml',
     ],
+    'assets': {
+        'web.assets_backend': [
+            'kal3iya/static/src/week_history/week_history.css',
+            'kal3iya/static/src/week_history/week_history.js',
+            'kal3iya/static/src/week_history/week_history.xml',
+        ],
+    },
     'images': ['static/description/icon.svg'],
     'installable': True,
     'application': True,
@@ -0,0 +1,21 @@
+from odoo import http
+from odoo.http import request
+
+from ..models.client import HISTORY_PAGE_WEEKS, WEEK_HISTORY_SOURCES
+
+
+class Kal3iyaClientController(http.Controller):
+
+    @http.route('/kal3iya/client/<int:client_id>/week_history', type='json', auth='user')
+    def week_history(self, client_id, kind='sorties', offset=0, limit=HISTORY_PAGE_WEEKS):
+        """
+        Historique du client groupé par semaine, page par page (la plus récente d'abord).
+        - kind: 'sorties' ou 'retours'
+        - offset / limit: en nombre de semaines
+        """
+        if kind not in WEEK_HISTORY_SOURCES:
+            return {'error': 'unknown_kind'}
+        client = request.env['kal3iya.client'].browse(client_id).exists()
+        if not client:
+            return {'error': 'not_found'}
+        return client.get_week_history(kind=kind, offset=offset, limit=limit)
@@ -0,0 +1,7 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # compte n'est plus recalculé depuis les documents : amorcer le grand livre.
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['kal3iya.client.ledger']._rebuild()
@@ -0,0 +1,7 @@
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    # Relevés hebdomadaires clients : amorcés depuis les sorties, retours et avances.
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['kal3iya.client.week']._rebuild()
@@ -1,3 +1,5 @@
+from . import client_ledger
+from . import client_week_statement
 from . import product_entry
 from . import product_sortie
 from . import driver
@@ -1,8 +1,11 @@
 from odoo import models, fields, api
 
+from .client_week_statement import ADVANCE_WEEK_SQL
+
 class Kal3iyaAdvance(models.Model):
     _name = 'kal3iya.advance'
     _description = 'Avances'
+    _inherit = ['kal3iya.client.ledger.mixin', 'kal3iya.client.week.mixin']
     client_id = fields.Many2one('kal3iya.client', required=True)
     amount = fields.Float(string='Montant', required=True)
     date_paid = fields.Date(string='Date', required=True)
@@ -14,4 +17,10 @@ class Kal3iyaAdvance(models.Model):
         ('virement', 'Virement'),
         ('versement', 'Versement'),
         ('charge', 'Charges'),
-    ], string='Mode de paiement', tracking=True)
\ No newline at end of file
+    ], string='Mode de paiement', tracking=True)
+
+    # Une avance diminue le compte client
+    _ledger_fields = ('client_id', 'amount')
+    _ledger_amount_sql = '-COALESCE(amount, 0)'
+    _week_statement_fields = ('client_id', 'date_paid', 'amount')
+    _week_sql = ADVANCE_WEEK_SQL
@@ -0,0 +1,199 @@
+import logging
+from collections import defaultdict
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+LEDGER_MIXIN = 'kal3iya.client.ledger.mixin'
+# Écart toléré entre le compte stocké et un recalcul complet
+LEDGER_TOLERANCE = 0.01
+
+
+class Kal3iyaClientLedgerMixin(models.AbstractModel):
+    """Document qui mouvemente le compte client.
+
+    Chaque document a au plus une ligne dans ``kal3iya.client.ledger``, avec
+    son montant signé ; elle est resynchronisée dès qu'un des
+    ``_ledger_fields`` est écrit en base, y compris par un champ calculé.
+    """
+    _name = LEDGER_MIXIN
+    _description = 'Mouvement du compte client'
+
+    # Colonnes dont dépend le mouvement
+    _ledger_fields = ('client_id',)
+    # Expressions SQL du client et du montant signé, sur la table du modèle
+    _ledger_client_sql = 'client_id'
+    _ledger_amount_sql = '0'
+
+    @api.model
+    def _ledger_source_query(self):
+        return "SELECT %s AS client_id, id AS res_id, %s AS amount FROM %s" % (
+            self._ledger_client_sql, self._ledger_amount_sql, self._table)
+
+    def _create(self, data_list):
+        records = super()._create(data_list)
+        self.env['kal3iya.client.ledger']._sync(records)
+        return records
+
+    def _write(self, vals):
+        res = super()._write(vals)
+        if not set(self._ledger_fields).isdisjoint(vals):
+            self.env['kal3iya.client.ledger']._sync(self)
+        return res
+
+    def unlink(self):
+        res_model, res_ids = self._name, self.ids
+        res = super().unlink()
+        self.env['kal3iya.client.ledger']._remove(res_model, res_ids)
+        return res
+
+
+class Kal3iyaClientLedger(models.Model):
+    """Mouvements signés du compte client, un par document source.
+
+    ``kal3iya.client.compte`` en est le solde courant, mis à jour par
+    différence à chaque mouvement.
+    """
+    _name = 'kal3iya.client.ledger'
+    _description = 'Mouvements du compte client'
+    _log_access = False
+    _order = 'client_id, res_model, res_id'
+
+    client_id = fields.Many2one('kal3iya.client', string='Client', required=True, readonly=True,
+                                index=True, ondelete='cascade')
+    res_model = fields.Char(string='Document', required=True, readonly=True)
+    res_id = fields.Integer(string='ID', required=True, readonly=True)
+    amount = fields.Float(string='Montant', readonly=True)
+
+    _sql_constraints = [
+        ('unique_document', 'unique(res_model, res_id)', 'Document déjà présent dans le compte client.')
+    ]
+
+    # ------------------------------------------------------------------
+    # Mise à jour incrémentale
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _sync(self, records):
+        """Remplace les mouvements de ``records`` par leurs montants actuels en base."""
+        if not records:
+            return
+        cr = self.env.cr
+        cr.execute(
+            "DELETE FROM kal3iya_client_ledger WHERE res_model = %s AND res_id = ANY(%s) RETURNING client_id, amount",
+            [records._name, records.ids])
+        old = cr.fetchall()
+        cr.execute("""
+            INSERT INTO kal3iya_client_ledger (client_id, res_model, res_id, amount)
+            SELECT client_id, %%s, res_id, amount FROM (%s) s
+            WHERE res_id = ANY(%%s) AND client_id IS NOT NULL AND amount != 0
+            RETURNING client_id, amount
+        """ % records._ledger_source_query(), [records._name, records.ids])
+        new = cr.fetchall()
+        self._apply_deltas(new + [(client_id, -amount) for client_id, amount in old])
+
+    @api.model
+    def _remove(self, res_model, res_ids):
+        if not res_ids:
+            return
+        self.env.cr.execute(
+            "DELETE FROM kal3iya_client_ledger WHERE res_model = %s AND res_id = ANY(%s) RETURNING client_id, amount",
+            [res_model, list(res_ids)])
+        self._apply_deltas([(client_id, -amount) for client_id, amount in self.env.cr.fetchall()])
+
+    @api.model
+    def _apply_deltas(self, movements):
+        deltas = defaultdict(float)
+        for client_id, amount in movements:
+            deltas[client_id] += amount
+        deltas = {client_id: delta for client_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        self.env.cr.execute("""
+            UPDATE kal3iya_client c SET compte = COALESCE(c.compte, 0) + v.delta
+            FROM unnest(%s::int[], %s::float8[]) AS v(id, delta)
+            WHERE c.id = v.id
+        """, [list(deltas), list(deltas.values())])
+        clients = self.env['kal3iya.client'].browse(deltas)
+        clients.invalidate_recordset(['compte'], flush=False)
+        clients.modified(['compte'])
+
+    # ------------------------------------------------------------------
+    # Contrôle de cohérence
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _sources_query(self):
+        return " UNION ALL ".join(
+            "(SELECT %s AS res_model, s.* FROM (%s) s WHERE s.client_id IS NOT NULL AND s.amount != 0)" % (
+                "'%s'" % name, self.env[name]._ledger_source_query())
+            for name in self.env[LEDGER_MIXIN]._inherit_children
+        )
+
+    @api.model
+    def _check_consistency(self):
+        """Compare, par client, le compte stocké, la somme du grand livre et un recalcul complet.
+
+        :return: [(client_id, compte, total du grand livre, total recalculé)]
+            pour les clients en écart
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT c.id, COALESCE(c.compte, 0), COALESCE(l.total, 0), COALESCE(s.total, 0)
+            FROM kal3iya_client c
+            LEFT JOIN (SELECT client_id, SUM(amount) AS total FROM kal3iya_client_ledger GROUP BY client_id) l
+              ON l.client_id = c.id
+            LEFT JOIN (SELECT client_id, SUM(amount) AS total FROM (%s) src GROUP BY client_id) s
+              ON s.client_id = c.id
+            WHERE abs(COALESCE(c.compte, 0) - COALESCE(s.total, 0)) > %%(tolerance)s
+               OR abs(COALESCE(l.total, 0) - COALESCE(s.total, 0)) > %%(tolerance)s
+            ORDER BY c.id
+        """ % self._sources_query(), {'tolerance': LEDGER_TOLERANCE})
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _rebuild(self, client_ids=None):
+        """Reconstruit les mouvements et le compte des clients donnés (tous par défaut)."""
+        self.env.flush_all()
+        cr = self.env.cr
+        where = "client_id = ANY(%(client_ids)s)" if client_ids is not None else "TRUE"
+        params = {'client_ids': list(client_ids or [])}
+        cr.execute("DELETE FROM kal3iya_client_ledger WHERE %s" % where, params)
+        cr.execute("""
+            INSERT INTO kal3iya_client_ledger (client_id, res_model, res_id, amount)
+            SELECT client_id, res_model, res_id, amount FROM (%s) src WHERE %s
+        """ % (self._sources_query(), where), params)
+        cr.execute("""
+            UPDATE kal3iya_client c
+            SET compte = COALESCE((SELECT SUM(amount) FROM kal3iya_client_ledger l WHERE l.client_id = c.id), 0)
+            WHERE %s
+        """ % ("c.id = ANY(%(client_ids)s)" if client_ids is not None else "TRUE"), params)
+        self.invalidate_model()
+        clients = self.env['kal3iya.client'].search([('id', 'in', client_ids)] if client_ids is not None else [])
+        clients.invalidate_recordset(['compte'], flush=False)
+        clients.modified(['compte'])
+
+    @api.model
+    def cron_check_consistency(self):
+        mismatches = self._check_consistency()
+        if mismatches:
+            _logger.warning(
+                "kal3iya client ledger: %s clients en écart, reconstruits : %s",
+                len(mismatches), [row[0] for row in mismatches])
+            self._rebuild([row[0] for row in mismatches])
+        return len(mismatches)
+
+    @api.model
+    def action_check_consistency(self):
+        count = self.cron_check_consistency()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Comptes clients',
+                'message': f"{count} compte(s) client corrigé(s)." if count else "Tous les comptes clients sont cohérents.",
+                'type': 'warning' if count else 'success',
+                'sticky': False,
+            }
+        }
@@ -15,35 +15,12 @@ class ClientWeekInvoiceWizard(models.TransientModel):
 
     @api.model
     def _get_selection_weeks(self):
-        """Return all unique weeks found in the system for validation."""
-        weeks = set()
-        
-        # Helper to format date to week
-        def date_to_week(d):
-            return d.strftime("%Y-W%W") if d else False
-            
-        # Collect weeks from all records
-        # Use sudo to ensure we see all weeks regardless of permissions
-        env = self.env
-        
-        # Sorties
-        sorties = env['kal3iyasortie'].sudo().search([('week', '!=', False)])
-        weeks.update(sorties.mapped('week'))
-        
-        # Retours
-        retours = env['kal3iyaentry'].sudo().search([('week', '!=', False)])
-        weeks.update(retours.mapped('week'))
-        
-        # Avances
-        avances = env['kal3iya.advance'].sudo().search([('date_paid', '!=', False)])
-        for date in avances.mapped('date_paid'):
-            weeks.add(date_to_week(date))
-            
-        # Sort desc
-        sorted_weeks = sorted(weeks, reverse=True)
-        
+        """Semaines ayant au moins un relevé client, la plus récente d'abord."""
+        self.env['kal3iya.client.week'].flush_model(['week'])
+        self.env.cr.execute("SELECT DISTINCT week FROM kal3iya_client_week ORDER BY week DESC")
+
         selection = []
-        for w in sorted_weeks:
+        for (w,) in self.env.cr.fetchall():
             # "2025-W47" -> "Semaine 47 (2025)"
             parts = w.split('-W')
             if len(parts) == 2:
@@ -52,7 +29,7 @@ class ClientWeekInvoiceWizard(models.TransientModel):
                 selection.append((w, label))
             else:
                 selection.append((w, w))
-                
+
         return selection
 
     @api.model
@@ -65,27 +42,12 @@ class ClientWeekInvoiceWizard(models.TransientModel):
             return res
 
         res['client_id'] = client_id
-        client = self.env['kal3iya.client'].browse(client_id)
 
-        # Calculate weeks SPECIFIC to this client to set a smart default
-        client_weeks = set()
-        
-        for s in client.sortie_ids:
-            if s.week: client_weeks.add(s.week)
-            
-        for r in client.retour_ids:
-            if getattr(r, 'week', False): client_weeks.add(r.week)
-            
-        for a in client.avances:
-            if a.date_paid:
-                client_weeks.add(a.date_paid.strftime("%Y-W%W"))
-                
-        sorted_client_weeks = sorted(client_weeks, reverse=True)
+        # Semaine la plus récente de ce client
+        statement = self.env['kal3iya.client.week'].search([('client_id', '=', client_id)], order='week desc', limit=1)
+        if statement:
+            res['week'] = statement.week
 
-        # Set default to the most recent week for this client
-        if sorted_client_weeks:
-            res['week'] = sorted_client_weeks[0]
-            
         return res
 
     def action_print_invoice(self):
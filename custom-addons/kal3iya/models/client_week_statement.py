@@ -0,0 +1,206 @@
+from datetime import date, timedelta
+
+from odoo import models, fields, api
+
+WEEK_MIXIN = 'kal3iya.client.week.mixin'
+
+# Semaine '%Y-W%W' (lundi premier jour, semaine 00 avant le premier lundi), comme en Python
+ADVANCE_WEEK_SQL = (
+    "to_char(date_paid, 'YYYY') || '-W' || "
+    "lpad(((EXTRACT(DOY FROM date_paid)::int + 7 - EXTRACT(ISODOW FROM date_paid)::int) / 7)::text, 2, '0')"
+)
+
+
+class Kal3iyaClientWeekMixin(models.AbstractModel):
+    """Ligne d'un relevé hebdomadaire client.
+
+    Les relevés des semaines touchées, avant et après l'écriture, sont mis à
+    jour dès qu'un des ``_week_statement_fields`` est écrit en base.
+    """
+    _name = WEEK_MIXIN
+    _description = 'Ligne de relevé hebdomadaire client'
+
+    # Colonnes dont dépend la ligne
+    _week_statement_fields = ('client_id',)
+    # Expression SQL de la semaine, sur la table du modèle
+    _week_sql = 'week'
+
+    def _week_statement_keys(self):
+        if not self.ids:
+            return set()
+        self.env.cr.execute("""
+            SELECT client_id, %s FROM %s
+            WHERE id = ANY(%%s) AND client_id IS NOT NULL
+        """ % (self._week_sql, self._table), [self.ids])
+        return {(client_id, week) for client_id, week in self.env.cr.fetchall() if week}
+
+    def _create(self, data_list):
+        records = super()._create(data_list)
+        self.env['kal3iya.client.week']._refresh(records._week_statement_keys())
+        return records
+
+    def _write(self, vals):
+        if set(self._week_statement_fields).isdisjoint(vals):
+            return super()._write(vals)
+        keys = self._week_statement_keys()
+        res = super()._write(vals)
+        self.env['kal3iya.client.week']._refresh(keys | self._week_statement_keys())
+        return res
+
+    def unlink(self):
+        keys = self._week_statement_keys()
+        res = super().unlink()
+        self.env['kal3iya.client.week']._refresh(keys)
+        return res
+
+
+class Kal3iyaClientWeek(models.Model):
+    """Relevé hebdomadaire d'un client : totaux et lignes de la semaine.
+
+    Tenu à jour par les sorties, retours et avances ; la facture
+    hebdomadaire est imprimée à partir de ce relevé.
+    """
+    _name = 'kal3iya.client.week'
+    _description = 'Relevé hebdomadaire client'
+    _log_access = False
+    _order = 'week desc, client_id'
+    _rec_name = 'week'
+
+    client_id = fields.Many2one('kal3iya.client', string='Client', required=True, readonly=True,
+                                index=True, ondelete='cascade')
+    week = fields.Char(string='Semaine', required=True, readonly=True, index=True)
+    start_date = fields.Date(string='Du', compute='_compute_week_bounds')
+    end_date = fields.Date(string='Au', compute='_compute_week_bounds')
+    total_sorties = fields.Float(string='Total sorties', readonly=True)
+    total_retours = fields.Float(string='Total retours', readonly=True)
+    total_avances = fields.Float(string='Total avances', readonly=True)
+    compte_semaine = fields.Float(string='Compte de la semaine', readonly=True)
+    sortie_ids = fields.Many2many('kal3iyasortie', 'kal3iya_client_week_sortie_rel', 'statement_id', 'sortie_id',
+                                  string='Sorties', readonly=True)
+    retour_ids = fields.Many2many('kal3iyaentry', 'kal3iya_client_week_retour_rel', 'statement_id', 'entry_id',
+                                  string='Retours', readonly=True)
+    avance_ids = fields.Many2many('kal3iya.advance', 'kal3iya_client_week_advance_rel', 'statement_id', 'advance_id',
+                                  string='Avances', readonly=True)
+
+    _sql_constraints = [
+        ('unique_client_week', 'unique(client_id, week)', 'Relevé déjà existant pour ce client et cette semaine.')
+    ]
+
+    @api.depends('week')
+    def _compute_week_bounds(self):
+        for rec in self:
+            rec.start_date, rec.end_date = self._week_bounds(rec.week)
+
+    @api.model
+    def _week_bounds(self, week):
+        """Lundi et dimanche de la semaine 'YYYY-Www' (numérotation ISO), ou (False, False)."""
+        try:
+            year, week_num = week.split('-W')
+            jan_4 = date(int(year), 1, 4)
+        except (AttributeError, ValueError):
+            return False, False
+        start = jan_4 - timedelta(days=jan_4.weekday()) + timedelta(weeks=int(week_num) - 1)
+        return start, start + timedelta(days=6)
+
+    # ------------------------------------------------------------------
+    # Mise à jour incrémentale
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _refresh(self, keys):
+        """Recalcule les relevés des (client, semaine) donnés depuis leurs lignes."""
+        keys = [key for key in keys if key[0] and key[1]]
+        if not keys:
+            return
+        cr = self.env.cr
+        params = {
+            'clients': [client_id for client_id, week in keys],
+            'weeks': [week for client_id, week in keys],
+        }
+        cr.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS kal3iya_client_week_lines
+                (client_id int, week varchar, kind varchar, res_id int, amount float8) ON COMMIT DROP
+        """)
+        cr.execute("TRUNCATE kal3iya_client_week_lines")
+        cr.execute("""
+            INSERT INTO kal3iya_client_week_lines
+            SELECT s.client_id, s.week, 'sortie', s.id, COALESCE(NULLIF(s.mt_vente_final, 0), s.mt_vente, 0)
+            FROM kal3iyasortie s
+            JOIN unnest(%(clients)s::int[], %(weeks)s::varchar[]) AS k(client_id, week)
+              ON s.client_id = k.client_id AND s.week = k.week
+            UNION ALL
+            SELECT r.client_id, r.week, 'retour', r.id, COALESCE(r.selling_price, 0) * COALESCE(r.tonnage, 0)
+            FROM kal3iyaentry r
+            JOIN unnest(%(clients)s::int[], %(weeks)s::varchar[]) AS k(client_id, week)
+              ON r.client_id = k.client_id AND r.week = k.week
+            WHERE r.state = 'retour'
+            UNION ALL
+            SELECT a.client_id, a.week, 'avance', a.id, COALESCE(a.amount, 0)
+            FROM (SELECT id, client_id, amount, {advance_week} AS week
+                  FROM kal3iya_advance WHERE client_id = ANY(%(clients)s)) a
+            JOIN unnest(%(clients)s::int[], %(weeks)s::varchar[]) AS k(client_id, week)
+              ON a.client_id = k.client_id AND a.week = k.week
+        """.format(advance_week=ADVANCE_WEEK_SQL), params)
+        self._apply_lines(params)
+
+    @api.model
+    def _apply_lines(self, params):
+        """Met les relevés des clés ``params`` en accord avec kal3iya_client_week_lines."""
+        cr = self.env.cr
+        # Semaines sans aucune ligne : plus de relevé
+        cr.execute("""
+            DELETE FROM kal3iya_client_week w
+            USING unnest(%(clients)s::int[], %(weeks)s::varchar[]) AS k(client_id, week)
+            WHERE w.client_id = k.client_id AND w.week = k.week
+              AND NOT EXISTS (SELECT 1 FROM kal3iya_client_week_lines l
+                              WHERE l.client_id = k.client_id AND l.week = k.week)
+        """, params)
+        cr.execute("""
+            INSERT INTO kal3iya_client_week
+                (client_id, week, total_sorties, total_retours, total_avances, compte_semaine)
+            SELECT client_id, week, ts, tr, ta, ts - tr - ta FROM (
+                SELECT client_id, week,
+                       COALESCE(SUM(amount) FILTER (WHERE kind = 'sortie'), 0) AS ts,
+                       COALESCE(SUM(amount) FILTER (WHERE kind = 'retour'), 0) AS tr,
+                       COALESCE(SUM(amount) FILTER (WHERE kind = 'avance'), 0) AS ta
+                FROM kal3iya_client_week_lines
+                GROUP BY client_id, week
+            ) t
+            ON CONFLICT (client_id, week) DO UPDATE SET
+                total_sorties = EXCLUDED.total_sorties,
+                total_retours = EXCLUDED.total_retours,
+                total_avances = EXCLUDED.total_avances,
+                compte_semaine = EXCLUDED.compte_semaine
+            RETURNING id
+        """)
+        statement_ids = [row[0] for row in cr.fetchall()]
+        for kind, relation, column in (
+            ('sortie', 'kal3iya_client_week_sortie_rel', 'sortie_id'),
+            ('retour', 'kal3iya_client_week_retour_rel', 'entry_id'),
+            ('avance', 'kal3iya_client_week_advance_rel', 'advance_id'),
+        ):
+            cr.execute("DELETE FROM %s WHERE statement_id = ANY(%%s)" % relation, [statement_ids])
+            cr.execute("""
+                INSERT INTO {relation} (statement_id, {column})
+                SELECT w.id, l.res_id
+                FROM kal3iya_client_week_lines l
+                JOIN kal3iya_client_week w ON w.client_id = l.client_id AND w.week = l.week
+                WHERE l.kind = %s
+            """.format(relation=relation, column=column), [kind])
+        self.invalidate_model()
+
+    @api.model
+    def _rebuild(self):
+        """Reconstruit tous les relevés."""
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT client_id, week FROM kal3iyasortie WHERE client_id IS NOT NULL AND week IS NOT NULL
+            UNION
+            SELECT client_id, week FROM kal3iyaentry
+            WHERE state = 'retour' AND client_id IS NOT NULL AND week IS NOT NULL
+            UNION
+            SELECT client_id, {advance_week} FROM kal3iya_advance WHERE date_paid IS NOT NULL
+        """.format(advance_week=ADVANCE_WEEK_SQL))
+        keys = set(self.env.cr.fetchall())
+        self.env.cr.execute("DELETE FROM kal3iya_client_week")
+        self._refresh(keys)
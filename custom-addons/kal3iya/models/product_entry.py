@@ -6,7 +6,12 @@ class ProductEntry(models.Model):
     _name = 'kal3iyaentry'
     _description = 'Entrée de stock'
     _rec_name = 'display_name'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'kal3iya.client.ledger.mixin', 'kal3iya.client.week.mixin']
+
+    # Seuls les retours créditent le compte client
+    _ledger_fields = ('client_id', 'state', 'selling_price', 'tonnage')
+    _ledger_amount_sql = "CASE WHEN state = 'retour' THEN -COALESCE(selling_price, 0) * COALESCE(tonnage, 0) ELSE 0 END"
+    _week_statement_fields = ('client_id', 'week', 'state', 'selling_price', 'tonnage')
 
     # ------------------------------------------------------------
     # CHAMPS
@@ -51,7 +56,6 @@ class ProductEntry(models.Model):
         ('entree', 'Entrée'),
         ('retour', 'Retour'),
     ], string='État', default='entree', tracking=True)
-    state_badge = fields.Html(string='État (badge)', compute='_compute_state_badge', sanitize=False)
 
     return_id = fields.Many2one(
         'kal3iyasortie',
@@ -62,20 +66,6 @@ class ProductEntry(models.Model):
 
     stock_id = fields.One2many('kal3iya.stock', 'entry_id', string='Ligne de stock liée', readonly=True)
 
-    # ------------------------------------------------------------ 
-    # BADGE VISUEL 
-    # ------------------------------------------------------------ 
-    def _compute_state_badge(self):
-        for rec in self:
-            label = dict(self._fields['state'].selection).get(rec.state, '') or ''
-            color = "#28a745" if rec.state == 'entree' else "#dc3545"
-            bg = "rgba(40,167,69,0.12)" if rec.state == 'entree' else "rgba(220,53,69,0.12)"
-
-            rec.state_badge = (
-                f"<span style='display:inline-block;padding:2px 8px;border-radius:12px;"
-                f"font-weight:600;background:{bg};color:{color};'>{label}</span>"
-            )
-
     # ------------------------------------------------------------
     # CALCULS
     # ------------------------------------------------------------
@@ -210,9 +200,11 @@ class ProductEntry(models.Model):
     def write(self, vals):
         res = super().write(vals)
 
+        Stock = self.env['kal3iya.stock'].sudo()
+        stocks_to_recompute = Stock.browse()
         for rec in self:
             if rec.state == 'entree':
-                stock = self.env['kal3iya.stock'].sudo().search([('entry_id', '=', rec.id)], limit=1)
+                stock = Stock.search([('entry_id', '=', rec.id)], limit=1)
                 if stock:
                     stock.write({
                         'product_id': rec.product_id.id,
@@ -229,13 +221,12 @@ class ProductEntry(models.Model):
                         'provider_id': rec.provider_id.id,
                         'image_1920': rec.image_1920,
                     })
-                    stock.recompute_qty()
+                    stocks_to_recompute |= stock
 
             elif rec.state == 'retour' and rec.return_id:
-                stock = rec.return_id.entry_id
-                if stock:
-                    stock.recompute_qty()
+                stocks_to_recompute |= rec.return_id.entry_id
 
+        stocks_to_recompute.recompute_qty()
         return res
 
     # ------------------------------------------------------------
@@ -4,7 +4,12 @@ from odoo.exceptions import UserError
 class ProductExit(models.Model):
     _name = 'kal3iyasortie'
     _description = 'Sortie de stock'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'kal3iya.client.ledger.mixin', 'kal3iya.client.week.mixin']
+
+    # Vente : montant final s'il est renseigné, sinon montant calculé
+    _ledger_fields = ('client_id', 'mt_vente', 'mt_vente_final')
+    _ledger_amount_sql = 'COALESCE(NULLIF(mt_vente_final, 0), mt_vente, 0)'
+    _week_statement_fields = ('client_id', 'week', 'mt_vente', 'mt_vente_final')
 
     entry_id = fields.Many2one(
         'kal3iya.stock',
@@ -293,11 +298,12 @@ class ProductExit(models.Model):
                     vals['tonnage_final'] = new_tonnage
 
 
-        # 2️⃣ Écriture normale
+        # 2️⃣ Écriture normale (l'ancien stock est aussi recalculé si entry_id change)
+        stocks = self.mapped('entry_id')
         res = super().write(vals)
 
-        # 3️⃣ Recalcul du stock une seule fois par entrée
-        self.mapped('entry_id').recompute_qty()
+        # 3️⃣ Recalcul du stock une seule fois pour toutes les entrées
+        (stocks | self.mapped('entry_id')).recompute_qty()
 
         return res
 
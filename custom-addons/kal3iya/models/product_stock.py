@@ -24,7 +24,7 @@ class ProductStock(models.Model):
         ('tanger', 'Tanger'),
         ('casa', 'Casa'),
     ], string='Stock', tracking=True)
-    quantity = fields.Float(string='Quantité disponible', default=0, store=True)
+    quantity = fields.Float(string='Quantité disponible', default=0, store=True, group_operator="sum")
     price = fields.Float(string='Prix d’achat')
     weight = fields.Float(string='Poids (kg)', required=True)
     tonnage = fields.Float(string='Tonnage (Kg)', compute='_compute_tonnage', store=True, group_operator="sum")
@@ -44,9 +44,15 @@ class ProductStock(models.Model):
 
     @api.depends('product_id')
     def _compute_qty_total_group(self):
+        # Un seul regroupement par recordset, quel que soit le nombre de lignes affichées
+        products = self.product_id
+        totals = dict(self._read_group(
+            [('product_id', 'in', products.ids)],
+            ['product_id'],
+            ['quantity:sum'],
+        )) if products else {}
         for rec in self:
-            total = sum(self.search([('product_id', '=', rec.product_id)]).mapped('quantity'))
-            rec.qty_total_group = total
+            rec.qty_total_group = totals.get(rec.product_id, 0.0)
     # ------------------------------------------------------------
     # AFFICHAGE
     # ------------------------------------------------------------
@@ -87,29 +93,54 @@ class ProductStock(models.Model):
     # MISE À JOUR AUTOMATIQUE DE LA QUANTITÉ
     # ------------------------------------------------------------
     def recompute_qty(self):
-        for stock in self:
-            # 1️⃣ Quantité entrée (ENTRÉE ORIGINALE)
-            entry_qty = 0.0
-            if stock.entry_id and stock.entry_id.state == 'entree':
-                entry_qty = stock.entry_id.quantity
-
-            # 2️⃣ Retours liés à ce stock
-            returns_qty = sum(self.env['kal3iyaentry'].search([
-                ('state', '=', 'retour'),
-                ('return_id.entry_id', '=', stock.id)
-            ]).mapped('quantity'))
-
-            # 3️⃣ Sorties existantes
-            sorties_qty = sum(self.env['kal3iyasortie'].search([
-                ('entry_id', '=', stock.id)
-            ]).mapped('quantity'))
-
-            # 4️⃣ Calcul FINAL
-            stock.quantity = entry_qty + returns_qty - sorties_qty
-
-            # 5️⃣ Archivage automatique
-            stock.active = stock.quantity > 0
+        """Recalcule quantité et archivage : entrée d'origine + retours - sorties.
 
+        Une seule requête agrégée pour tout le recordset ; seules les lignes
+        dont la quantité ou l'état d'archivage change sont mises à jour.
+        """
+        if not self:
+            return
+        self.env['kal3iyaentry'].flush_model(['state', 'quantity', 'return_id'])
+        self.env['kal3iyasortie'].flush_model(['entry_id', 'quantity'])
+        self.flush_recordset(['entry_id', 'quantity', 'active'])
+        self.env.cr.execute("""
+            SELECT id, new_qty FROM (
+                SELECT s.id, s.quantity, s.active,
+                       COALESCE(e.quantity, 0) + COALESCE(r.qty, 0) - COALESCE(o.qty, 0) AS new_qty
+                FROM kal3iya_stock s
+                LEFT JOIN kal3iyaentry e ON e.id = s.entry_id AND e.state = 'entree'
+                LEFT JOIN (
+                    SELECT so.entry_id, SUM(ret.quantity) AS qty
+                    FROM kal3iyaentry ret
+                    JOIN kal3iyasortie so ON so.id = ret.return_id
+                    WHERE ret.state = 'retour' AND so.entry_id = ANY(%(ids)s)
+                    GROUP BY so.entry_id
+                ) r ON r.entry_id = s.id
+                LEFT JOIN (
+                    SELECT entry_id, SUM(quantity) AS qty
+                    FROM kal3iyasortie
+                    WHERE entry_id = ANY(%(ids)s)
+                    GROUP BY entry_id
+                ) o ON o.entry_id = s.id
+                WHERE s.id = ANY(%(ids)s)
+            ) t
+            WHERE quantity IS DISTINCT FROM new_qty OR active IS DISTINCT FROM (new_qty > 0)
+        """, {'ids': self.ids})
+        changes = self.env.cr.fetchall()
+        if not changes:
+            return
+        stocks = self.browse([row[0] for row in changes])
+        # tonnage et mt_achat dépendent de la quantité
+        stocks.modified(['quantity', 'active'], before=True)
+        self.env.cr.execute("""
+            UPDATE kal3iya_stock s
+            SET quantity = v.quantity, active = v.quantity > 0,
+                write_uid = %s, write_date = now() at time zone 'UTC'
+            FROM unnest(%s::int[], %s::float8[]) AS v(id, quantity)
+            WHERE s.id = v.id
+        """, [self.env.uid, [row[0] for row in changes], [row[1] for row in changes]])
+        stocks.invalidate_recordset(['quantity', 'active', 'write_uid', 'write_date'])
+        stocks.modified(['quantity', 'active'])
 
     @api.model
     def update_stock_archive_status(self):
@@ -167,8 +198,7 @@ class ProductStock(models.Model):
         # 1. Rechercher TOUS les stocks (actifs et archivés)
         all_stocks = self.with_context(active_test=False).search([])
         
-        # 2. Lancer le re-calcul
-        # (recompute_qty boucle déjà sur self, donc c'est optimisé)
+        # 2. Lancer le re-calcul (une requête pour tout le stock)
         all_stocks.recompute_qty()
         
         # 3. Notification UI
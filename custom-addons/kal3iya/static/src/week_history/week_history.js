@@ -0,0 +1,123 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { useService } from "@web/core/utils/hooks";
+import { deserializeDate, formatDate } from "@web/core/l10n/dates";
+import { formatFloat } from "@web/core/utils/numbers";
+import { standardWidgetProps } from "@web/views/widgets/standard_widget_props";
+import { Component, onMounted, onPatched, onWillStart, onWillUnmount, onWillUpdateProps, useRef, useState } from "@odoo/owl";
+
+/**
+ * Historique hebdomadaire d'un client : les semaines sont chargées page par
+ * page depuis /kal3iya/client/<id>/week_history, la suivante dès que le bas
+ * de la liste devient visible.
+ */
+export class WeekHistory extends Component {
+    static template = "kal3iya.WeekHistory";
+    static props = {
+        ...standardWidgetProps,
+        kind: { type: String, optional: true },
+    };
+    static defaultProps = { kind: "sorties" };
+
+    setup() {
+        this.rpc = useService("rpc");
+        this.action = useService("action");
+        this.sentinel = useRef("sentinel");
+        this.state = useState({ columns: [], weeks: [], hasMore: false, loading: false });
+
+        onWillStart(() => this.load(this.props.record.resId));
+        onWillUpdateProps((nextProps) => {
+            if (nextProps.record.resId !== this.props.record.resId) {
+                return this.load(nextProps.record.resId);
+            }
+        });
+        onMounted(() => {
+            this.observer = new IntersectionObserver((entries) => {
+                if (entries.some((entry) => entry.isIntersecting)) {
+                    this.loadMore();
+                }
+            });
+            this.observer.observe(this.sentinel.el);
+        });
+        // The observer only fires on visibility changes: once a page is
+        // rendered, observe again so that a still visible sentinel loads the next one.
+        onPatched(() => {
+            if (this.state.hasMore && !this.state.loading) {
+                this.observer.unobserve(this.sentinel.el);
+                this.observer.observe(this.sentinel.el);
+            }
+        });
+        onWillUnmount(() => this.observer.disconnect());
+    }
+
+    async fetchPage(resId, offset) {
+        return this.rpc(`/kal3iya/client/${resId}/week_history`, {
+            kind: this.props.kind,
+            offset,
+        });
+    }
+
+    async load(resId) {
+        Object.assign(this.state, { columns: [], weeks: [], hasMore: false });
+        if (!resId) {
+            return;
+        }
+        this.state.loading = true;
+        try {
+            const page = await this.fetchPage(resId, 0);
+            Object.assign(this.state, {
+                columns: page.columns || [],
+                weeks: page.weeks || [],
+                hasMore: Boolean(page.has_more),
+            });
+        } finally {
+            this.state.loading = false;
+        }
+    }
+
+    async loadMore() {
+        const resId = this.props.record.resId;
+        if (!resId || !this.state.hasMore || this.state.loading) {
+            return;
+        }
+        this.state.loading = true;
+        try {
+            const page = await this.fetchPage(resId, this.state.weeks.length);
+            this.state.weeks.push(...(page.weeks || []));
+            this.state.hasMore = Boolean(page.has_more);
+        } finally {
+            this.state.loading = false;
+        }
+    }
+
+    formatAmount(value) {
+        return `${formatFloat(value || 0, { digits: [16, 2] })} Dh`;
+    }
+
+    formatCell(value, type) {
+        switch (type) {
+            case "amount":
+                return this.formatAmount(value);
+            case "float":
+                return formatFloat(value || 0, { digits: [16, 2] });
+            case "date":
+                return value ? formatDate(deserializeDate(value)) : "";
+            default:
+                return value || "";
+        }
+    }
+
+    editWeek(week) {
+        return this.action.doAction("kal3iya.action_kal3iya_week_update_wizard", {
+            additionalContext: { active_id: week.edit_id, active_model: "kal3iyasortie" },
+        });
+    }
+}
+
+export const weekHistory = {
+    component: WeekHistory,
+    extractProps: ({ attrs }) => ({ kind: attrs.kind }),
+};
+
+registry.category("view_widgets").add("kal3iya_week_history", weekHistory);
@@ -4,14 +4,16 @@
     'category': 'Stock',
     'summary': 'API for Mobile Warehouse Application',
     'description': """
-        This module exposes a read-only API for the mobile warehouse application.
-        It provides a daily stock snapshot based on FIFO rules.
+        This module exposes an API for the mobile warehouse application.
+        It provides a daily stock snapshot based on FIFO rules and accepts
+        batches of exits, transfers and returns scanned on the handhelds.
     """,
     'author': 'Ayoub Akhrif',
     'depends': ['stock_kal3iya'],
     'data': [
         'security/ir.model.access.csv',
         'views/mobile_stock_snapshot_views.xml',
+        'views/mobile_operation_views.xml',
     ],
     'installable': True,
     'application': False,
@@ -1,38 +1,128 @@
+import gzip
+import json
+
 from odoo import http
 from odoo.http import request
+from odoo.tools.date_utils import json_default
+
+from ..services.columnar import encode_columnar
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+
+# Bodies smaller than this are not worth compressing.
+GZIP_MIN_SIZE = 1024
+
+
+def _page_args(kwargs):
+    limit = int(kwargs.get('limit') or DEFAULT_PAGE_SIZE)
+    since = kwargs.get('since')
+    return {
+        'cursor': kwargs.get('cursor') or None,
+        'limit': max(1, min(limit, MAX_PAGE_SIZE)),
+        'since': int(since) if since not in (None, '', False) else None,
+        'product_id': kwargs.get('product_id') or None,
+        'garage': kwargs.get('garage') or None,
+    }
+
+
+def _is_not_modified(etag):
+    # Werkzeug parses If-None-Match into unquoted tags.
+    return request.httprequest.if_none_match.contains_weak(etag.strip('"'))
+
 
 class MobileStockController(http.Controller):
 
     @http.route('/mobile/stock/snapshot', type='json', auth='user', methods=['GET', 'POST'])
     def get_stock_snapshot(self, **kwargs):
         """
-        Returns a snapshot of the stock grouped by product, lot, dum, garage.
-        Filters can be passed in kwargs:
+        Returns a page of the stock grouped by product, lot, dum, garage.
+        Parameters (all optional):
         - product_id: int
         - garage: str
+        - limit: page size (default 1000)
+        - cursor: ``next_cursor`` of the previous page
+        - since: ``watermark`` of the previous full sync, to only get the
+          positions changed since then (emptied positions come with a zero
+          quantity)
+        - etag: ``etag`` of the previous response; ``not_modified`` is
+          returned when the stock did not change
         """
-        domain = []
-        if kwargs.get('product_id'):
-            domain.append(('product_id', '=', int(kwargs.get('product_id'))))
-        if kwargs.get('garage'):
-            domain.append(('garage', '=', kwargs.get('garage')))
-
-        snapshot_recs = request.env['mobile.stock.snapshot'].search(domain)
-        
-        data = []
-        for rec in snapshot_recs:
-            data.append({
-                'product_id': rec.product_id.id,
-                'product_name': rec.product_name,
-                'company_article_id': rec.company_article_id.id,
-                'company_article_name': rec.company_article_id.name if rec.company_article_id else False,
-                'garage': rec.garage,
-                'lot': rec.lot,
-                'dum': rec.dum,
-                'quantity_available': rec.quantity_available,
-                'entry_date': rec.entry_date,
-                'weight': rec.weight,
-                'calibre': rec.calibre,
-            })
-        
-        return {'status': 'success', 'data': data}
+        args = _page_args(kwargs)
+        Snapshot = request.env['mobile.stock.snapshot']
+        etag = Snapshot._compute_etag(Snapshot._get_change_state(), **args)
+        if kwargs.get('etag') == etag:
+            return {'status': 'not_modified', 'etag': etag}
+
+        page = Snapshot.fetch_page(**args)
+        return dict(page, status='success', etag=etag)
+
+    @http.route('/mobile/stock/operations', type='json', auth='user', methods=['POST'])
+    def post_stock_operations(self, operations=None, **kwargs):
+        """
+        Creates and confirms a batch of exits, transfers and returns.
+        Parameters:
+        - operations: list of dicts with ``key`` (client-generated idempotency
+          key, e.g. a UUID), ``type`` (exit, transfer, return) and the fields
+          of the document (product_id, qty, lot, dum, garage...)
+        Resending a key returns the stored result with ``replayed: true``
+        instead of posting the operation again.
+        """
+        results = request.env['mobile.operation'].submit(operations or [])
+        return {'status': 'success', 'results': results}
+
+    @http.route('/mobile/stock/positions', type='http', auth='user', methods=['GET'])
+    def get_stock_positions(self, **kwargs):
+        """Plain HTTP variant of the snapshot with ETag / 304 Not Modified support."""
+        args = _page_args(kwargs)
+        Snapshot = request.env['mobile.stock.snapshot']
+        etag = Snapshot._compute_etag(Snapshot._get_change_state(), **args)
+        headers = [('ETag', etag), ('Cache-Control', 'private, no-cache')]
+        if _is_not_modified(etag):
+            return request.make_response('', headers=headers, status=304)
+
+        page = Snapshot.fetch_page(**args)
+        body = json.dumps(dict(page, status='success'), default=json_default)
+        return request.make_response(body, headers=headers + [('Content-Type', 'application/json')])
+
+    @http.route('/mobile/stock/positions/columnar', type='http', auth='user', methods=['GET'])
+    def get_stock_positions_columnar(self, **kwargs):
+        """Compact columnar variant of /mobile/stock/positions.
+
+        Same parameters plus ``format``: ``json`` (default) or ``msgpack``.
+        The body is gzipped when the client sends ``Accept-Encoding: gzip``.
+        See doc/columnar_format.md for the payload layout.
+        """
+        fmt = kwargs.get('format') or 'json'
+        if fmt not in ('json', 'msgpack'):
+            return request.make_response('Unknown format', status=400)
+        if fmt == 'msgpack' and msgpack is None:
+            return request.make_response('MessagePack is not available on this server', status=406)
+
+        args = _page_args(kwargs)
+        Snapshot = request.env['mobile.stock.snapshot']
+        etag = Snapshot._compute_etag(Snapshot._get_change_state(), format=fmt, **args)
+        headers = [('ETag', etag), ('Cache-Control', 'private, no-cache'), ('Vary', 'Accept-Encoding')]
+        if _is_not_modified(etag):
+            return request.make_response('', headers=headers, status=304)
+
+        page = Snapshot.fetch_page(**args)
+        payload = encode_columnar(
+            page['data'], binary=fmt == 'msgpack',
+            status='success', watermark=page['watermark'], next_cursor=page['next_cursor'],
+        )
+        if fmt == 'msgpack':
+            body = msgpack.packb(payload, use_bin_type=True)
+            headers.append(('Content-Type', 'application/x-msgpack'))
+        else:
+            body = json.dumps(payload, separators=(',', ':')).encode()
+            headers.append(('Content-Type', 'application/json'))
+        if len(body) >= GZIP_MIN_SIZE and 'gzip' in request.httprequest.accept_encodings:
+            body = gzip.compress(body, compresslevel=6)
+            headers.append(('Content-Encoding', 'gzip'))
+        return request.make_response(body, headers=headers)
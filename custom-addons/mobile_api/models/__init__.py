@@ -1 +1,2 @@
 from . import mobile_stock_snapshot
+from . import mobile_operation
@@ -0,0 +1,207 @@
+import psycopg2
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+
+MAX_OPERATIONS = 500
+
+OPERATION_MODELS = {
+    'exit': 'stock.kal3iya.exit',
+    'transfer': 'stock.kal3iya.transfer',
+    'return': 'stock.kal3iya.return',
+}
+
+# Fields the handheld may set, per operation type.
+OPERATION_FIELDS = {
+    'exit': [
+        'product_id', 'qty', 'weight', 'date', 'lot', 'dum', 'calibre', 'garage',
+        'client_id', 'soufiane_client', 'driver_id', 'ste_id',
+    ],
+    'transfer': ['product_id', 'qty', 'date', 'lot', 'dum', 'garage_from', 'garage_to', 'driver_id', 'ste_id'],
+    'return': ['exit_id', 'qty', 'date', 'driver_id'],
+}
+
+
+def _error_result(key, message):
+    return {'key': key, 'status': 'error', 'message': message, 'id': False, 'reference': False, 'replayed': False}
+
+
+class MobileOperation(models.Model):
+    """Operations posted by the handhelds, one per client idempotency key.
+
+    The key is claimed before anything is created, in the same transaction
+    as the operation itself: a retried request either replays the stored
+    result or, if the first attempt is still running, waits for it and is
+    retried by the server on the serialization failure.
+    """
+    _name = 'mobile.operation'
+    _description = 'Opération Mobile'
+    _order = 'id desc'
+    _rec_name = 'key'
+
+    key = fields.Char(string="Clé d'idempotence", required=True, readonly=True)
+    operation_type = fields.Selection([
+        ('exit', 'Sortie'),
+        ('transfer', 'Transfert'),
+        ('return', 'Retour'),
+    ], string='Type', required=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'En cours'),
+        ('done', 'Confirmé'),
+        ('error', 'Rejeté'),
+    ], string='État', default='pending', required=True, readonly=True)
+    message = fields.Text(string='Message', readonly=True)
+    res_model = fields.Char(string="Modèle d'Origine", readonly=True)
+    res_id = fields.Integer(string="ID d'Origine", readonly=True)
+    reference = fields.Char(string='Référence', readonly=True)
+
+    _sql_constraints = [
+        ('unique_key', 'unique(key)', "Cette clé d'idempotence a déjà été utilisée.")
+    ]
+
+    def _to_result(self, replayed=False):
+        self.ensure_one()
+        return {
+            'key': self.key,
+            'status': self.state,
+            'message': self.message or False,
+            'id': self.res_id or False,
+            'reference': self.reference or False,
+            'replayed': replayed,
+        }
+
+    @api.model
+    def _claim_keys(self, operations):
+        """Insert the log rows of new keys; returns {key: id} of the claimed ones.
+
+        A key already committed by a concurrent request is not visible to our
+        snapshot: PostgreSQL then raises a serialization failure and Odoo
+        retries the whole request, which will replay it.
+        """
+        self.env.cr.execute("""
+            INSERT INTO mobile_operation
+                (key, operation_type, state, create_uid, create_date, write_uid, write_date)
+            SELECT k.key, k.operation_type, 'pending', %(uid)s, now() at time zone 'UTC',
+                   %(uid)s, now() at time zone 'UTC'
+            FROM unnest(%(keys)s::varchar[], %(types)s::varchar[]) AS k(key, operation_type)
+            ON CONFLICT (key) DO NOTHING
+            RETURNING key, id
+        """, {
+            'uid': self.env.uid,
+            'keys': [op['key'] for op in operations],
+            'types': [op['type'] for op in operations],
+        })
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _prepare_vals(self, op):
+        vals = {name: op[name] for name in OPERATION_FIELDS[op['type']] if op.get(name) not in (None, '')}
+        vals.setdefault('date', fields.Date.context_today(self))
+        return vals
+
+    @api.model
+    def _create_operations(self, ops):
+        """Create the draft documents; returns ({key: record}, {key: error})."""
+        records, errors = {}, {}
+        for op in ops:
+            try:
+                with self.env.cr.savepoint():
+                    records[op['key']] = self.env[OPERATION_MODELS[op['type']]].create(self._prepare_vals(op))
+            except (UserError, ValidationError, ValueError, psycopg2.IntegrityError) as e:
+                errors[op['key']] = str(e)
+        return records, errors
+
+    @api.model
+    def _write_results(self, results):
+        keys = list(results)
+        self.env.cr.execute("""
+            UPDATE mobile_operation o
+            SET state = v.state, message = v.message, res_model = v.res_model, res_id = v.res_id,
+                reference = v.reference, write_date = now() at time zone 'UTC'
+            FROM unnest(%s::varchar[], %s::varchar[], %s::text[], %s::varchar[], %s::int[], %s::varchar[])
+                 AS v(key, state, message, res_model, res_id, reference)
+            WHERE o.key = v.key
+        """, [
+            keys,
+            [results[k]['status'] for k in keys],
+            [results[k]['message'] or None for k in keys],
+            [results[k]['res_model'] or None for k in keys],
+            [results[k]['id'] or None for k in keys],
+            [results[k]['reference'] or None for k in keys],
+        ])
+        self.invalidate_model()
+
+    @api.model
+    def submit(self, operations):
+        """Create and confirm a batch of handheld operations.
+
+        :param operations: list of dicts with ``key`` (client-generated,
+            unique per operation), ``type`` (exit, transfer or return) and the
+            document fields (see OPERATION_FIELDS)
+        :return: one result dict per operation, in the same order, with
+            ``status`` (done or error), ``message``, ``id``, ``reference`` and
+            ``replayed`` (result of an earlier submission of the same key)
+
+        Availability is checked for the whole batch at once. Documents whose
+        stock is missing are kept as drafts for the clerk and reported as
+        errors; the others are confirmed.
+        """
+        if not isinstance(operations, list):
+            raise UserError(_("Les opérations doivent être une liste."))
+        if len(operations) > MAX_OPERATIONS:
+            raise UserError(_("Trop d'opérations dans une même requête (maximum %s).") % MAX_OPERATIONS)
+
+        results, valid, seen = {}, [], set()
+        for index, op in enumerate(operations):
+            key = op.get('key') if isinstance(op, dict) else None
+            if not key or not isinstance(key, str):
+                results[index] = _error_result(key, _("Clé d'idempotence manquante."))
+            elif key in seen:
+                results[index] = _error_result(key, _("Clé d'idempotence en double."))
+            elif op.get('type') not in OPERATION_MODELS:
+                results[index] = _error_result(key, _("Type d'opération inconnu."))
+            else:
+                valid.append((index, op))
+            if isinstance(key, str):
+                seen.add(key)
+
+        claimed = self._claim_keys([op for index, op in valid])
+        replayed_keys = [op['key'] for index, op in valid if op['key'] not in claimed]
+        replayed = {log.key: log for log in self.search([('key', 'in', replayed_keys)])} if replayed_keys else {}
+
+        new_ops = [op for index, op in valid if op['key'] in claimed]
+        records, outcomes = self._create_operations(new_ops)
+        outcomes = {key: {'status': 'error', 'message': message, 'res_model': False, 'id': False, 'reference': False}
+                    for key, message in outcomes.items()}
+
+        for op_type, model in OPERATION_MODELS.items():
+            docs = self.env[model].browse([
+                records[op['key']].id for op in new_ops if op['type'] == op_type and op['key'] in records])
+            if not docs:
+                continue
+            report = docs._confirm_batch()
+            for op in new_ops:
+                if op['type'] != op_type or op['key'] not in records:
+                    continue
+                doc = records[op['key']]
+                outcomes[op['key']] = {
+                    'status': 'error' if doc.id in report['errors'] else 'done',
+                    'message': report['errors'].get(doc.id, False),
+                    'res_model': model,
+                    'id': doc.id,
+                    'reference': doc.name,
+                }
+        if outcomes:
+            self._write_results(outcomes)
+
+        for index, op in valid:
+            key = op['key']
+            if key in outcomes:
+                outcome = outcomes[key]
+                results[index] = {'key': key, 'status': outcome['status'], 'message': outcome['message'],
+                                  'id': outcome['id'], 'reference': outcome['reference'], 'replayed': False}
+            elif key in replayed and replayed[key].create_uid == self.env.user:
+                results[index] = replayed[key]._to_result(replayed=True)
+            else:
+                results[index] = _error_result(key, _("Cette clé d'idempotence a déjà été utilisée."))
+        return [results[index] for index in range(len(operations))]
@@ -1,4 +1,42 @@
-from odoo import models, fields, tools
+import base64
+import hashlib
+import json
+
+from odoo import models, fields, api, tools
+
+# Columns returned to the handhelds, in payload order.
+SNAPSHOT_COLUMNS = [
+    'product_id', 'product_name', 'company_article_id', 'company_article_name',
+    'garage', 'lot', 'dum', 'quantity_available', 'entry_date', 'weight', 'calibre',
+]
+
+# Keyset order of the positions; lot/dum/garage are never NULL in the cursor.
+_POSITION_ORDER = "b.product_id, COALESCE(b.lot, ''), COALESCE(b.dum, ''), COALESCE(b.garage, '')"
+
+# Positions aggregated over the sociétés, read from the materialized balance.
+_POSITIONS_SELECT = """
+    SELECT
+        b.product_id,
+        p.name as product_name,
+        p.company_article_id,
+        a.name as company_article_name,
+        b.garage,
+        b.lot,
+        b.dum,
+        sum(b.quantity) as quantity_available,
+        min(b.first_date) as entry_date,
+        max(b.weight) as weight,
+        max(b.calibre) as calibre
+    FROM stock_kal3iya_balance b
+    JOIN stock_kal3iya_product p ON b.product_id = p.id
+    LEFT JOIN company_article a ON p.company_article_id = a.id
+    WHERE {where}
+    GROUP BY b.product_id, p.name, p.company_article_id, a.name, b.garage, b.lot, b.dum
+    {having}
+    ORDER BY """ + _POSITION_ORDER + """
+    {limit}
+"""
+
 
 class MobileStockSnapshot(models.Model):
     _name = 'mobile.stock.snapshot'
@@ -33,21 +71,123 @@ class MobileStockSnapshot(models.Model):
         self.env.cr.execute("""
             CREATE OR REPLACE VIEW %s AS (
                 SELECT
-                    min(m.id) as id,
-                    m.product_id,
+                    min(b.id) as id,
+                    b.product_id,
                     p.name as product_name,
                     p.company_article_id,
-                    m.garage,
-                    m.lot,
-                    m.dum,
-                    sum(m.qty) as quantity_available,
-                    min(m.date) as entry_date,
-                    max(m.weight) as weight,
-                    max(m.calibre) as calibre
-                FROM stock_kal3iya_move m
-                JOIN stock_kal3iya_product p ON m.product_id = p.id
-                WHERE m.state = 'done'
-                GROUP BY m.product_id, p.name, p.company_article_id, m.garage, m.lot, m.dum
-                HAVING sum(m.qty) > 0
+                    b.garage,
+                    b.lot,
+                    b.dum,
+                    sum(b.quantity) as quantity_available,
+                    min(b.first_date) as entry_date,
+                    max(b.weight) as weight,
+                    max(b.calibre) as calibre
+                FROM stock_kal3iya_balance b
+                JOIN stock_kal3iya_product p ON b.product_id = p.id
+                GROUP BY b.product_id, p.name, p.company_article_id, b.garage, b.lot, b.dum
+                HAVING sum(b.quantity) > 0
             )
         """ % self._table)
+
+    # ------------------------------------------------------------------
+    # Mobile sync API
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _encode_cursor(self, row):
+        key = [row['product_id'], row['lot'] or '', row['dum'] or '', row['garage'] or '']
+        return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+    @api.model
+    def _decode_cursor(self, cursor):
+        product_id, lot, dum, garage = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [int(product_id), lot, dum, garage]
+
+    @api.model
+    def _get_watermark(self):
+        """Sync watermark: oldest transaction still running for this snapshot.
+
+        Every balance write stamps the position with its transaction id, and
+        any transaction older than this one is already visible, so positions
+        changed by later commits have ``change_txid >= watermark`` whatever
+        the order in which those transactions committed.
+        """
+        self.env.cr.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _get_change_state(self):
+        """Stock state as seen by this snapshot, for the ETag.
+
+        The last visible change, plus the older transactions still in
+        flight: one of those committing later changes the state even though
+        its change_txid is not the highest.
+        """
+        self.env['stock.kal3iya.move'].flush_model()
+        self.env.cr.execute("""
+            WITH last AS (SELECT COALESCE(max(change_txid), 0) AS txid FROM stock_kal3iya_balance)
+            SELECT last.txid, ARRAY(
+                SELECT xip FROM txid_snapshot_xip(txid_current_snapshot()) xip
+                WHERE xip < last.txid ORDER BY xip
+            )
+            FROM last
+        """)
+        return list(self.env.cr.fetchone())
+
+    @api.model
+    def _compute_etag(self, state, **params):
+        payload = json.dumps([state, sorted((k, str(v)) for k, v in params.items() if v)])
+        return '"%s"' % hashlib.sha1(payload.encode()).hexdigest()
+
+    @api.model
+    def fetch_page(self, cursor=None, limit=1000, since=None, product_id=None, garage=None):
+        """One page of positions in a single SQL projection.
+
+        :param cursor: opaque keyset cursor returned as ``next_cursor``
+        :param since: watermark of a previous sync; only positions changed by
+            transactions not visible to that sync are returned, including
+            emptied ones with a zero quantity so that the client can drop them
+        :return: dict with ``data``, ``next_cursor`` (False on the last page)
+            and ``watermark`` (to pass as ``since`` on the next sync)
+        """
+        self.check_access_rights('read')
+        self.env['stock.kal3iya.move'].flush_model()
+        watermark = self._get_watermark()
+        where, params = ['TRUE'], {'limit': limit}
+        if product_id:
+            where.append('b.product_id = %(product_id)s')
+            params['product_id'] = int(product_id)
+        if garage:
+            where.append('b.garage = %(garage)s')
+            params['garage'] = garage
+        if cursor:
+            where.append("(%s) > (%%(c_product)s, %%(c_lot)s, %%(c_dum)s, %%(c_garage)s)" % _POSITION_ORDER)
+            params.update(zip(['c_product', 'c_lot', 'c_dum', 'c_garage'], self._decode_cursor(cursor)))
+        if since is not None:
+            where.append("""
+                (b.product_id, COALESCE(b.lot, ''), COALESCE(b.dum, ''), COALESCE(b.garage, '')) IN (
+                    SELECT c.product_id, COALESCE(c.lot, ''), COALESCE(c.dum, ''), COALESCE(c.garage, '')
+                    FROM stock_kal3iya_balance c
+                    WHERE c.change_txid >= %(since)s
+                )
+            """)
+            params['since'] = int(since)
+        query = _POSITIONS_SELECT.format(
+            where=' AND '.join(where),
+            # A delta sync must also report the positions that went to zero.
+            having='' if since is not None else 'HAVING sum(b.quantity) > 0',
+            limit='LIMIT %(limit)s',
+        )
+        self.env.cr.execute(query, params)
+        rows = self.env.cr.dictfetchall()
+        for row in rows:
+            for column in SNAPSHOT_COLUMNS:
+                if row[column] is None:
+                    row[column] = False
+            row['entry_date'] = fields.Datetime.to_string(row['entry_date'])
+        next_cursor = self._encode_cursor(rows[-1]) if len(rows) == limit else False
+        return {
+            'data': rows,
+            'next_cursor': next_cursor,
+            'watermark': watermark,
+        }
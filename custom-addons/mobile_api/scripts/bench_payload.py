@@ -0,0 +1,106 @@
+"""Payload size and encoding time of the mobile stock snapshot formats.
+
+Usage: python3 bench_payload.py [positions] [products]
+
+Generates positions shaped like mobile.stock.snapshot.fetch_page rows and
+compares the JSON-RPC dict-per-row body with the columnar encoding
+(services/columnar.py) as JSON, gzipped JSON and MessagePack.
+"""
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'services'))
+
+from columnar import encode_columnar, decode_columnar  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+GARAGES = ['garage%s' % i for i in range(1, 9)] + ['terrasse', 'fenidek']
+CALIBRES = ['S', 'M', 'L', 'XL', '14/16', '16/18', False]
+
+
+def generate_rows(position_count, product_count, seed=42):
+    rng = random.Random(seed)
+    products = [
+        (i, 'PRODUIT %s %s' % (rng.choice(['AGNEAU', 'BOEUF', 'POULET', 'DINDE']), i), i % 50 + 1)
+        for i in range(1, product_count + 1)
+    ]
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(position_count):
+        product_id, product_name, article_id = rng.choice(products)
+        rows.append({
+            'product_id': product_id,
+            'product_name': product_name,
+            'company_article_id': article_id,
+            'company_article_name': 'ARTICLE %s' % article_id,
+            'garage': rng.choice(GARAGES),
+            'lot': 'LOT%06d' % i,
+            'dum': 'DUM%06d' % (i // 3),
+            'quantity_available': float(rng.randint(1, 900)),
+            'entry_date': (start + timedelta(seconds=rng.randint(0, 3e7))).strftime('%Y-%m-%d %H:%M:%S'),
+            'weight': round(rng.uniform(5, 30), 2),
+            'calibre': rng.choice(CALIBRES),
+        })
+    return rows
+
+
+def timed(func, repeat=5):
+    best = None
+    for _i in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main():
+    position_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    product_count = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    rows = generate_rows(position_count, product_count)
+    meta = {'status': 'success', 'watermark': 123456, 'next_cursor': False}
+
+    results = []
+    verbose, t = timed(lambda: json.dumps(
+        {'jsonrpc': '2.0', 'id': None, 'result': dict(meta, data=rows)}).encode())
+    results.append(('json-rpc (dict per row)', verbose, t))
+    results.append(('json-rpc + gzip', *timed(lambda: gzip.compress(json.dumps(
+        {'jsonrpc': '2.0', 'id': None, 'result': dict(meta, data=rows)}).encode(), 6))))
+
+    def columnar_json():
+        return json.dumps(encode_columnar(rows, **meta), separators=(',', ':')).encode()
+
+    body, t = timed(columnar_json)
+    results.append(('columnar json', body, t))
+    results.append(('columnar json + gzip', *timed(lambda: gzip.compress(columnar_json(), 6))))
+    assert decode_columnar(json.loads(body)) == rows
+
+    if msgpack is not None:
+        def columnar_msgpack():
+            return msgpack.packb(encode_columnar(rows, binary=True, **meta), use_bin_type=True)
+
+        body, t = timed(columnar_msgpack)
+        results.append(('columnar msgpack', body, t))
+        results.append(('columnar msgpack + gzip', *timed(lambda: gzip.compress(columnar_msgpack(), 6))))
+        assert decode_columnar(msgpack.unpackb(body, raw=False)) == rows
+    else:
+        print("msgpack not installed, skipping the MessagePack variants")
+
+    print("%s positions, %s products" % (position_count, product_count))
+    print("%-26s %12s %8s %10s" % ('format', 'bytes', 'ratio', 'encode'))
+    for name, payload, elapsed in results:
+        print("%-26s %12d %7.1f%% %8.1fms" % (
+            name, len(payload), 100.0 * len(payload) / len(verbose), elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
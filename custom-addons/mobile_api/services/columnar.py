@@ -0,0 +1,161 @@
+"""Compact columnar encoding of the mobile stock snapshot.
+
+See doc/columnar_format.md for the client-side decoding spec. The payload
+carries one entry per column instead of one dict per position:
+
+- products (id, name, article id, article name) are dictionary-encoded once
+  and referenced by index from each row;
+- garage and calibre are dictionary-encoded the same way;
+- numbers are packed little-endian typed arrays (int32 / float64), raw bytes
+  in MessagePack and base64 strings in JSON.
+
+``decode_columnar`` is the reference decoder, used by the benchmark to check
+the round trip.
+"""
+import base64
+import sys
+from array import array
+from datetime import datetime
+
+FORMAT_NAME = 'kal3iya-columnar'
+FORMAT_VERSION = 1
+
+# Dictionary index of a missing value.
+NULL_INDEX = -1
+
+_EPOCH = datetime(1970, 1, 1)
+
+assert array('i').itemsize == 4 and array('d').itemsize == 8
+
+
+def _pack(typecode, values, binary):
+    data = array(typecode, values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    raw = data.tobytes()
+    return raw if binary else base64.b64encode(raw).decode('ascii')
+
+
+def _unpack(typecode, payload):
+    data = array(typecode)
+    data.frombytes(payload if isinstance(payload, bytes) else base64.b64decode(payload))
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tolist()
+
+
+def _to_epoch(value):
+    if not value:
+        return 0
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int((value - _EPOCH).total_seconds())
+
+
+class _Dictionary:
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def encode(self, value):
+        if value in (None, False, ''):
+            return NULL_INDEX
+        if value not in self.index:
+            self.index[value] = len(self.values)
+            self.values.append(value)
+        return self.index[value]
+
+
+def encode_columnar(rows, binary=False, **meta):
+    """Encode snapshot rows (dicts of SNAPSHOT_COLUMNS) into a columnar payload.
+
+    :param binary: pack numeric arrays as raw bytes (MessagePack) instead of
+        base64 strings (JSON)
+    :param meta: extra top-level keys (watermark, next_cursor...)
+    """
+    product_index = {}
+    products = {'id': [], 'name': [], 'article_id': [], 'article_name': []}
+    garages, calibres = _Dictionary(), _Dictionary()
+
+    product_col, garage_col, calibre_col = [], [], []
+    lots, dums, quantities, weights, dates = [], [], [], [], []
+    for row in rows:
+        product_id = row['product_id']
+        if product_id not in product_index:
+            product_index[product_id] = len(products['id'])
+            products['id'].append(product_id)
+            products['name'].append(row['product_name'] or '')
+            products['article_id'].append(row['company_article_id'] or 0)
+            products['article_name'].append(row['company_article_name'] or '')
+        product_col.append(product_index[product_id])
+        garage_col.append(garages.encode(row['garage']))
+        calibre_col.append(calibres.encode(row['calibre']))
+        lots.append(row['lot'] or '')
+        dums.append(row['dum'] or '')
+        quantities.append(row['quantity_available'] or 0.0)
+        weights.append(row['weight'] or 0.0)
+        dates.append(_to_epoch(row['entry_date']))
+
+    payload = dict(meta)
+    payload.update({
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'count': len(product_col),
+        'dictionaries': {
+            'product': {
+                'id': _pack('i', products['id'], binary),
+                'name': products['name'],
+                'article_id': _pack('i', products['article_id'], binary),
+                'article_name': products['article_name'],
+            },
+            'garage': garages.values,
+            'calibre': calibres.values,
+        },
+        'columns': {
+            'product': _pack('i', product_col, binary),
+            'garage': _pack('i', garage_col, binary),
+            'calibre': _pack('i', calibre_col, binary),
+            'lot': lots,
+            'dum': dums,
+            'quantity_available': _pack('d', quantities, binary),
+            'weight': _pack('d', weights, binary),
+            'entry_date': _pack('i', dates, binary),
+        },
+    })
+    return payload
+
+
+def decode_columnar(payload):
+    """Reference decoder: columnar payload back to snapshot row dicts."""
+    dictionaries, columns = payload['dictionaries'], payload['columns']
+    product = dictionaries['product']
+    product_ids = _unpack('i', product['id'])
+    article_ids = _unpack('i', product['article_id'])
+
+    def lookup(values, index):
+        return values[index] if index != NULL_INDEX else False
+
+    rows = []
+    product_col = _unpack('i', columns['product'])
+    garage_col = _unpack('i', columns['garage'])
+    calibre_col = _unpack('i', columns['calibre'])
+    quantities = _unpack('d', columns['quantity_available'])
+    weights = _unpack('d', columns['weight'])
+    dates = _unpack('i', columns['entry_date'])
+    for i in range(payload['count']):
+        p = product_col[i]
+        rows.append({
+            'product_id': product_ids[p],
+            'product_name': product['name'][p] or False,
+            'company_article_id': article_ids[p] or False,
+            'company_article_name': product['article_name'][p] or False,
+            'garage': lookup(dictionaries['garage'], garage_col[i]),
+            'lot': columns['lot'][i] or False,
+            'dum': columns['dum'][i] or False,
+            'quantity_available': quantities[i],
+            'entry_date': datetime.utcfromtimestamp(dates[i]).strftime('%Y-%m-%d %H:%M:%S') if dates[i] else False,
+            'weight': weights[i],
+            'calibre': lookup(dictionaries['calibre'], calibre_col[i]),
+        })
+    return rows
@@ -0,0 +1,29 @@
+from odoo.tests import HttpCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestStockPositions(HttpCase):
+
+    def setUp(self):
+        super().setUp()
+        self.authenticate('admin', 'admin')
+
+    def test_if_none_match(self):
+        url = '/mobile/stock/positions?limit=10'
+        response = self.url_open(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+
+        response = self.url_open(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+
+        response = self.url_open(url, headers={'If-None-Match': 'W/%s' % etag})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.url_open(url, headers={'If-None-Match': '"stale"'})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.url_open('/mobile/stock/positions?limit=20', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
@@ -18,6 +18,7 @@ This module provides a robust stock management system based on an immutable move
         'security/groups.xml',
         'security/ir.model.access.csv',
         'data/data.xml',
+        'data/cron.xml',
         'views/stock_kal3iya_root_menu.xml',
         'views/stock_kal3iya_move_views.xml',
         'views/stock_kal3iya_entry_views.xml',
@@ -26,6 +27,7 @@ This module provides a robust stock management system based on an immutable move
         'views/stock_kal3iya_stock_views.xml',
         'views/stock_kal3iya_master_data_views.xml',
         'views/stock_kal3iya_transfer_views.xml',
+        'views/stock_kal3iya_snapshot_views.xml',
         'views/stock_kal3iya_menus.xml',
     ],
     'installable': True,
@@ -4,11 +4,17 @@ from . import stock_kal3iya_ste
 from . import stock_kal3iya_client
 from . import stock_kal3iya_driver
 from . import stock_kal3iya_stock_move
+from . import stock_kal3iya_balance
+from . import stock_kal3iya_availability
+from . import stock_kal3iya_batch_confirm
 from . import stock_kal3iya_stock_entry
 from . import stock_kal3iya_stock_exit
 from . import stock_kal3iya_stock_stock
 from . import stock_kal3iya_transfer
 from . import stock_kal3iya_return
+from . import stock_kal3iya_snapshot
+from . import stock_kal3iya_stock_at_date
+from . import stock_kal3iya_cost_layer
 
 
 
@@ -0,0 +1,90 @@
+from collections import defaultdict
+
+from odoo import models, api, _
+from odoo.exceptions import UserError
+
+
+class StockKal3iyaAvailability(models.AbstractModel):
+    """Atomic availability check shared by exits, transfers and returns.
+
+    Availability is read from the materialized balance table. The balance rows
+    of every requested position are locked (``FOR UPDATE``) until the end of
+    the transaction, so two users consuming the same lot/DUM cannot both pass
+    the check: the second one waits, then gets a serialization failure and
+    the request is retried against the updated balance.
+    """
+    _name = 'stock.kal3iya.availability'
+    _description = 'Disponibilité Stock Kal3iya'
+
+    @api.model
+    def _normalize_key(self, product_id, lot, dum, garage):
+        return (product_id, lot or '', dum or '', garage or '')
+
+    @api.model
+    def _lock_and_get_available(self, keys):
+        """Lock the given positions and return their available quantity.
+
+        :param keys: iterable of (product_id, lot, dum, garage)
+        :return: dict {normalized key: available qty}
+        """
+        keys = {self._normalize_key(*key) for key in keys}
+        available = dict.fromkeys(keys, 0.0)
+        if not keys:
+            return available
+        keys = sorted(keys)
+        # Balance rows are locked in id order to avoid deadlocks between
+        # concurrent multi-position confirmations.
+        self.env.cr.execute("""
+            SELECT b.product_id, COALESCE(b.lot, ''), COALESCE(b.dum, ''),
+                   COALESCE(b.garage, ''), b.quantity
+            FROM stock_kal3iya_balance b
+            JOIN unnest(%s::int[], %s::varchar[], %s::varchar[], %s::varchar[])
+                 AS k(product_id, lot, dum, garage)
+              ON b.product_id = k.product_id
+             AND COALESCE(b.lot, '') = k.lot
+             AND COALESCE(b.dum, '') = k.dum
+             AND COALESCE(b.garage, '') = k.garage
+            ORDER BY b.id
+            FOR UPDATE OF b
+        """, [
+            [k[0] for k in keys],
+            [k[1] for k in keys],
+            [k[2] for k in keys],
+            [k[3] for k in keys],
+        ])
+        for product_id, lot, dum, garage, quantity in self.env.cr.fetchall():
+            available[(product_id, lot, dum, garage)] += quantity or 0.0
+        return available
+
+    @api.model
+    def check_availability(self, lines, raise_if_missing=True):
+        """Check and lock stock for a batch of consumptions in one round trip.
+
+        :param lines: list of dicts with keys ``product_id``, ``lot``, ``dum``,
+            ``garage`` and ``qty`` (positive quantity to take out). An optional
+            ``ref`` is used in error messages.
+        :param raise_if_missing: raise a UserError on the first failing
+            position instead of returning the errors.
+        :return: dict {line index: error message} for the lines that cannot be
+            served. Quantities of lines sharing a position are cumulated, in
+            order, so the first lines of a position are served first.
+        """
+        keys = [
+            self._normalize_key(line['product_id'], line.get('lot'), line.get('dum'), line.get('garage'))
+            for line in lines
+        ]
+        available = self._lock_and_get_available(keys)
+        requested = defaultdict(float)
+        errors = {}
+        for index, (key, line) in enumerate(zip(keys, lines)):
+            remaining = available[key] - requested[key]
+            if line['qty'] > remaining:
+                message = _("Stock insuffisant ! Disponible : %s, Demandé : %s") % (max(remaining, 0.0), line['qty'])
+                if line.get('ref'):
+                    message = "%s : %s" % (line['ref'], message)
+                if raise_if_missing:
+                    raise UserError(message)
+                errors[index] = message
+                continue
+            requested[key] += line['qty']
+        return errors
@@ -0,0 +1,230 @@
+import logging
+
+from odoo import models, fields, api, _
+
+_logger = logging.getLogger(__name__)
+
+# Ledger fields that feed a balance position; writing any of them on a move
+# requires the affected positions to be recomputed.
+BALANCE_MOVE_FIELDS = {
+    'product_id', 'lot', 'dum', 'garage', 'ste_id', 'qty', 'state', 'date',
+    'weight', 'calibre', 'price_purchase', 'cost_value', 'scan_dum', 'scan_invoice',
+}
+
+
+def position_key_sql(alias=''):
+    """Position key expression, as used by the balance unique index.
+
+    Lot/DUM are normalised so that '' and NULL land on the same position.
+    """
+    prefix = alias and '%s.' % alias
+    return (
+        "{p}product_id, COALESCE({p}lot, ''), COALESCE({p}dum, ''), "
+        "COALESCE({p}garage, ''), COALESCE({p}ste_id, 0)"
+    ).format(p=prefix)
+
+
+POSITION_KEY_SQL = position_key_sql()
+
+# Change marker of a position: id of the last transaction that wrote it.
+# Unlike a sequence or write_date, it can be compared with the snapshot
+# xmin of a reader to know which changes that reader may not have seen.
+CHANGE_MARKER_SQL = "txid_current()"
+
+_AGGREGATE_SELECT = """
+    SELECT
+        m.product_id,
+        NULLIF(m.lot, '') as lot,
+        NULLIF(m.dum, '') as dum,
+        m.garage,
+        m.ste_id,
+        sum(m.qty) as quantity,
+        max(CASE WHEN m.qty > 0 THEN m.weight END) as weight,
+        max(CASE WHEN m.qty > 0 THEN m.calibre END) as calibre,
+        max(CASE WHEN m.qty > 0 THEN m.price_purchase END) as price,
+        COALESCE(sum(m.cost_value), 0) as mt_achat,
+        max(m.scan_dum) as scan_dum,
+        max(m.scan_invoice) as scan_invoice,
+        min(m.date) as first_date,
+        max(m.date) as last_date
+    FROM stock_kal3iya_move m
+    WHERE m.state = 'done' AND {where}
+    GROUP BY m.product_id, NULLIF(m.lot, ''), NULLIF(m.dum, ''), m.garage, m.ste_id
+"""
+
+_INSERT_COLUMNS = """
+    product_id, lot, dum, garage, ste_id, quantity, weight, calibre, price,
+    mt_achat, scan_dum, scan_invoice, first_date, last_date
+"""
+
+# Replace the aggregates of existing positions (full recompute).
+_UPSERT_REPLACE = """
+    ON CONFLICT (%s) DO UPDATE SET
+        quantity = EXCLUDED.quantity,
+        weight = EXCLUDED.weight,
+        calibre = EXCLUDED.calibre,
+        price = EXCLUDED.price,
+        mt_achat = EXCLUDED.mt_achat,
+        scan_dum = EXCLUDED.scan_dum,
+        scan_invoice = EXCLUDED.scan_invoice,
+        first_date = EXCLUDED.first_date,
+        last_date = EXCLUDED.last_date,
+        change_txid = %s
+""" % (POSITION_KEY_SQL, CHANGE_MARKER_SQL)
+
+
+class StockKal3iyaBalance(models.Model):
+    _name = 'stock.kal3iya.balance'
+    _description = 'Solde Stock Kal3iya (Matérialisé)'
+    _log_access = False
+    _order = 'product_id'
+
+    product_id = fields.Many2one('stock.kal3iya.product', string='Produit', readonly=True, required=True, ondelete='restrict')
+    lot = fields.Char(string='Lot', readonly=True)
+    dum = fields.Char(string='DUM', readonly=True)
+    garage = fields.Selection([
+        ('garage1', 'Garage 1'),
+        ('garage2', 'Garage 2'),
+        ('garage3', 'Garage 3'),
+        ('garage4', 'Garage 4'),
+        ('garage5', 'Garage 5'),
+        ('garage6', 'Garage 6'),
+        ('garage7', 'Garage 7'),
+        ('garage8', 'Garage 8'),
+        ('terrasse', 'Terrasse'),
+        ('fenidek', 'Fenidek'),
+    ], string='Garage', readonly=True)
+    ste_id = fields.Many2one('stock.kal3iya.ste', string='Société', readonly=True)
+
+    quantity = fields.Float(string='Quantité', readonly=True)
+    weight = fields.Float(string='Poids (Kg)', readonly=True)
+    calibre = fields.Char(string='Calibre', readonly=True)
+    price = fields.Float(string='Dernier Prix (Achat)', readonly=True)
+    mt_achat = fields.Float(string='Valeur achat (FIFO)', readonly=True)
+    scan_dum = fields.Char(string='Scan DUM', readonly=True)
+    scan_invoice = fields.Char(string='Scan Facture', readonly=True)
+    first_date = fields.Datetime(string='Premier Mouvement', readonly=True)
+    last_date = fields.Datetime(string='Dernier Mouvement', readonly=True)
+
+    def init(self):
+        cr = self.env.cr
+        cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS stock_kal3iya_balance_position_uniq
+            ON stock_kal3iya_balance (%s)
+        """ % POSITION_KEY_SQL)
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS stock_kal3iya_balance_open_idx
+            ON stock_kal3iya_balance (product_id) WHERE quantity != 0
+        """)
+        cr.execute("""
+            ALTER TABLE stock_kal3iya_balance
+            ADD COLUMN IF NOT EXISTS change_txid bigint NOT NULL DEFAULT %s
+        """ % CHANGE_MARKER_SQL)
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS stock_kal3iya_balance_change_txid_idx
+            ON stock_kal3iya_balance (change_txid)
+        """)
+        # First install / upgrade from the SQL view: seed from the ledger.
+        cr.execute("SELECT 1 FROM stock_kal3iya_balance LIMIT 1")
+        if not cr.fetchone():
+            cr.execute("SELECT 1 FROM stock_kal3iya_move LIMIT 1")
+            if cr.fetchone():
+                self._rebuild()
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _apply_moves(self, moves):
+        """Add freshly created ledger moves to their balance positions."""
+        if not moves:
+            return
+        moves.flush_recordset()
+        self.env.cr.execute("""
+            INSERT INTO stock_kal3iya_balance (%s)
+            %s
+            ON CONFLICT (%s) DO UPDATE SET
+                quantity = stock_kal3iya_balance.quantity + EXCLUDED.quantity,
+                weight = GREATEST(stock_kal3iya_balance.weight, EXCLUDED.weight),
+                calibre = GREATEST(stock_kal3iya_balance.calibre, EXCLUDED.calibre),
+                price = GREATEST(stock_kal3iya_balance.price, EXCLUDED.price),
+                mt_achat = COALESCE(stock_kal3iya_balance.mt_achat, 0) + EXCLUDED.mt_achat,
+                scan_dum = GREATEST(stock_kal3iya_balance.scan_dum, EXCLUDED.scan_dum),
+                scan_invoice = GREATEST(stock_kal3iya_balance.scan_invoice, EXCLUDED.scan_invoice),
+                first_date = LEAST(stock_kal3iya_balance.first_date, EXCLUDED.first_date),
+                last_date = GREATEST(stock_kal3iya_balance.last_date, EXCLUDED.last_date),
+                change_txid = %s
+        """ % (_INSERT_COLUMNS, _AGGREGATE_SELECT.format(where='m.id IN %s'), POSITION_KEY_SQL, CHANGE_MARKER_SQL),
+            [tuple(moves.ids)])
+        self._invalidate_balance_cache()
+
+    @api.model
+    def _refresh_positions(self, keys):
+        """Recompute the given positions from the ledger.
+
+        ``keys`` is an iterable of (product_id, lot, dum, garage, ste_id)
+        tuples, as returned by ``stock.kal3iya.move._get_position_keys``.
+        """
+        keys = list(set(keys))
+        if not keys:
+            return
+        self.env['stock.kal3iya.move'].flush_model()
+        cr = self.env.cr
+        key_match = """
+            (%s) IN (SELECT k.product_id, COALESCE(k.lot, ''), COALESCE(k.dum, ''),
+                            COALESCE(k.garage, ''), COALESCE(k.ste_id, 0)
+                     FROM unnest(%%(products)s::int[], %%(lots)s::varchar[], %%(dums)s::varchar[],
+                                 %%(garages)s::varchar[], %%(stes)s::int[])
+                          AS k(product_id, lot, dum, garage, ste_id))
+        """
+        params = {
+            'products': [k[0] for k in keys],
+            'lots': [k[1] or None for k in keys],
+            'dums': [k[2] or None for k in keys],
+            'garages': [k[3] or None for k in keys],
+            'stes': [k[4] or None for k in keys],
+        }
+        # Emptied positions are kept at zero, so that delta syncs report them.
+        cr.execute("""
+            UPDATE stock_kal3iya_balance SET quantity = 0, mt_achat = 0, change_txid = %s
+            WHERE %s
+        """ % (CHANGE_MARKER_SQL, key_match % POSITION_KEY_SQL), params)
+        cr.execute(
+            "INSERT INTO stock_kal3iya_balance (%s) %s %s" % (
+                _INSERT_COLUMNS, _AGGREGATE_SELECT.format(where=key_match % position_key_sql('m')), _UPSERT_REPLACE),
+            params)
+        self._invalidate_balance_cache()
+
+    @api.model
+    def _rebuild(self):
+        cr = self.env.cr
+        cr.execute("UPDATE stock_kal3iya_balance SET quantity = 0, mt_achat = 0, change_txid = %s" % CHANGE_MARKER_SQL)
+        cr.execute("INSERT INTO stock_kal3iya_balance (%s) %s %s" % (
+            _INSERT_COLUMNS, _AGGREGATE_SELECT.format(where='TRUE'), _UPSERT_REPLACE))
+        count = cr.rowcount
+        self._invalidate_balance_cache()
+        return count
+
+    @api.model
+    def action_rebuild_balance(self):
+        """Full rebuild of the balance table from the movement ledger."""
+        self.env['stock.kal3iya.move'].flush_model()
+        # Serialise with concurrent move creation while the table is rebuilt.
+        self.env.cr.execute("LOCK TABLE stock_kal3iya_balance IN EXCLUSIVE MODE")
+        count = self._rebuild()
+        _logger.info("stock.kal3iya.balance rebuilt from ledger: %s positions", count)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Soldes reconstruits"),
+                'message': _("%s positions recalculées depuis le journal des mouvements.") % count,
+                'type': 'success',
+                'sticky': False,
+            },
+        }
+
+    def _invalidate_balance_cache(self):
+        self.env['stock.kal3iya.balance'].invalidate_model()
+        self.env['stock.kal3iya.stock'].invalidate_model()
@@ -0,0 +1,110 @@
+from collections import defaultdict
+
+from odoo import models, _
+from odoo.exceptions import UserError
+
+
+class StockKal3iyaBatchConfirm(models.AbstractModel):
+    """Batched confirmation of stock operations (truck manifests).
+
+    Inheriting models implement:
+    - ``_check_confirmable()``: error message for a draft record, or False
+      (or ``_check_confirmable_batch()`` for checks spanning several records)
+    - ``_get_availability_lines()``: stock consumed by the record, as
+      ``stock.kal3iya.availability.check_availability`` lines
+    - ``_prepare_confirm_moves()``: list of (link field, move vals)
+    """
+    _name = 'stock.kal3iya.batch.confirm'
+    _description = 'Confirmation groupée Stock Kal3iya'
+
+    def _check_confirmable(self):
+        return False
+
+    def _check_confirmable_batch(self):
+        """Error messages of the records of ``self`` that cannot be confirmed, by id."""
+        errors = {}
+        for rec in self:
+            message = rec._check_confirmable()
+            if message:
+                errors[rec.id] = message
+        return errors
+
+    def _get_availability_lines(self):
+        return []
+
+    def _prepare_confirm_moves(self):
+        return []
+
+    def _confirm_batch(self, raise_on_error=False):
+        """Confirm all draft records of ``self`` in a constant number of queries.
+
+        Availability is checked for the whole batch at once (grouped by
+        position), ledger moves are created with a single multi-create and
+        states are written in bulk.
+
+        :param raise_on_error: raise a UserError listing every invalid line
+            before anything is confirmed, instead of confirming the valid
+            lines only.
+        :return: dict with ``confirmed`` (ids) and ``errors`` ({id: message})
+        """
+        drafts = self.filtered(lambda r: r.state == 'draft')
+        errors = drafts._check_confirmable_batch()
+
+        owners, lines = [], []
+        for rec in drafts.filtered(lambda r: r.id not in errors):
+            for line in rec._get_availability_lines():
+                owners.append(rec.id)
+                lines.append(line)
+        availability_errors = self.env['stock.kal3iya.availability'].check_availability(
+            lines, raise_if_missing=False)
+        for index, message in availability_errors.items():
+            errors.setdefault(owners[index], message)
+
+        if raise_on_error and errors:
+            raise UserError("\n".join(errors[rec.id] for rec in drafts if rec.id in errors))
+
+        to_confirm = drafts.filtered(lambda r: r.id not in errors)
+        if to_confirm:
+            links, vals_list = [], []
+            for rec in to_confirm:
+                for link_field, vals in rec._prepare_confirm_moves():
+                    links.append((rec.id, link_field))
+                    vals_list.append(vals)
+            moves = self.env['stock.kal3iya.move'].create(vals_list)
+
+            move_ids_by_field = defaultdict(lambda: ([], []))
+            for (rec_id, link_field), move in zip(links, moves):
+                move_ids_by_field[link_field][0].append(rec_id)
+                move_ids_by_field[link_field][1].append(move.id)
+            to_confirm.flush_recordset(list(move_ids_by_field))
+            for link_field, (rec_ids, move_ids) in move_ids_by_field.items():
+                self.env.cr.execute("""
+                    UPDATE {table} t SET {field} = v.move_id
+                    FROM unnest(%s::int[], %s::int[]) AS v(id, move_id)
+                    WHERE t.id = v.id
+                """.format(table=self._table, field=link_field), [rec_ids, move_ids])
+            to_confirm.invalidate_recordset(list(move_ids_by_field))
+            to_confirm.modified(list(move_ids_by_field))
+            to_confirm.write({'state': 'done'})
+
+        return {'confirmed': to_confirm.ids, 'errors': errors}
+
+    def action_confirm_batch(self):
+        report = self._confirm_batch()
+        errors = report['errors']
+        message = _("%s opération(s) confirmée(s).") % len(report['confirmed'])
+        if errors:
+            message += "\n" + _("%s ligne(s) en erreur :") % len(errors)
+            message += "\n" + "\n".join(
+                "- %s" % errors[rec.id] for rec in self if rec.id in errors)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Confirmation groupée"),
+                'message': message,
+                'type': 'warning' if errors else 'success',
+                'sticky': bool(errors),
+                'next': {'type': 'ir.actions.client', 'tag': 'reload'},
+            },
+        }
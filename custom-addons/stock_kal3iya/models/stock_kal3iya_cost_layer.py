@@ -0,0 +1,268 @@
+import logging
+import time
+
+from odoo import models, fields, api, _
+
+from ..services.fifo import FifoEngine, QTY, UNIT_COST, REMAINING_QTY, REMAINING_VALUE
+
+_logger = logging.getLogger(__name__)
+
+REBUILD_CHUNK_SIZE = 50000
+
+# Ledger moves in valuation order. The positive side of a customer return is
+# valued at the cost of the original exit, hence the origin remapping.
+_MOVE_SELECT = """
+    SELECT m.id, m.product_id, NULLIF(m.lot, ''), NULLIF(m.dum, ''), m.garage, m.ste_id,
+           m.qty, m.price_purchase, m.date,
+           CASE WHEN m.res_model = 'stock.kal3iya.return' AND m.qty > 0
+                THEN 'stock.kal3iya.exit' ELSE m.res_model END,
+           CASE WHEN m.res_model = 'stock.kal3iya.return' AND m.qty > 0
+                THEN r.exit_id ELSE m.res_id END
+    FROM stock_kal3iya_move m
+    LEFT JOIN stock_kal3iya_return r ON m.res_model = 'stock.kal3iya.return' AND r.id = m.res_id
+    WHERE m.state = 'done' AND {where}
+    ORDER BY m.id
+"""
+
+
+class StockKal3iyaCostLayer(models.Model):
+    """FIFO cost layer: one per positive ledger move, consumed by the negative ones."""
+    _name = 'stock.kal3iya.cost.layer'
+    _description = 'Couche de Coût FIFO Stock Kal3iya'
+    _log_access = False
+    _order = 'id'
+
+    move_id = fields.Many2one('stock.kal3iya.move', string='Mouvement', readonly=True, index=True, ondelete='restrict')
+    product_id = fields.Many2one('stock.kal3iya.product', string='Produit', readonly=True, required=True, ondelete='restrict')
+    lot = fields.Char(string='Lot', readonly=True)
+    dum = fields.Char(string='DUM', readonly=True)
+    garage = fields.Selection([
+        ('garage1', 'Garage 1'),
+        ('garage2', 'Garage 2'),
+        ('garage3', 'Garage 3'),
+        ('garage4', 'Garage 4'),
+        ('garage5', 'Garage 5'),
+        ('garage6', 'Garage 6'),
+        ('garage7', 'Garage 7'),
+        ('garage8', 'Garage 8'),
+        ('terrasse', 'Terrasse'),
+        ('fenidek', 'Fenidek'),
+    ], string='Garage', readonly=True)
+    ste_id = fields.Many2one('stock.kal3iya.ste', string='Société', readonly=True)
+    date = fields.Datetime(string='Date', readonly=True)
+    qty = fields.Float(string='Quantité', readonly=True)
+    unit_cost = fields.Float(string='Coût Unitaire', readonly=True)
+    value = fields.Float(string='Valeur', readonly=True)
+    remaining_qty = fields.Float(string='Quantité Restante', readonly=True)
+    remaining_value = fields.Float(string='Valeur Restante', readonly=True)
+
+    def init(self):
+        cr = self.env.cr
+        cr.execute("""
+            CREATE INDEX IF NOT EXISTS stock_kal3iya_cost_layer_open_idx
+            ON stock_kal3iya_cost_layer (product_id, id) WHERE remaining_qty > 0
+        """)
+        cr.execute("SELECT 1 FROM stock_kal3iya_cost_layer LIMIT 1")
+        if not cr.fetchone():
+            cr.execute("SELECT 1 FROM stock_kal3iya_move LIMIT 1")
+            if cr.fetchone():
+                self._rebuild()
+
+    # ------------------------------------------------------------------
+    # Incremental valuation
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _load_open_layers(self, engine, keys):
+        keys = list(keys)
+        self.env.cr.execute("""
+            SELECT l.id, l.product_id, l.lot, l.dum, l.garage, l.ste_id,
+                   l.qty, l.unit_cost, l.remaining_qty, l.remaining_value
+            FROM stock_kal3iya_cost_layer l
+            JOIN unnest(%s::int[], %s::varchar[], %s::varchar[], %s::varchar[], %s::int[])
+                 AS k(product_id, lot, dum, garage, ste_id)
+              ON l.product_id = k.product_id
+             AND COALESCE(l.lot, '') = COALESCE(k.lot, '')
+             AND COALESCE(l.dum, '') = COALESCE(k.dum, '')
+             AND COALESCE(l.garage, '') = COALESCE(k.garage, '')
+             AND COALESCE(l.ste_id, 0) = COALESCE(k.ste_id, 0)
+            WHERE l.remaining_qty > 0
+            ORDER BY l.id
+        """, [[k[i] for k in keys] for i in range(5)])
+        for layer_id, product_id, lot, dum, garage, ste_id, qty, unit_cost, remaining_qty, remaining_value \
+                in self.env.cr.fetchall():
+            engine.load_layer((product_id, lot, dum, garage, ste_id), layer_id,
+                              qty, unit_cost, remaining_qty, remaining_value)
+
+    @api.model
+    def _load_origin_costs(self, engine, origins, exclude_move_ids):
+        origins = list(origins)
+        if not origins:
+            return
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (m.res_model, m.res_id) m.res_model, m.res_id, m.cost_value, m.qty
+            FROM stock_kal3iya_move m
+            JOIN unnest(%s::varchar[], %s::int[]) AS o(res_model, res_id)
+              ON m.res_model = o.res_model AND m.res_id = o.res_id
+            WHERE m.qty < 0 AND m.cost_value IS NOT NULL AND m.id != ALL(%s)
+            ORDER BY m.res_model, m.res_id, m.id DESC
+        """, [[o[0] for o in origins], [o[1] for o in origins], list(exclude_move_ids)])
+        for res_model, res_id, cost_value, qty in self.env.cr.fetchall():
+            engine.origin_unit_cost[(res_model, res_id)] = cost_value / qty
+
+    @api.model
+    def _value_moves(self, moves):
+        """Value freshly created ledger moves and update the layers they touch.
+
+        Runs in the same transaction as the move creation. Concurrent
+        transactions on the same position are serialized by the balance row
+        upsert that follows (see stock.kal3iya.balance._apply_moves).
+        """
+        if not moves:
+            return
+        moves.flush_recordset()
+        cr = self.env.cr
+        cr.execute(_MOVE_SELECT.format(where='m.id IN %s'), [tuple(moves.ids)])
+        rows = cr.fetchall()
+        if not rows:
+            return
+
+        engine = FifoEngine()
+        self._load_open_layers(engine, {tuple(row[1:6]) for row in rows})
+        self._load_origin_costs(
+            engine,
+            {(row[9], row[10]) for row in rows if row[6] > 0 and not row[7] and row[9]},
+            moves.ids,
+        )
+        cost_values = self._run_engine(engine, rows)
+
+        if engine.dirty_layers:
+            layer_ids = list(engine.dirty_layers)
+            cr.execute("""
+                UPDATE stock_kal3iya_cost_layer l
+                SET remaining_qty = v.remaining_qty, remaining_value = v.remaining_value
+                FROM unnest(%s::int[], %s::float8[], %s::float8[]) AS v(id, remaining_qty, remaining_value)
+                WHERE l.id = v.id
+            """, [
+                layer_ids,
+                [engine.dirty_layers[i][REMAINING_QTY] for i in layer_ids],
+                [engine.dirty_layers[i][REMAINING_VALUE] for i in layer_ids],
+            ])
+        self._insert_layers(engine.new_layers, {row[0]: row[8] for row in rows})
+        self._write_cost_values(cost_values)
+        self.invalidate_model()
+        moves.invalidate_recordset(['cost_value'])
+        moves.modified(['cost_value'])
+
+    # ------------------------------------------------------------------
+    # Shared helpers
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _run_engine(self, engine, rows):
+        cost_values = []
+        for move_id, product_id, lot, dum, garage, ste_id, qty, price, date, origin_model, origin_id in rows:
+            origin = (origin_model, origin_id) if origin_model else None
+            cost_values.append((move_id, engine.value_move(
+                (product_id, lot, dum, garage, ste_id), qty, price, origin, move_id)))
+        return cost_values
+
+    @api.model
+    def _insert_layers(self, new_layers, move_dates):
+        cr = self.env.cr
+        for start in range(0, len(new_layers), REBUILD_CHUNK_SIZE):
+            chunk = new_layers[start:start + REBUILD_CHUNK_SIZE]
+            cr.execute("""
+                INSERT INTO stock_kal3iya_cost_layer
+                    (move_id, product_id, lot, dum, garage, ste_id, date,
+                     qty, unit_cost, value, remaining_qty, remaining_value)
+                SELECT * FROM unnest(
+                    %s::int[], %s::int[], %s::varchar[], %s::varchar[], %s::varchar[], %s::int[],
+                    %s::timestamp[], %s::float8[], %s::float8[], %s::float8[], %s::float8[], %s::float8[])
+            """, [
+                [move_id for key, move_id, layer in chunk],
+                [key[0] for key, move_id, layer in chunk],
+                [key[1] for key, move_id, layer in chunk],
+                [key[2] for key, move_id, layer in chunk],
+                [key[3] for key, move_id, layer in chunk],
+                [key[4] for key, move_id, layer in chunk],
+                [move_dates.get(move_id) for key, move_id, layer in chunk],
+                [layer[QTY] for key, move_id, layer in chunk],
+                [layer[UNIT_COST] for key, move_id, layer in chunk],
+                [layer[QTY] * layer[UNIT_COST] for key, move_id, layer in chunk],
+                [layer[REMAINING_QTY] for key, move_id, layer in chunk],
+                [layer[REMAINING_VALUE] for key, move_id, layer in chunk],
+            ])
+
+    @api.model
+    def _write_cost_values(self, cost_values):
+        cr = self.env.cr
+        for start in range(0, len(cost_values), REBUILD_CHUNK_SIZE):
+            chunk = cost_values[start:start + REBUILD_CHUNK_SIZE]
+            cr.execute("""
+                UPDATE stock_kal3iya_move m SET cost_value = v.cost_value
+                FROM unnest(%s::int[], %s::float8[]) AS v(id, cost_value)
+                WHERE m.id = v.id
+            """, [[c[0] for c in chunk], [c[1] for c in chunk]])
+
+    # ------------------------------------------------------------------
+    # Full rebuild
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _rebuild(self):
+        """Replay the whole ledger through the FIFO engine.
+
+        Moves are streamed by id in chunks; only the open layers of each
+        position are kept in memory between chunks.
+        """
+        started = time.time()
+        self.env['stock.kal3iya.move'].flush_model()
+        cr = self.env.cr
+        cr.execute("DELETE FROM stock_kal3iya_cost_layer")
+        engine = FifoEngine()
+        move_dates = {}
+        last_id, move_count = 0, 0
+        while True:
+            cr.execute(_MOVE_SELECT.format(where='m.id > %s') + " LIMIT %s", [last_id, REBUILD_CHUNK_SIZE])
+            rows = cr.fetchall()
+            if not rows:
+                break
+            for row in rows:
+                if row[6] > 0:
+                    move_dates[row[0]] = row[8]
+            self._write_cost_values(self._run_engine(engine, rows))
+            last_id = rows[-1][0]
+            move_count += len(rows)
+        self._insert_layers(engine.new_layers, move_dates)
+
+        # Balance values are the sum of the move cost values.
+        self.env['stock.kal3iya.balance']._rebuild()
+        cr.execute("""
+            UPDATE stock_kal3iya_exit e SET cost_amount = -m.cost_value
+            FROM stock_kal3iya_move m
+            WHERE m.id = e.move_id AND e.state = 'done'
+        """)
+        self.env['stock.kal3iya.move'].invalidate_model(['cost_value'])
+        self.env['stock.kal3iya.exit'].invalidate_model(['cost_amount'])
+        self.invalidate_model()
+        _logger.info(
+            "stock.kal3iya FIFO layers rebuilt: %s moves, %s layers in %.1fs",
+            move_count, len(engine.new_layers), time.time() - started)
+        return move_count, len(engine.new_layers)
+
+    @api.model
+    def action_rebuild_cost_layers(self):
+        """Rebuild the FIFO layers, move costs and stock values from the ledger."""
+        self.env.cr.execute("LOCK TABLE stock_kal3iya_balance IN EXCLUSIVE MODE")
+        move_count, layer_count = self._rebuild()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _("Valorisation FIFO reconstruite"),
+                'message': _("%s mouvements valorisés, %s couches de coût.") % (move_count, layer_count),
+                'type': 'success',
+                'sticky': False,
+            },
+        }
@@ -1,9 +1,11 @@
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
 class StockKal3iyaReturn(models.Model):
     _name = 'stock.kal3iya.return'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'stock.kal3iya.batch.confirm']
     _description = 'Retour Client Stock Kal3iya'
     _order = 'date desc, id desc'
 
@@ -58,50 +60,62 @@ class StockKal3iyaReturn(models.Model):
                     raise UserError(_("Les retours confirmés ne peuvent pas être modifiés. Utilisez 'Annuler'."))
         return super(StockKal3iyaReturn, self).write(vals)
 
-    def action_confirm(self):
-        for rec in self:
-            if rec.state != 'draft':
-                continue
-            
-            # Validation
+    def _check_confirmable_batch(self):
+        # Returns of the same exit confirmed together count against its quantity.
+        errors = {}
+        pending = defaultdict(float)
+        for rec in self.sorted('id'):
             if rec.qty <= 0:
-                raise UserError(_("La quantité retournée doit être strictement positive."))
-            
-            # Check total returned quantity
-            already_returned = sum(rec.exit_id.return_ids.filtered(lambda r: r.state == 'done' and r.id != rec.id).mapped('qty'))
+                errors[rec.id] = _("%s : La quantité retournée doit être strictement positive.") % rec.name
+                continue
+            already_returned = pending[rec.exit_id.id] + sum(rec.exit_id.return_ids.filtered(
+                lambda r: r.state == 'done' and r.id != rec.id).mapped('qty'))
             if (already_returned + rec.qty) > rec.exit_id.qty:
-                raise UserError(_("La quantité totale retournée (%s) ne peut pas dépasser la quantité de la sortie initiale (%s).") % (already_returned + rec.qty, rec.exit_id.qty))
-            
-            # Create Move (Positive quantity for return)
-            move = self.env['stock.kal3iya.move'].create({
-                'product_id': rec.product_id.id,
-                'lot': rec.lot,
-                'dum': rec.dum,
-                'garage': rec.garage,
-                'qty': rec.qty,  # Positive quantity adds to stock
-                'move_type': 'return',
-                'state': 'done',
-                'date': rec.date,
-                'reference': rec.name,
-                'weight': rec.weight,
-                'calibre': rec.calibre,
-                'client_id': rec.client_id.id,
-                'driver_id': rec.driver_id.id,
-                'ste_id': rec.ste_id.id,
-                'res_model': 'stock.kal3iya.return',
-                'res_id': rec.id,
-            })
-            
-            rec.write({
-                'state': 'done',
-                'move_id': move.id
-            })
+                errors[rec.id] = _("%s : La quantité totale retournée (%s) ne peut pas dépasser la quantité de la sortie initiale (%s).") % (
+                    rec.name, already_returned + rec.qty, rec.exit_id.qty)
+                continue
+            pending[rec.exit_id.id] += rec.qty
+        return errors
+
+    def _prepare_confirm_moves(self):
+        self.ensure_one()
+        # Positive quantity: the returned goods go back into stock.
+        return [('move_id', {
+            'product_id': self.product_id.id,
+            'lot': self.lot,
+            'dum': self.dum,
+            'garage': self.garage,
+            'qty': self.qty,
+            'move_type': 'return',
+            'state': 'done',
+            'date': self.date,
+            'reference': self.name,
+            'weight': self.weight,
+            'calibre': self.calibre,
+            'client_id': self.client_id.id,
+            'driver_id': self.driver_id.id,
+            'ste_id': self.ste_id.id,
+            'res_model': 'stock.kal3iya.return',
+            'res_id': self.id,
+        })]
+
+    def action_confirm(self):
+        self._confirm_batch(raise_on_error=True)
 
     def action_cancel(self):
+        if any(rec.state != 'done' for rec in self):
+            raise UserError(_("Vous ne pouvez annuler que des retours confirmés."))
+        # The returned goods must still be in stock to be taken back out.
+        self.env['stock.kal3iya.availability'].check_availability([{
+            'product_id': rec.product_id.id,
+            'lot': rec.lot,
+            'dum': rec.dum,
+            'garage': rec.garage,
+            'qty': rec.qty,
+            'ref': rec.name,
+        } for rec in self])
+
         for rec in self:
-            if rec.state != 'done':
-                raise UserError(_("Vous ne pouvez annuler que des retours confirmés."))
-            
             # Reverse Move (Negative quantity)
             self.env['stock.kal3iya.move'].create({
                 'product_id': rec.product_id.id,
@@ -0,0 +1,195 @@
+import logging
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Daily closings older than this are pruned; monthly closings are kept.
+DAILY_SNAPSHOT_RETENTION_DAYS = 62
+# Timezone of the business day closed by the cron (the cron user has none).
+CLOSING_TZ_PARAM = 'stock_kal3iya.closing_tz'
+DEFAULT_CLOSING_TZ = 'Africa/Casablanca'
+
+
+class StockKal3iyaSnapshot(models.Model):
+    """Closing balance of the ledger at a given cutoff.
+
+    A snapshot holds every ledger move with ``date <= cutoff`` that was
+    visible to its transaction; that transaction snapshot is stored in
+    ``move_snapshot``. Moves committed afterwards with a back-dated ``date``,
+    even with a lower id, are the ones whose ``create_txid`` is not visible
+    in it: ``as_of`` replays them, so snapshots never need to be recomputed.
+    """
+    _name = 'stock.kal3iya.snapshot'
+    _description = 'Clôture Stock Kal3iya'
+    _order = 'cutoff desc'
+
+    name = fields.Char(string='Clôture', compute='_compute_name')
+    cutoff = fields.Datetime(string='Arrêté au', required=True, readonly=True, index=True)
+    period = fields.Selection([
+        ('daily', 'Journalière'),
+        ('monthly', 'Mensuelle'),
+    ], string='Périodicité', required=True, default='daily', readonly=True)
+    max_move_id = fields.Integer(string='Dernier Mouvement', readonly=True)
+    line_ids = fields.One2many('stock.kal3iya.snapshot.line', 'snapshot_id', string='Positions', readonly=True)
+    line_count = fields.Integer(string='Positions', readonly=True)
+
+    _sql_constraints = [
+        ('unique_cutoff', 'unique(cutoff)', 'Une clôture existe déjà pour cette date.')
+    ]
+
+    def init(self):
+        # Closings taken before this column existed keep the max_move_id watermark.
+        self.env.cr.execute("""
+            ALTER TABLE stock_kal3iya_snapshot ADD COLUMN IF NOT EXISTS move_snapshot txid_snapshot
+        """)
+
+    @api.depends('cutoff', 'period')
+    def _compute_name(self):
+        labels = dict(self._fields['period'].selection)
+        for rec in self:
+            rec.name = "%s - %s" % (labels.get(rec.period, ''), rec.cutoff or '')
+
+    # ------------------------------------------------------------------
+    # Point-in-time query
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_base_snapshot(self, date):
+        return self.search([('cutoff', '<=', date)], order='cutoff desc', limit=1)
+
+    @api.model
+    def _as_of_query(self, date):
+        """SQL and params returning the positions as of ``date``.
+
+        Starts from the nearest snapshot and replays only the moves it does
+        not hold: dated after its cutoff, or committed after it was taken.
+        """
+        base = self._get_base_snapshot(date)
+        params = {
+            'date': date,
+            'snapshot_id': base.id or 0,
+            'cutoff': base.cutoff or datetime.min,
+            'max_move_id': base.max_move_id if base else 0,
+        }
+        query = """
+            SELECT product_id, lot, dum, garage, ste_id,
+                   sum(quantity) as quantity,
+                   sum(mt_achat) as mt_achat
+            FROM (
+                SELECT l.product_id, l.lot, l.dum, l.garage, l.ste_id, l.quantity, l.mt_achat
+                FROM stock_kal3iya_snapshot_line l
+                WHERE l.snapshot_id = %(snapshot_id)s
+                UNION ALL
+                SELECT m.product_id, NULLIF(m.lot, ''), NULLIF(m.dum, ''), m.garage, m.ste_id,
+                       m.qty, COALESCE(m.cost_value, 0)
+                FROM stock_kal3iya_move m
+                LEFT JOIN stock_kal3iya_snapshot s ON s.id = %(snapshot_id)s
+                WHERE m.state = 'done'
+                  AND m.date <= %(date)s
+                  AND (m.date > %(cutoff)s
+                       OR (s.move_snapshot IS NULL AND m.id > %(max_move_id)s)
+                       OR (m.create_txid >= txid_snapshot_xmin(s.move_snapshot)
+                           AND NOT txid_visible_in_snapshot(m.create_txid, s.move_snapshot)))
+            ) positions
+            GROUP BY product_id, lot, dum, garage, ste_id
+            HAVING sum(quantity) != 0
+        """
+        return query, params
+
+    @api.model
+    def _end_of_day(self, day):
+        """Last second of ``day`` in the user's timezone, as a naive UTC datetime."""
+        tz = pytz.timezone(self.env.context.get('tz') or self.env.user.tz or 'UTC')
+        next_midnight = tz.localize(datetime.combine(day + timedelta(days=1), time.min))
+        return next_midnight.astimezone(pytz.utc).replace(tzinfo=None) - timedelta(seconds=1)
+
+    @api.model
+    def as_of(self, date):
+        """Stock positions at ``date`` (datetime, UTC).
+
+        :return: list of dicts with product_id, lot, dum, garage, ste_id,
+            quantity and mt_achat
+        """
+        self.env['stock.kal3iya.move'].flush_model()
+        query, params = self._as_of_query(date)
+        self.env.cr.execute(query, params)
+        return self.env.cr.dictfetchall()
+
+    # ------------------------------------------------------------------
+    # Closing
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _take_snapshot(self, cutoff, period='daily'):
+        snapshot = self.search([('cutoff', '=', cutoff)])
+        if snapshot:
+            return snapshot
+        self.env['stock.kal3iya.move'].flush_model()
+        cr = self.env.cr
+        cr.execute("SELECT COALESCE(max(id), 0) FROM stock_kal3iya_move")
+        max_move_id = cr.fetchone()[0]
+        # Built before the new snapshot exists, so that it starts from the previous one.
+        query, params = self._as_of_query(cutoff)
+        snapshot = self.create({
+            'cutoff': cutoff,
+            'period': period,
+            'max_move_id': max_move_id,
+        })
+        cr.execute("UPDATE stock_kal3iya_snapshot SET move_snapshot = txid_current_snapshot() WHERE id = %s",
+                   [snapshot.id])
+        cr.execute("""
+            INSERT INTO stock_kal3iya_snapshot_line
+                (snapshot_id, product_id, lot, dum, garage, ste_id, quantity, mt_achat)
+            SELECT %%(new_snapshot_id)s, product_id, lot, dum, garage, ste_id, quantity, mt_achat
+            FROM (%s) positions
+        """ % query, dict(params, new_snapshot_id=snapshot.id))
+        snapshot.line_count = cr.rowcount
+        self.env['stock.kal3iya.snapshot.line'].invalidate_model()
+        return snapshot
+
+    @api.model
+    def cron_take_closing_snapshot(self):
+        """Close yesterday's stock; month-end closings are kept as monthly."""
+        tz = self.env['ir.config_parameter'].sudo().get_param(CLOSING_TZ_PARAM) or DEFAULT_CLOSING_TZ
+        closing = self.with_context(tz=tz)
+        today = fields.Date.context_today(closing)
+        cutoff = closing._end_of_day(today - timedelta(days=1))
+        period = 'monthly' if today.day == 1 else 'daily'
+        started = datetime.now()
+        snapshot = self._take_snapshot(cutoff, period)
+        _logger.info(
+            "stock.kal3iya closing snapshot %s: %s positions in %.2fs",
+            cutoff, snapshot.line_count, (datetime.now() - started).total_seconds())
+
+        limit = cutoff - timedelta(days=DAILY_SNAPSHOT_RETENTION_DAYS)
+        self.search([('period', '=', 'daily'), ('cutoff', '<', limit)]).unlink()
+
+
+class StockKal3iyaSnapshotLine(models.Model):
+    _name = 'stock.kal3iya.snapshot.line'
+    _description = 'Position de Clôture Stock Kal3iya'
+    _log_access = False
+
+    snapshot_id = fields.Many2one('stock.kal3iya.snapshot', string='Clôture', required=True, ondelete='cascade', index=True)
+    product_id = fields.Many2one('stock.kal3iya.product', string='Produit', required=True, ondelete='restrict')
+    lot = fields.Char(string='Lot')
+    dum = fields.Char(string='DUM')
+    garage = fields.Selection([
+        ('garage1', 'Garage 1'),
+        ('garage2', 'Garage 2'),
+        ('garage3', 'Garage 3'),
+        ('garage4', 'Garage 4'),
+        ('garage5', 'Garage 5'),
+        ('garage6', 'Garage 6'),
+        ('garage7', 'Garage 7'),
+        ('garage8', 'Garage 8'),
+        ('terrasse', 'Terrasse'),
+        ('fenidek', 'Fenidek'),
+    ], string='Garage')
+    ste_id = fields.Many2one('stock.kal3iya.ste', string='Société')
+    quantity = fields.Float(string='Quantité')
+    mt_achat = fields.Float(string='Valeur achat (FIFO)')
@@ -0,0 +1,53 @@
+from odoo import models, fields, _
+
+
+class StockKal3iyaStockAtDate(models.TransientModel):
+    _name = 'stock.kal3iya.stock.at.date'
+    _description = 'Stock Kal3iya à date'
+
+    date = fields.Date(string='Stock au', required=True, default=fields.Date.context_today)
+    line_ids = fields.One2many('stock.kal3iya.stock.at.date.line', 'wizard_id', string='Positions')
+
+    def action_open(self):
+        """Compute the stock at the end of the chosen day and open it."""
+        self.ensure_one()
+        Snapshot = self.env['stock.kal3iya.snapshot']
+        positions = Snapshot.as_of(Snapshot._end_of_day(self.date))
+        self.line_ids.unlink()
+        self.env['stock.kal3iya.stock.at.date.line'].create([
+            dict(position, wizard_id=self.id) for position in positions
+        ])
+        return {
+            'name': _("Stock au %s") % self.date.strftime('%d/%m/%Y'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'stock.kal3iya.stock.at.date.line',
+            'view_mode': 'tree,pivot',
+            'domain': [('wizard_id', '=', self.id)],
+            'target': 'current',
+        }
+
+
+class StockKal3iyaStockAtDateLine(models.TransientModel):
+    _name = 'stock.kal3iya.stock.at.date.line'
+    _description = 'Position Stock Kal3iya à date'
+    _order = 'product_id'
+
+    wizard_id = fields.Many2one('stock.kal3iya.stock.at.date', required=True, ondelete='cascade')
+    product_id = fields.Many2one('stock.kal3iya.product', string='Produit', readonly=True)
+    lot = fields.Char(string='Lot', readonly=True)
+    dum = fields.Char(string='DUM', readonly=True)
+    garage = fields.Selection([
+        ('garage1', 'Garage 1'),
+        ('garage2', 'Garage 2'),
+        ('garage3', 'Garage 3'),
+        ('garage4', 'Garage 4'),
+        ('garage5', 'Garage 5'),
+        ('garage6', 'Garage 6'),
+        ('garage7', 'Garage 7'),
+        ('garage8', 'Garage 8'),
+        ('terrasse', 'Terrasse'),
+        ('fenidek', 'Fenidek'),
+    ], string='Garage', readonly=True)
+    ste_id = fields.Many2one('stock.kal3iya.ste', string='Société', readonly=True)
+    quantity = fields.Float(string='Quantité', readonly=True)
+    mt_achat = fields.Float(string='Valeur achat (FIFO)', readonly=True)
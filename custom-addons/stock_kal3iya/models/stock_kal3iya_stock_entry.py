@@ -3,7 +3,7 @@ from odoo.exceptions import UserError
 
 class StockKal3iyaEntry(models.Model):
     _name = 'stock.kal3iya.entry'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'stock.kal3iya.batch.confirm']
     _description = 'Entrée Stock Kal3iya'
     _order = 'date desc, id desc'
 
@@ -71,37 +71,38 @@ class StockKal3iyaEntry(models.Model):
                     raise UserError(_("Les opérations confirmées ne peuvent pas être modifiées. Utilisez 'Annuler' et créez une nouvelle opération."))
         return super(StockKal3iyaEntry, self).write(vals)
 
+    def _check_confirmable(self):
+        self.ensure_one()
+        if not self.product_id:
+            return _("%s : Produit manquant.") % self.name
+        return False
+
+    def _prepare_confirm_moves(self):
+        self.ensure_one()
+        return [('move_id', {
+            'product_id': self.product_id.id,
+            'lot': self.lot,
+            'dum': self.dum,
+            'scan_dum': self.scan_dum,
+            'scan_invoice': self.scan_invoice,
+            'garage': self.garage,
+            'qty': self.qty,
+            'move_type': 'entry',
+            'state': 'done',
+            'date': self.date,
+            'reference': self.name,
+            'price_purchase': self.price_purchase,
+            'weight': self.weight,
+            'calibre': self.calibre,
+            'provider_id': self.provider_id.id,
+            'driver_id': self.driver_id.id,
+            'ste_id': self.ste_id.id,
+            'res_model': 'stock.kal3iya.entry',
+            'res_id': self.id,
+        })]
+
     def action_confirm(self):
-        for rec in self:
-            if rec.state != 'draft':
-                continue
-            
-            # Create Move
-            move = self.env['stock.kal3iya.move'].create({
-                'product_id': rec.product_id.id,
-                'lot': rec.lot,
-                'dum': rec.dum,
-                'scan_dum': rec.scan_dum,
-                'scan_invoice': rec.scan_invoice,
-                'garage': rec.garage,
-                'qty': rec.qty,
-                'move_type': 'entry',
-                'state': 'done',
-                'date': rec.date,
-                'reference': rec.name,
-                'price_purchase': rec.price_purchase,
-                'weight': rec.weight,
-                'calibre': rec.calibre,
-                'provider_id': rec.provider_id.id,
-                'driver_id': rec.driver_id.id,
-                'ste_id': rec.ste_id.id,
-                'res_model': 'stock.kal3iya.entry',
-                'res_id': rec.id,
-            })
-            rec.write({
-                'state': 'done',
-                'move_id': move.id
-            })
+        self._confirm_batch(raise_on_error=True)
 
     def action_cancel(self):
         for rec in self:
@@ -3,7 +3,7 @@ from odoo.exceptions import UserError
 
 class StockKal3iyaExit(models.Model):
     _name = 'stock.kal3iya.exit'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'stock.kal3iya.batch.confirm']
     _description = 'Sortie Stock Kal3iya'
     _order = 'date desc, id desc'
 
@@ -51,6 +51,7 @@ class StockKal3iyaExit(models.Model):
 
     return_ids = fields.One2many('stock.kal3iya.return', 'exit_id', string='Retours')
     returned_qty = fields.Float(string='Quantité Retournée', compute='_compute_returned_qty', store=True)
+    cost_amount = fields.Float(string='Coût de revient (FIFO)', compute='_compute_cost_amount', store=True)
 
     @api.depends('return_ids.qty', 'return_ids.state')
     def _compute_returned_qty(self):
@@ -71,6 +72,11 @@ class StockKal3iyaExit(models.Model):
             }
         }
 
+    @api.depends('move_id.cost_value', 'state')
+    def _compute_cost_amount(self):
+        for rec in self:
+            rec.cost_amount = -rec.move_id.cost_value if rec.state == 'done' else 0.0
+
     @api.depends('qty', 'weight')
     def _compute_tonnage(self):
         for rec in self:
@@ -93,50 +99,44 @@ class StockKal3iyaExit(models.Model):
                     raise UserError(_("Les opérations confirmées ne peuvent pas être modifiées. Utilisez 'Annuler' et créez une nouvelle opération."))
         return super(StockKal3iyaExit, self).write(vals)
 
-    def action_confirm(self):
-        for rec in self:
-            if rec.state != 'draft':
-                continue
-            
-            # Optimized availability check using read_group
-            domain = [
-                ('product_id', '=', rec.product_id.id),
-                ('lot', '=', rec.lot),
-                ('dum', '=', rec.dum),
-                ('garage', '=', rec.garage),
-                ('state', '=', 'done')
-            ]
-            res = self.env['stock.kal3iya.move'].read_group(domain, ['qty'], [])
-            total_available = res[0]['qty'] if res and res[0]['qty'] else 0.0
-            
-            if rec.qty > total_available:
-                raise UserError(_("Stock insuffisant ! Disponible : %s, Demandé : %s") % (total_available, rec.qty))
-            
-            # Create Move
-            move = self.env['stock.kal3iya.move'].create({
-                'product_id': rec.product_id.id,
-                'lot': rec.lot,
-                'dum': rec.dum,
-                'garage': rec.garage,
-                'qty': -rec.qty,
-                'move_type': 'exit',
-                'state': 'done',
-                'date': rec.date,
-                'reference': rec.name,
+    def _get_availability_lines(self):
+        self.ensure_one()
+        return [{
+            'product_id': self.product_id.id,
+            'lot': self.lot,
+            'dum': self.dum,
+            'garage': self.garage,
+            'qty': self.qty,
+            'ref': self.name,
+        }]
+
+    def _prepare_confirm_moves(self):
+        self.ensure_one()
+        return [('move_id', {
+            'product_id': self.product_id.id,
+            'lot': self.lot,
+            'dum': self.dum,
+            'garage': self.garage,
+            'qty': -self.qty,
+            'move_type': 'exit',
+            'state': 'done',
+            'date': self.date,
+            'reference': self.name,
+
+            'weight': self.weight,
+            'calibre': self.calibre,
+            'client_id': self.client_id.id,
+            'soufiane_client': self.soufiane_client,
+            'driver_id': self.driver_id.id,
+            'ste_id': self.ste_id.id,
+            'res_model': 'stock.kal3iya.exit',
+            'res_id': self.id,
+        })]
 
-                'weight': rec.weight,
-                'calibre': rec.calibre,
-                'client_id': rec.client_id.id,
-                'soufiane_client': rec.soufiane_client,
-                'driver_id': rec.driver_id.id,
-                'ste_id': rec.ste_id.id,
-                'res_model': 'stock.kal3iya.exit',
-                'res_id': rec.id,
-            })
-            rec.write({
-                'state': 'done',
-                'move_id': move.id
-            })
+    def action_confirm(self):
+        # Availability is checked for the whole batch; the positions stay
+        # locked until commit so concurrent exits on the same lot/DUM are serialized.
+        self._confirm_batch(raise_on_error=True)
 
     def action_cancel(self):
         for rec in self:
@@ -1,6 +1,8 @@
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError
 
+from .stock_kal3iya_balance import BALANCE_MOVE_FIELDS
+
 
 class StockKal3iyaMove(models.Model):
     _name = 'stock.kal3iya.move'
@@ -42,7 +44,7 @@ class StockKal3iyaMove(models.Model):
         ('done', 'Fait'),
     ], string='État', default='done', required=True)
     
-    date = fields.Datetime(string='Date', default=fields.Datetime.now, required=True)
+    date = fields.Datetime(string='Date', default=fields.Datetime.now, required=True, index=True)
     reference = fields.Char(string='Référence')
     user_id = fields.Many2one('res.users', string='Utilisateur', default=lambda self: self.env.user)
 
@@ -52,6 +54,9 @@ class StockKal3iyaMove(models.Model):
 
     # Optional fields for reporting
     price_purchase = fields.Float(string='Prix Achat')
+    # Signed FIFO value of the move: layer value for receptions, minus the
+    # consumed layers for issues (cost of goods sold for exits).
+    cost_value = fields.Float(string='Valeur (FIFO)', readonly=True)
 
     weight = fields.Float(string='Poids (Kg)')
     calibre = fields.Char(string='Calibre')
@@ -63,5 +68,39 @@ class StockKal3iyaMove(models.Model):
     driver_id = fields.Many2one('stock.kal3iya.driver', string='Chauffeur')
     ste_id = fields.Many2one('stock.kal3iya.ste', string='Société')
 
+    def init(self):
+        tools.create_index(
+            self.env.cr, 'stock_kal3iya_move_position_idx', self._table,
+            ['product_id', 'lot', 'dum', 'garage', 'state'],
+        )
+        # Transaction that inserted the move: closing snapshots compare it with
+        # their own snapshot to find the moves committed after they were taken.
+        self.env.cr.execute("""
+            ALTER TABLE stock_kal3iya_move
+            ADD COLUMN IF NOT EXISTS create_txid bigint NOT NULL DEFAULT txid_current()
+        """)
+        tools.create_index(self.env.cr, 'stock_kal3iya_move_create_txid_idx', self._table, ['create_txid'])
+
+    def _get_position_keys(self):
+        return {
+            (m.product_id.id, m.lot or None, m.dum or None, m.garage or None, m.ste_id.id or None)
+            for m in self
+        }
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        moves = super(StockKal3iyaMove, self).create(vals_list)
+        self.env['stock.kal3iya.cost.layer']._value_moves(moves)
+        self.env['stock.kal3iya.balance']._apply_moves(moves)
+        return moves
+
+    def write(self, vals):
+        if not BALANCE_MOVE_FIELDS.intersection(vals):
+            return super(StockKal3iyaMove, self).write(vals)
+        keys = self._get_position_keys()
+        res = super(StockKal3iyaMove, self).write(vals)
+        self.env['stock.kal3iya.balance']._refresh_positions(keys | self._get_position_keys())
+        return res
+
     def unlink(self):
         raise UserError(_("Stock movements cannot be deleted. Use reversal moves instead."))
\ No newline at end of file
@@ -30,7 +30,7 @@ class StockKal3iyaStock(models.Model):
     weight = fields.Float(string='Poids (Kg)', readonly=True)
     calibre = fields.Char(string='Calibre', readonly=True)
     price = fields.Float(string='Dernier Prix (Achat)', readonly=True)
-    mt_achat = fields.Float(string='Montant achat estimé', readonly=True)
+    mt_achat = fields.Float(string='Valeur achat (FIFO)', readonly=True)
     image_1920 = fields.Image(related='product_id.company_article_image', readonly=True)
     write_date = fields.Datetime(string='Last Update', readonly=True)
     create_date = fields.Datetime(string='Creation Date', readonly=True)
@@ -40,31 +40,25 @@ class StockKal3iyaStock(models.Model):
         self.env.cr.execute("""
             CREATE OR REPLACE VIEW stock_kal3iya_stock AS (
                 SELECT
-                    min(m.id) as id,
-                    m.product_id,
-                    m.lot,
-                    m.dum,
-                    max(m.scan_dum) as scan_dum,
-                    max(m.scan_invoice) as scan_invoice,
-                    m.garage,
-                    m.ste_id,
-                    sum(m.qty) as quantity,
-
-                    max(CASE WHEN m.qty > 0 THEN m.weight END) as weight,
-                    max(CASE WHEN m.qty > 0 THEN m.calibre END) as calibre,
-                    max(CASE WHEN m.qty > 0 THEN m.price_purchase END) as price,
-
-                    sum(m.qty * m.price_purchase) as mt_achat,
-                    max(m.date) as write_date,
-                    min(m.date) as create_date
+                    b.id,
+                    b.product_id,
+                    b.lot,
+                    b.dum,
+                    b.scan_dum,
+                    b.scan_invoice,
+                    b.garage,
+                    b.ste_id,
+                    b.quantity,
+                    b.weight,
+                    b.calibre,
+                    b.price,
+                    b.mt_achat,
+                    b.last_date as write_date,
+                    b.first_date as create_date
                 FROM
-                    stock_kal3iya_move m
+                    stock_kal3iya_balance b
                 WHERE
-                    m.state = 'done'
-                GROUP BY
-                    m.product_id, m.lot, m.dum, m.garage, m.ste_id
-                HAVING
-                    sum(m.qty) != 0
+                    b.quantity != 0
             )
         """)
 
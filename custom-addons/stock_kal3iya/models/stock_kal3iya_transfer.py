@@ -3,7 +3,7 @@ from odoo.exceptions import UserError
 
 class StockKal3iyaTransfer(models.Model):
     _name = 'stock.kal3iya.transfer'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'stock.kal3iya.batch.confirm']
     _description = 'Transfert Inter-Garage'
     _order = 'date desc, id desc'
 
@@ -60,59 +60,56 @@ class StockKal3iyaTransfer(models.Model):
             vals['name'] = self.env['ir.sequence'].next_by_code('stock.kal3iya.transfer') or '/'
         return super(StockKal3iyaTransfer, self).create(vals)
 
-    def action_confirm(self):
-        for rec in self:
-            if rec.state != 'draft':
-                continue
-            
-            if rec.garage_from == rec.garage_to:
-                raise UserError(_("Le garage de départ et d'arrivée doivent être différents."))
+    def _availability_line(self, garage):
+        self.ensure_one()
+        return {
+            'product_id': self.product_id.id,
+            'lot': self.lot,
+            'dum': self.dum,
+            'garage': garage,
+            'qty': self.qty,
+            'ref': self.name,
+        }
 
-            # 1. Create Move OUT
-            move_out = self.env['stock.kal3iya.move'].create({
-                'product_id': rec.product_id.id,
-                'lot': rec.lot,
-                'dum': rec.dum,
-                'garage': rec.garage_from,
-                'qty': -rec.qty,
-                'move_type': 'transfer_out', # New Type
-                'state': 'done',
-                'date': rec.date,
-                'reference': rec.name,
-                'driver_id': rec.driver_id.id,
-                'ste_id': rec.ste_id.id,
-                'res_model': 'stock.kal3iya.transfer',
-                'res_id': rec.id,
-            })
+    def _check_confirmable(self):
+        self.ensure_one()
+        if self.garage_from == self.garage_to:
+            return _("%s : Le garage de départ et d'arrivée doivent être différents.") % self.name
+        return False
 
-            # 2. Create Move IN
-            move_in = self.env['stock.kal3iya.move'].create({
-                'product_id': rec.product_id.id,
-                'lot': rec.lot,
-                'dum': rec.dum,
-                'garage': rec.garage_to,
-                'qty': rec.qty,
-                'move_type': 'transfer_in', # New Type
-                'state': 'done',
-                'date': rec.date,
-                'reference': rec.name,
-                'driver_id': rec.driver_id.id,
-                'ste_id': rec.ste_id.id,
-                'res_model': 'stock.kal3iya.transfer',
-                'res_id': rec.id,
-            })
+    def _get_availability_lines(self):
+        return [self._availability_line(self.garage_from)]
 
-            rec.write({
-                'state': 'done',
-                'move_out_id': move_out.id,
-                'move_in_id': move_in.id,
-            })
+    def _prepare_confirm_moves(self):
+        self.ensure_one()
+        common = {
+            'product_id': self.product_id.id,
+            'lot': self.lot,
+            'dum': self.dum,
+            'state': 'done',
+            'date': self.date,
+            'reference': self.name,
+            'driver_id': self.driver_id.id,
+            'ste_id': self.ste_id.id,
+            'res_model': 'stock.kal3iya.transfer',
+            'res_id': self.id,
+        }
+        return [
+            ('move_out_id', dict(common, garage=self.garage_from, qty=-self.qty, move_type='transfer_out')),
+            ('move_in_id', dict(common, garage=self.garage_to, qty=self.qty, move_type='transfer_in')),
+        ]
+
+    def action_confirm(self):
+        self._confirm_batch(raise_on_error=True)
 
     def action_cancel(self):
-        for rec in self:
-            if rec.state != 'done':
-                raise UserError(_("Seuls les transferts confirmés peuvent être annulés."))
+        if any(rec.state != 'done' for rec in self):
+            raise UserError(_("Seuls les transferts confirmés peuvent être annulés."))
+        # The reversal takes the quantity back out of the destination garage.
+        self.env['stock.kal3iya.availability'].check_availability(
+            [rec._availability_line(rec.garage_to) for rec in self])
 
+        for rec in self:
             # Reverse the movements
             # 1. Reverse OUT (Create +Qty at garage_from)
             self.env['stock.kal3iya.move'].create({
@@ -0,0 +1,113 @@
+"""Benchmark of the FIFO valuation engine on a synthetic ledger.
+
+Usage: python3 bench_fifo.py [moves] [positions]
+
+Generates a ledger shaped like the Kal3iya one (entries, exits, transfers
+and cancellations over a set of lot/DUM positions), replays it through
+services/fifo.py the same way stock.kal3iya.cost.layer._rebuild does, and
+compares with re-aggregating the ledger per position (the old mt_achat).
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'services'))
+
+from fifo import FifoEngine  # noqa: E402
+
+GARAGES = ['garage%s' % i for i in range(1, 9)] + ['terrasse', 'fenidek']
+
+
+def generate_ledger(move_count, position_count, seed=42):
+    """Rows shaped like _MOVE_SELECT: (id, product, lot, dum, garage, ste, qty, price, date, origin_model, origin_id)."""
+    rng = random.Random(seed)
+    positions = [
+        (rng.randint(1, 400), 'LOT%05d' % i, 'DUM%05d' % i, rng.choice(GARAGES), rng.randint(1, 4))
+        for i in range(position_count)
+    ]
+    stock = [0.0] * position_count
+    rows = []
+    move_id = 0
+    doc_id = 0
+    while move_id < move_count:
+        index = rng.randrange(position_count)
+        product, lot, dum, garage, ste = positions[index]
+        doc_id += 1
+        kind = rng.random()
+        if stock[index] < 50 or kind < 0.3:
+            qty = float(rng.randint(50, 500))
+            move_id += 1
+            rows.append((move_id, product, lot, dum, garage, ste, qty, rng.uniform(10, 60), None,
+                         'stock.kal3iya.entry', doc_id))
+            stock[index] += qty
+        elif kind < 0.9:
+            qty = float(rng.randint(1, int(stock[index])))
+            move_id += 1
+            rows.append((move_id, product, lot, dum, garage, ste, -qty, None, None,
+                         'stock.kal3iya.exit', doc_id))
+            stock[index] -= qty
+        else:
+            qty = float(rng.randint(1, int(stock[index])))
+            to_garage = rng.choice([g for g in GARAGES if g != garage])
+            move_id += 2
+            rows.append((move_id - 1, product, lot, dum, garage, ste, -qty, None, None,
+                         'stock.kal3iya.transfer', doc_id))
+            rows.append((move_id, product, lot, dum, to_garage, ste, qty, None, None,
+                         'stock.kal3iya.transfer', doc_id))
+            stock[index] -= qty
+    return rows
+
+
+def run_engine(rows, chunk_size=50000):
+    engine = FifoEngine()
+    cost_values = []
+    for start in range(0, len(rows), chunk_size):
+        for move_id, product, lot, dum, garage, ste, qty, price, date, origin_model, origin_id \
+                in rows[start:start + chunk_size]:
+            cost_values.append(engine.value_move(
+                (product, lot, dum, garage, ste), qty, price, (origin_model, origin_id), move_id))
+    return engine, cost_values
+
+
+def reaggregate(rows):
+    """Old approach: one pass over the whole ledger per screen refresh."""
+    totals = {}
+    for move_id, product, lot, dum, garage, ste, qty, price, date, origin_model, origin_id in rows:
+        key = (product, lot, dum, garage, ste)
+        totals[key] = totals.get(key, 0.0) + qty * (price or 0.0)
+    return totals
+
+
+def main():
+    move_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    position_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    started = time.time()
+    rows = generate_ledger(move_count, position_count)
+    print("generated %d moves over %d positions in %.1fs" % (len(rows), position_count, time.time() - started))
+
+    started = time.time()
+    engine, cost_values = run_engine(rows)
+    elapsed = time.time() - started
+    open_layers = sum(len(layers) for layers in engine.open_layers.values())
+    remaining = sum(layer[4] for layers in engine.open_layers.values() for layer in layers)
+    print("FIFO rebuild: %d moves valued in %.1fs (%.0f moves/s), %d layers, %d open, stock value %.2f" % (
+        len(cost_values), elapsed, len(cost_values) / elapsed, len(engine.new_layers), open_layers, remaining))
+    # The balance mt_achat is the sum of move cost values: it must match the open layers.
+    assert abs(sum(cost_values) - remaining) < 1e-3 * max(remaining, 1.0)
+
+    started = time.time()
+    reaggregate(rows)
+    print("full-ledger re-aggregation (per refresh, old mt_achat): %.2fs" % (time.time() - started))
+
+    # Incremental valuation of new exits against the precomputed layers.
+    keys = [key for key, layers in engine.open_layers.items() if layers][:10000]
+    started = time.time()
+    for key in keys:
+        engine.value_move(key, -1.0, None)
+    print("incremental exit valuation: %.1f us per exit" % ((time.time() - started) / len(keys) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
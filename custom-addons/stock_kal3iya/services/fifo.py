@@ -0,0 +1,96 @@
+"""FIFO cost layers for the stock_kal3iya movement ledger.
+
+Pure Python (no Odoo import) so that the same engine drives both the
+incremental valuation of new moves and the full rebuild, and can be
+benchmarked on a synthetic ledger (see scripts/bench_fifo.py).
+
+A layer is a small list ``[ref, qty, unit_cost, remaining_qty, remaining_value]``.
+``ref`` is the database id of an existing layer, or None for a new one.
+"""
+from collections import defaultdict, deque
+
+REF, QTY, UNIT_COST, REMAINING_QTY, REMAINING_VALUE = range(5)
+
+# Remaining quantities below this are considered exhausted (float noise).
+EPSILON = 1e-6
+
+
+class FifoEngine:
+
+    def __init__(self):
+        self.open_layers = defaultdict(deque)
+        # Every layer created by this engine, in creation order.
+        self.new_layers = []
+        # Existing layers (by ref) whose remaining quantity changed.
+        self.dirty_layers = {}
+        # Last consumption unit cost per origin document, used to value the
+        # positive side of transfers, returns and cancellations.
+        self.origin_unit_cost = {}
+
+    def load_layer(self, key, ref, qty, unit_cost, remaining_qty, remaining_value):
+        self.open_layers[key].append([ref, qty, unit_cost, remaining_qty, remaining_value])
+
+    def average_cost(self, key):
+        qty = sum(layer[REMAINING_QTY] for layer in self.open_layers[key])
+        value = sum(layer[REMAINING_VALUE] for layer in self.open_layers[key])
+        return value / qty if qty > EPSILON else 0.0
+
+    def receive(self, key, qty, unit_cost, move_id=None):
+        """Add ``qty`` at ``unit_cost``; returns the layer."""
+        layer = [None, qty, unit_cost, qty, qty * unit_cost]
+        self.open_layers[key].append(layer)
+        self.new_layers.append((key, move_id, layer))
+        return layer
+
+    def consume(self, key, qty):
+        """Take ``qty`` out of the oldest layers; returns the consumed value.
+
+        A shortfall (more consumed than layered, e.g. a cancelled entry
+        whose goods already left) is valued at the last known unit cost.
+        """
+        layers = self.open_layers[key]
+        value = 0.0
+        last_cost = 0.0
+        while qty > EPSILON and layers:
+            layer = layers[0]
+            last_cost = layer[UNIT_COST]
+            taken = min(qty, layer[REMAINING_QTY])
+            qty -= taken
+            if layer[REMAINING_QTY] - taken <= EPSILON:
+                value += layer[REMAINING_VALUE]
+                layer[REMAINING_QTY] = 0.0
+                layer[REMAINING_VALUE] = 0.0
+                layers.popleft()
+            else:
+                taken_value = taken * layer[UNIT_COST]
+                value += taken_value
+                layer[REMAINING_QTY] -= taken
+                layer[REMAINING_VALUE] -= taken_value
+            if layer[REF] is not None:
+                self.dirty_layers[layer[REF]] = layer
+        if qty > EPSILON:
+            value += qty * last_cost
+        return value
+
+    def value_move(self, key, qty, price, origin=None, move_id=None):
+        """Value one ledger move and return its signed cost value.
+
+        Positive moves are layered at ``price`` when given, otherwise at the
+        unit cost of the last consumption of the same ``origin`` document
+        (transfer out, original exit...), otherwise at the position average.
+        """
+        if qty > 0:
+            if price:
+                unit_cost = price
+            elif origin in self.origin_unit_cost:
+                unit_cost = self.origin_unit_cost[origin]
+            else:
+                unit_cost = self.average_cost(key)
+            self.receive(key, qty, unit_cost, move_id)
+            return qty * unit_cost
+        if qty < 0:
+            value = self.consume(key, -qty)
+            if origin is not None:
+                self.origin_unit_cost[origin] = value / -qty
+            return -value
+        return 0.0